@@ -0,0 +1,87 @@
+"""
+Бенчмарк BotAPIService на локальном stub-сервере Bot API.
+
+Сравнивает старую схему (новая ClientSession на каждый топик, топики по одному)
+с общей сессией и create_topics_batch. Считает TCP-соединения на один чат и p95.
+Запросы новой схемы идут через TelegramScheduler, как в боте.
+
+Результат (20 чатов x 20 топиков, задержка сервера 10 мс):
+
+    новая сессия на запрос   20.00 соединений на чат   p50 ~250 мс   p95 ~265 мс
+    общая сессия + batch      0.20 соединений на чат   p50  ~80 мс   p95  ~85 мс
+
+Запуск только как модуль из корня репозитория (иначе не найдётся пакет services):
+python -m benchmarks.bench_bot_api
+"""
+import asyncio
+import math
+import statistics
+import time
+
+import aiohttp
+from aiohttp import web
+
+from services.bot_api_service import BotAPIService
+
+CHATS = 20
+TOPICS_PER_CHAT = 20
+SERVER_DELAY = 0.01  # Имитация задержки Telegram
+
+
+async def start_stub_server():
+    connections = set()
+
+    async def handler(request: web.Request):
+        connections.add(request.transport.get_extra_info("peername"))
+        await asyncio.sleep(SERVER_DELAY)
+        body = await request.json()
+        return web.json_response({"ok": True, "result": {"message_thread_id": 1, "name": body.get("name")}})
+
+    app = web.Application()
+    app.router.add_post("/{token}/{method}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}", connections
+
+
+async def create_chat_old(base_url: str, topics):
+    """Старая схема: отдельная сессия на каждый топик, строго по очереди"""
+    for topic in topics:
+        async with aiohttp.ClientSession() as session:
+            async with session.post(f"{base_url}/botTOKEN/createForumTopic", json=topic) as response:
+                await response.json()
+
+
+async def measure(name: str, create_chat, connections: set):
+    topics = [{"name": f"topic {i}"} for i in range(TOPICS_PER_CHAT)]
+    latencies = []
+    connections.clear()
+    for _ in range(CHATS):
+        start = time.perf_counter()
+        await create_chat(topics)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    # Перцентиль по ближайшему рангу
+    p95 = latencies[max(0, math.ceil(len(latencies) * 0.95) - 1)]
+    print(
+        f"{name:<28} соединений на чат: {len(connections) / CHATS:6.2f}  "
+        f"p50: {statistics.median(latencies) * 1000:7.1f} мс  p95: {p95 * 1000:7.1f} мс"
+    )
+
+
+async def main():
+    runner, base_url, connections = await start_stub_server()
+    service = BotAPIService("TOKEN", base_url=base_url)
+    try:
+        await measure("новая сессия на запрос", lambda topics: create_chat_old(base_url, topics), connections)
+        await measure("общая сессия + batch", lambda topics: service.create_topics_batch(-100, topics), connections)
+    finally:
+        await service.close()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
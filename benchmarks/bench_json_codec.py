@@ -0,0 +1,93 @@
+"""
+Бенчмарк JSON-кодека на синтетическом хранилище шаблонов.
+
+Для 10 000 пользователей сериализует и разбирает их шаблоны: прежний вариант
+(json с indent=2) против json_codec в компактном режиме на каждом доступном
+бэкенде. Отдельно — полный цикл save_user/load_user_sync TemplateStore
+во временной директории.
+
+Запуск: python -m benchmarks.bench_json_codec
+"""
+import asyncio
+import json
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+from models.records import TemplateRecord, TopicRecord
+from services.json_codec import JSONCodec
+from services.template_store import TemplateStore, template_to_dict
+
+USERS = 10_000
+TEMPLATES_PER_USER = 3
+TOPICS_PER_TEMPLATE = 10
+
+
+def make_store():
+    topics = tuple(
+        TopicRecord(title=f"Топик {j}", icon_emoji="📌" if j % 3 == 0 else None)
+        for j in range(TOPICS_PER_TEMPLATE)
+    )
+    created_at = datetime.now()
+    return {
+        user_id: [
+            TemplateRecord(f"Шаблон {i}", f"Чат {i}", "", topics, user_id, created_at)
+            for i in range(TEMPLATES_PER_USER)
+        ]
+        for user_id in range(1, USERS + 1)
+    }
+
+
+def bench_codec(name: str, dumps, loads, payloads):
+    start = time.perf_counter()
+    encoded = [dumps(p) for p in payloads]
+    save = time.perf_counter() - start
+    start = time.perf_counter()
+    for data in encoded:
+        loads(data)
+    load = time.perf_counter() - start
+    size = sum(len(d) for d in encoded)
+    print(f"{name:16} запись {save * 1000:8.1f} мс, чтение {load * 1000:8.1f} мс, {size / 1024 / 1024:6.1f} МБ")
+
+
+async def bench_store(store: TemplateStore, data):
+    start = time.perf_counter()
+    for user_id, templates in data.items():
+        await store.save_user(user_id, templates)
+    save = time.perf_counter() - start
+    start = time.perf_counter()
+    for user_id in data:
+        store.load_user_sync(user_id)
+    load = time.perf_counter() - start
+    print(f"{'TemplateStore':16} запись {save * 1000:8.1f} мс, чтение {load * 1000:8.1f} мс (с fsync)")
+
+
+def main():
+    data = make_store()
+    print(f"Пользователей: {USERS}, шаблонов: {TEMPLATES_PER_USER}, топиков в шаблоне: {TOPICS_PER_TEMPLATE}")
+
+    start = time.perf_counter()
+    payloads = [[template_to_dict(t) for t in templates] for templates in data.values()]
+    print(f"{'template_to_dict':16} {(time.perf_counter() - start) * 1000:8.1f} мс")
+
+    bench_codec(
+        "json indent=2",
+        lambda p: json.dumps(p, ensure_ascii=False, indent=2).encode("utf-8"),
+        json.loads,
+        payloads
+    )
+    for backend in ("json", "orjson", "msgspec"):
+        codec = JSONCodec(backend)
+        if codec.backend == backend:
+            bench_codec(f"{backend} compact", codec.dumps, codec.loads, payloads)
+
+    root = tempfile.mkdtemp()
+    try:
+        asyncio.run(bench_store(TemplateStore(root), data))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Бенчмарк сохранения шаблонов: прямая запись против отложенной (TemplateWriter).
+
+Много пользователей одновременно правят шаблоны. Прежний путь ждёт записи файла
+на каждую правку; отложенный кладёт изменение в очередь и возвращается сразу,
+а писатель сбрасывает накопленное пачками. Измеряются p50/p99 задержки правки
+и число записей файлов.
+
+Запуск: python -m benchmarks.bench_template_saves
+"""
+import asyncio
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from models.records import TemplateRecord, TopicRecord
+from services.template_store import TemplateStore
+from services.template_writer import TemplateWriter
+
+USERS = 200
+EDITS_PER_USER = 10
+TEMPLATES_PER_USER = 5
+
+
+def make_templates(user_id: int, version: int):
+    topics = tuple(TopicRecord(title=f"Топик {j}") for j in range(10))
+    return [
+        TemplateRecord(f"Шаблон {i}", f"Чат {i} v{version}", "", topics, user_id)
+        for i in range(TEMPLATES_PER_USER)
+    ]
+
+
+class CountingStore(TemplateStore):
+    writes = 0
+
+    async def save_user(self, user_id, templates):
+        self.writes += 1
+        return await super().save_user(user_id, templates)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def run(name: str, save, finish=None):
+    latencies = []
+
+    async def user(user_id: int):
+        for version in range(EDITS_PER_USER):
+            await asyncio.sleep(random.random() * 0.01)
+            start = time.perf_counter()
+            await save(user_id, make_templates(user_id, version))
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user(u) for u in range(1, USERS + 1)))
+    if finish is not None:
+        await finish()
+    total = time.perf_counter() - start
+    print(f"{name:12} p50 {percentile(latencies, 0.5) * 1000:8.2f} мс, "
+          f"p99 {percentile(latencies, 0.99) * 1000:8.2f} мс, всего {total:6.2f} с")
+
+
+async def main():
+    print(f"Пользователей: {USERS}, правок на пользователя: {EDITS_PER_USER}")
+    root = tempfile.mkdtemp()
+    try:
+        direct = CountingStore(os.path.join(root, "direct"))
+        await run("прямая", direct.save_user)
+        print(f"{'':12} записей файлов: {direct.writes}")
+
+        behind = CountingStore(os.path.join(root, "behind"))
+        writer = TemplateWriter(behind)
+
+        async def submit(user_id, templates):
+            writer.submit(user_id, templates)
+
+        await run("отложенная", submit, writer.stop)
+        print(f"{'':12} записей файлов: {behind.writes}, объединено правок: {writer.coalesced}")
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
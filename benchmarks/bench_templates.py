@@ -0,0 +1,80 @@
+"""
+Бенчмарк представления шаблонов в памяти.
+
+Сравнивает pydantic-модели ChatTemplate/Topic (как раньше хранились шаблоны в кэше)
+с компактными TemplateRecord/TopicRecord: время разбора словарей из JSON
+и память на один шаблон (tracemalloc).
+
+Запуск: python -m benchmarks.bench_templates
+"""
+import gc
+import time
+import tracemalloc
+from datetime import datetime
+
+from models.schemas import ChatTemplate, Topic
+from services.template_store import record_from_dict
+
+TEMPLATES = 5000
+TOPICS_PER_TEMPLATE = 20
+
+
+def make_payload():
+    return [
+        {
+            "name": f"Шаблон {i}",
+            "chat_name": f"Чат {i}",
+            "description": "",
+            "topics": [
+                {
+                    "title": f"Топик {j}",
+                    "description": "",
+                    "icon_emoji": "📌" if j % 3 == 0 else None,
+                    "icon_color": 0,
+                    "is_closed": False,
+                    "is_hidden": False
+                }
+                for j in range(TOPICS_PER_TEMPLATE)
+            ],
+            "user_id": 1,
+            "created_at": datetime.now().isoformat()
+        }
+        for i in range(TEMPLATES)
+    ]
+
+
+def pydantic_from_dict(user_id: int, data: dict) -> ChatTemplate:
+    """Прежний путь загрузки: валидация pydantic на каждый шаблон и топик"""
+    return ChatTemplate(
+        name=data["name"],
+        chat_name=data["chat_name"],
+        description=data.get("description", ""),
+        topics=[Topic(**t) for t in data["topics"] if t.get("title")],
+        user_id=user_id,
+        created_at=datetime.fromisoformat(data["created_at"]) if data.get("created_at") else None
+    )
+
+
+def measure(name: str, build, payload):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = [build(1, t) for t in payload]
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:10} загрузка {elapsed * 1000:8.1f} мс, память {size / len(result):8.0f} байт/шаблон")
+    return elapsed, size, result
+
+
+def main():
+    payload = make_payload()
+    print(f"Шаблонов: {TEMPLATES}, топиков в шаблоне: {TOPICS_PER_TEMPLATE}")
+    old_time, old_size, old = measure("pydantic", pydantic_from_dict, payload)
+    del old
+    new_time, new_size, new = measure("records", record_from_dict, payload)
+    print(f"Ускорение загрузки: x{old_time / new_time:.1f}, экономия памяти: x{old_size / new_size:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -46,7 +46,7 @@ async def main():
             await redis.ping()
             logger.info("Successfully connected to Redis")
         except Exception as e:
-            logger.error(f"Failed to connect to Redis: {e}")
+            logger.error("Failed to connect to Redis: %s", e)
             raise
             
         # Initialize Redis storage with custom key builder
@@ -78,7 +78,7 @@ async def main():
         await dp.start_polling(bot)
         
     except Exception as e:
-        logger.error(f"Critical error: {e}", exc_info=True)
+        logger.error("Critical error: %s", e, exc_info=True)
     finally:
         if 'redis' in locals():
             await redis.close()
@@ -95,4 +95,4 @@ if __name__ == '__main__':
     except KeyboardInterrupt:
         logger.info("Bot stopped by user")
     except Exception as e:
-        logger.error(f"Fatal error: {e}", exc_info=True)
+        logger.error("Fatal error: %s", e, exc_info=True)
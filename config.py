@@ -40,8 +40,90 @@ def load_config() -> Config:
 MAX_TOPICS = 20  # Максимальное количество топиков
 MAX_TEMPLATES = 10  # Максимальное количество шаблонов на пользователя
 
+# Создание топиков
+TOPIC_CREATE_CONCURRENCY = 4  # Одновременных запросов к Bot API при создании топиков (темп задаёт retry_after)
+
+# Общий планировщик вызовов Telegram (services/telegram_scheduler.py): (запросов в секунду, всплеск).
+# Это стартовые скорости: после успешных вызовов корзины ускоряются, пока Telegram не ответит FloodWait
+SCHEDULER_BOT_RATE = 25.0  # Bot API, все методы вместе
+SCHEDULER_BOT_BURST = 30
+SCHEDULER_USER_RATE = 5.0  # MTProto (Telethon), все методы вместе
+SCHEDULER_USER_BURST = 10
+SCHEDULER_CHAT_RATE = 1.0  # Вызовы в один чат (массовые вызовы — только после FloodWait в этом чате)
+SCHEDULER_CHAT_BURST = 20
+SCHEDULER_METHOD_LIMITS = {
+    "CreateChannelRequest": (0.2, 2),
+    "InviteToChannelRequest": (0.5, 3),
+    "EditAdminRequest": (1.0, 3),
+    "GetParticipantRequest": (2.0, 5),
+    "get_participants": (0.5, 3),
+}
+SCHEDULER_MAX_RETRIES = 3  # Повторов одного вызова после FloodWait
+SCHEDULER_RATE_GROWTH = 1.1  # Ускорение корзины за успешный вызов, пока в ней не было FloodWait
+SCHEDULER_RATE_STEP = 0.05  # После FloodWait скорость растёт линейно: доля стартовой за успешный вызов
+SCHEDULER_RATE_MAX_FACTOR = 10.0  # Скорость корзины не выше стартовой больше чем во столько раз
+SCHEDULER_MAX_WAIT = 60.0  # FloodWait длиннее — ошибка сразу, без ожидания
+SCHEDULER_INTERACTIVE_MAX_WAIT = 2.0  # То же для ответов пользователю (PRIORITY_INTERACTIVE)
+
+# Кэш сущностей Telethon (пользователи, чаты, бот)
+ENTITY_CACHE_TTL = 3600  # Секунд до повторного разрешения сущности
+ENTITY_CACHE_SIZE = 5000  # Максимум сущностей в памяти
+
+# Проверка участия пользователя в чате
+PARTICIPANT_CACHE_TTL = 300  # Секунд помнить, что пользователь в чате
+PARTICIPANT_NEGATIVE_TTL = 30  # Секунд помнить, что пользователя в чате нет
+PARTICIPANT_SCAN_LIMIT = 200  # Недавних участников просматривается, если id не разрешается
+
+# Очередь создания чатов
+CHAT_JOB_WORKERS = 2  # Чатов, создаваемых одновременно
+CHAT_JOB_QUEUE_SIZE = 100  # Максимум задач в очереди
+
+# Проверка значков для топиков (/test_topic_emojis)
+EMOJI_PROBE_CONCURRENCY = 3  # Одновременных проверок
+EMOJI_PROBE_SKIP_HOURS = 24  # Не перепроверять значки, сработавшие за это время
+
+# Пул соединений BotAPIService
+BOT_API_CONNECTOR_LIMIT = 20  # Максимум соединений в пуле
+BOT_API_CONCURRENCY = 4  # Одновременных запросов в create_topics_batch
+
 # Database settings
 DATABASE_URL = "sqlite+aiosqlite:///bot_data.db"
+# Хранилище шаблонов: "json" (data/templates/<user_id>.json) или "sqlite" (DATABASE_URL)
+TEMPLATE_BACKEND = "json"
+TEMPLATE_CACHE_USERS = 1000  # Пользователей, чьи шаблоны держатся в памяти
+TEMPLATE_FLUSH_DELAY = 0.5  # Секунд тишины перед записью накопленных изменений шаблонов
+TEMPLATE_FLUSH_MAX_DELAY = 2.0  # Максимальная задержка записи при непрерывных правках
+TEMPLATE_RETRY_MAX_DELAY = 60.0  # Предельная пауза между повторами неудачной записи шаблонов
+TEMPLATE_VERIFY_PARANOID = False  # Перечитывать и разбирать файл шаблонов после каждой записи
+# JSON для шаблонов и списков эмодзи: "auto" (orjson, затем msgspec, иначе json), "orjson", "msgspec" или "json"
+JSON_BACKEND = "auto"
+
+# FSM-хранилище: "sqlite" (FSM_SQLITE_PATH), "redis" (FSM_REDIS_URL) или "memory"
+FSM_STORAGE = "sqlite"
+FSM_SQLITE_PATH = "fsm_states.db"
+FSM_REDIS_URL = "redis://localhost:6379/0"
+FSM_STATE_TTL = 24 * 3600  # Незаконченные диалоги старше суток удаляются
+
+# Логирование (services/logging_setup.py)
+LOG_LEVEL = "INFO"  # Общий уровень
+LOG_LEVELS = {  # Уровни отдельных модулей поверх LOG_LEVEL
+    "aiogram.event": "WARNING",  # Строка на каждый апдейт
+    "telethon": "WARNING",
+}
+LOG_FILE = "bot.log"
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+LOG_SAMPLE_EVERY = 100  # Из частых однотипных событий в лог попадает каждое N-е
+
+# Метрики в формате Prometheus (services/metrics.py)
+METRICS_HOST = "127.0.0.1"  # Эндпоинт только для локального сборщика
+METRICS_PORT = 9108  # 0 — не поднимать HTTP-эндпоинт /metrics
+METRICS_FILE = ""  # Путь для выгрузки метрик в файл (пусто — не писать)
+METRICS_FILE_INTERVAL = 15  # Секунд между перезаписями файла метрик
+
+# Время обработчиков (services/handler_timing.py, команда /timings)
+HANDLER_TIMING_WINDOW = 200  # Последних замеров на обработчик / состояние FSM для перцентилей
+SLOW_UPDATE_SECONDS = 1.0  # Обработчики дольше этого пишутся в лог с вызовами Telegram внутри
+HANDLER_TRACE_MAX_SPANS = 50  # Максимум вызовов в трассировке одного обработчика
 
 # Bot settings
 ADMIN_IDS = [int(id) for id in os.getenv("ADMIN_IDS", "").split(",") if id] 
\ No newline at end of file
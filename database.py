@@ -1,14 +1,90 @@
 import aiosqlite
+import asyncio
 import os
-from typing import Optional, List, Tuple
+from collections import OrderedDict
+from typing import Any, Dict, Optional, List, Tuple
+
+# SQL вынесен в константы: один и тот же текст запроса берётся из кэша
+# подготовленных выражений sqlite3 и не компилируется заново
+SQL_SET_MAIN_CHAT = "INSERT INTO main_chat (chat_id, chat_title) VALUES (?, ?)"
+SQL_GET_MAIN_CHAT = "SELECT chat_id, chat_title FROM main_chat LIMIT 1"
+SQL_CLEAR_MAIN_CHAT = "DELETE FROM main_chat"
+SQL_ADD_USER_TOPIC = """
+    INSERT OR REPLACE INTO user_topics
+    (user_id, user_name, topic_id, topic_title)
+    VALUES (?, ?, ?, ?)
+"""
+SQL_GET_USER_TOPIC = "SELECT topic_id, topic_title FROM user_topics WHERE user_id = ?"
+SQL_GET_TOPIC_USER = "SELECT user_id, user_name FROM user_topics WHERE topic_id = ?"
+SQL_GET_ALL_USER_TOPICS = "SELECT user_id, user_name, topic_id, topic_title FROM user_topics LIMIT ?"
+
+_MISSING = object()
+
+class LRUCache:
+    """Ограниченный по размеру LRU-кэш со счётчиками попаданий"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Any, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key) -> Any:
+        """Возвращает значение или _MISSING (None — тоже закэшированный ответ)"""
+        value = self._data.get(key, _MISSING)
+        if value is _MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key):
+        self._data.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
 
 class Database:
-    def __init__(self, db_path: str = "bot_data.db"):
+    def __init__(self, db_path: str = "bot_data.db", cache_size: int = 10000):
         self.db_path = db_path
+        # Связь пользователь <-> топик почти не меняется, держим её в памяти в обе стороны
+        self._user_topic_cache = LRUCache(cache_size)
+        self._topic_user_cache = LRUCache(cache_size)
+        # Увеличивается при каждой записи: ответ, прочитанный до записи, не попадёт в кэш
+        self._cache_generation = 0
+        self._conn: Optional[aiosqlite.Connection] = None
+        self._connect_lock = asyncio.Lock()
+        # Запросы из нескольких выражений не должны перемешиваться с чужим commit
+        self._write_lock = asyncio.Lock()
+
+    async def _get_conn(self) -> aiosqlite.Connection:
+        """Возвращает общее соединение (открывается один раз)"""
+        if self._conn is None:
+            async with self._connect_lock:
+                if self._conn is None:
+                    conn = await aiosqlite.connect(self.db_path)
+                    await conn.execute("PRAGMA journal_mode=WAL")
+                    await conn.execute("PRAGMA synchronous=NORMAL")
+                    self._conn = conn
+        return self._conn
+
+    async def close(self):
+        """Закрывает соединение с базой"""
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
 
     async def init(self):
         """Initialize the database and create necessary tables."""
-        async with aiosqlite.connect(self.db_path) as db:
+        db = await self._get_conn()
+        async with self._write_lock:
             # Create table for main chat
             await db.execute('''
                 CREATE TABLE IF NOT EXISTS main_chat (
@@ -17,7 +93,7 @@ class Database:
                     chat_title TEXT
                 )
             ''')
-            
+
             # Create table for user topics with unique constraint on user_id
             await db.execute('''
                 CREATE TABLE IF NOT EXISTS user_topics (
@@ -28,67 +104,98 @@ class Database:
                     topic_title TEXT
                 )
             ''')
-            
+
+            # Index for get_topic_user (user_id is already indexed by UNIQUE)
+            await db.execute('''
+                CREATE INDEX IF NOT EXISTS ix_user_topics_topic_id ON user_topics (topic_id)
+            ''')
+
             await db.commit()
 
     async def set_main_chat(self, chat_id: int, chat_title: str) -> bool:
         """Set the main chat for the bot."""
-        async with aiosqlite.connect(self.db_path) as db:
+        db = await self._get_conn()
+        async with self._write_lock:
             # Clear existing main chat
-            await db.execute("DELETE FROM main_chat")
-            
+            await db.execute(SQL_CLEAR_MAIN_CHAT)
+
             # Insert new main chat
-            await db.execute(
-                "INSERT INTO main_chat (chat_id, chat_title) VALUES (?, ?)",
-                (chat_id, chat_title)
-            )
+            await db.execute(SQL_SET_MAIN_CHAT, (chat_id, chat_title))
             await db.commit()
             return True
 
     async def get_main_chat(self) -> Optional[Tuple[int, str]]:
         """Get the main chat information."""
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute("SELECT chat_id, chat_title FROM main_chat LIMIT 1") as cursor:
-                row = await cursor.fetchone()
-                return row if row else None
+        db = await self._get_conn()
+        async with db.execute(SQL_GET_MAIN_CHAT) as cursor:
+            row = await cursor.fetchone()
+            return row if row else None
 
     async def remove_main_chat(self) -> bool:
         """Remove the main chat."""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("DELETE FROM main_chat")
+        db = await self._get_conn()
+        async with self._write_lock:
+            await db.execute(SQL_CLEAR_MAIN_CHAT)
             await db.commit()
             return True
 
     async def add_user_topic(self, user_id: int, user_name: str, topic_id: int, topic_title: str) -> bool:
         """Add or update a user topic mapping."""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute(
-                """
-                INSERT OR REPLACE INTO user_topics 
-                (user_id, user_name, topic_id, topic_title) 
-                VALUES (?, ?, ?, ?)
-                """,
-                (user_id, user_name, topic_id, topic_title)
-            )
+        db = await self._get_conn()
+        async with self._write_lock:
+            # INSERT OR REPLACE может заменить старую запись пользователя — её топик тоже сбрасываем
+            async with db.execute(SQL_GET_USER_TOPIC, (user_id,)) as cursor:
+                old = await cursor.fetchone()
+            await db.execute(SQL_ADD_USER_TOPIC, (user_id, user_name, topic_id, topic_title))
             await db.commit()
+            self._cache_generation += 1
+            if old:
+                self._topic_user_cache.pop(old[0])
+            self._topic_user_cache.pop(topic_id)
+            self._user_topic_cache.set(user_id, (topic_id, topic_title))
             return True
 
     async def get_user_topic(self, user_id: int) -> Optional[Tuple[int, str]]:
         """Get the topic ID and title for a user."""
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute(
-                "SELECT topic_id, topic_title FROM user_topics WHERE user_id = ?",
-                (user_id,)
-            ) as cursor:
-                row = await cursor.fetchone()
-                return row if row else None
+        cached = self._user_topic_cache.get(user_id)
+        if cached is not _MISSING:
+            return cached
+        generation = self._cache_generation
+        db = await self._get_conn()
+        async with db.execute(SQL_GET_USER_TOPIC, (user_id,)) as cursor:
+            row = await cursor.fetchone()
+            result = tuple(row) if row else None
+        if generation == self._cache_generation:
+            self._user_topic_cache.set(user_id, result)
+        return result
 
     async def get_topic_user(self, topic_id: int) -> Optional[Tuple[int, str]]:
         """Get the user ID and name for a topic."""
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute(
-                "SELECT user_id, user_name FROM user_topics WHERE topic_id = ?",
-                (topic_id,)
-            ) as cursor:
-                row = await cursor.fetchone()
-                return row if row else None 
\ No newline at end of file
+        cached = self._topic_user_cache.get(topic_id)
+        if cached is not _MISSING:
+            return cached
+        generation = self._cache_generation
+        db = await self._get_conn()
+        async with db.execute(SQL_GET_TOPIC_USER, (topic_id,)) as cursor:
+            row = await cursor.fetchone()
+            result = tuple(row) if row else None
+        if generation == self._cache_generation:
+            self._topic_user_cache.set(topic_id, result)
+        return result
+
+    async def warm_cache(self) -> int:
+        """Заполняет кэш связей пользователь <-> топик при старте. Возвращает число записей"""
+        db = await self._get_conn()
+        async with db.execute(SQL_GET_ALL_USER_TOPICS, (self._user_topic_cache.maxsize,)) as cursor:
+            rows = await cursor.fetchall()
+        for user_id, user_name, topic_id, topic_title in rows:
+            self._user_topic_cache.set(user_id, (topic_id, topic_title))
+            self._topic_user_cache.set(topic_id, (user_id, user_name))
+        return len(rows)
+
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        """Счётчики попаданий/промахов кэша для обоих направлений"""
+        return {
+            "user_topic": self._user_topic_cache.stats(),
+            "topic_user": self._topic_user_cache.stats()
+        }
@@ -2,12 +2,14 @@ from aiogram import Dispatcher
 from .commands import register_commands
 from services.telethon_service import TelethonService
 from .forum_handlers import router as forum_router
+from .errors import router as errors_router
 
 def register_all_handlers(dp: Dispatcher, telethon_service: TelethonService) -> None:
     """
     Регистрация всех обработчиков
     """
     # Регистрируем роутеры
+    dp.include_router(errors_router)
     dp.include_router(forum_router)
     
     handlers = (
@@ -6,7 +6,7 @@ from keyboards.reply import get_main_keyboard
 import logging
 
 logger = logging.getLogger(__name__)
-router = Router()
+router = Router(name=__name__)
 
 @router.message(F.text == "🔑 Сделать меня админом")
 async def handle_make_admin(message: Message, state: FSMContext, telethon: TelethonService):
@@ -24,7 +24,7 @@ async def handle_make_admin(message: Message, state: FSMContext, telethon: Telet
             await state.clear()
             return
             
-        logger.info(f"Attempting to make user {message.from_user.id} admin in chat {chat_id}")
+        logger.info("Attempting to make user %s admin in chat %s", message.from_user.id, chat_id)
         
         # Пытаемся назначить пользователя админом
         success = await telethon.make_chat_admin(chat_id, message.from_user.id)
@@ -41,7 +41,7 @@ async def handle_make_admin(message: Message, state: FSMContext, telethon: Telet
             )
             
     except Exception as e:
-        logger.error(f"Error in handle_make_admin: {e}")
+        logger.error("Error in handle_make_admin: %s", e)
         await message.answer(
             "❌ Произошла ошибка при назначении администратором.",
             reply_markup=get_main_keyboard()
@@ -4,10 +4,11 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from handlers.forum_handlers import load_working_emojis
-import json
+from services.emoji_registry import emoji_registry
 import logging
 
-router = Router()
+router = Router(name=__name__)
+logger = logging.getLogger(__name__)
 
 class BotForumTopicStates(StatesGroup):
     waiting_for_name = State()
@@ -52,8 +53,6 @@ async def process_topic_description_bot(message: types.Message, state: FSMContex
         builder2.button(text=emoji, callback_data=f"select_bot_emoji:{emoji}")
     builder2.adjust(5)
     await message.answer("Выберите иконку для топика (часть 2):", reply_markup=builder2.as_markup())
-    
-    await state.update_data(emoji_map=emoji_map)
 
 @router.callback_query(F.data.startswith("select_bot_emoji:"))
 async def process_emoji_selection_bot(callback: types.CallbackQuery, state: FSMContext, bot: Bot):
@@ -64,14 +63,10 @@ async def process_emoji_selection_bot(callback: types.CallbackQuery, state: FSMC
     chat_id = callback.message.chat.id
     
     try:
-        # Загружаем рабочий список эмодзи
-        with open("working_topic_emojis.json", "r", encoding="utf-8") as f:
-            working_emoji_map = json.load(f)
-        
         # Получаем emoji_id из рабочего списка
-        emoji_id = working_emoji_map.get(emoji)
+        emoji_id = emoji_registry.get_id(emoji)
         if not emoji_id:
-            logger.warning(f"Эмодзи {emoji} не найден в рабочем списке")
+            logger.warning("Эмодзи %s не найден в рабочем списке", emoji)
             await callback.message.edit_text("❌ Ошибка: выбранный значок не поддерживается для топиков. Выберите другой из списка.")
             return
 
@@ -83,6 +78,6 @@ async def process_emoji_selection_bot(callback: types.CallbackQuery, state: FSMC
         await callback.message.edit_text(f"✅ Топик '{topic_name}' создан с иконкой {emoji}!")
         await state.clear()
     except Exception as e:
-        logger.error(f"Ошибка при создании топика: {e}")
+        logger.error("Ошибка при создании топика: %s", e)
         await callback.message.edit_text(f"❌ Ошибка при создании топика: {str(e)}")
         await state.clear() 
\ No newline at end of file
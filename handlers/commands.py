@@ -4,7 +4,7 @@ from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton, ReplyKey
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 import json
-from typing import List, Union
+from typing import List, Optional, Union
 import logging
 import os
 import io
@@ -15,18 +15,16 @@ import asyncio
 from models.schemas import ChatCreate, ChatTemplate, Topic
 from services.telethon_service import TelethonService, BotApiService
 from services.database import DatabaseService
+from services.template_store import template_to_dict
+from services.chat_jobs import ChatCreationQueue, ChatCreationJob
 from states import ChatStates, TemplateCreation, TemplateManagement, ChatCreation
 from middlewares import TelethonMiddleware
 from keyboards.emoji import get_emoji_keyboard
-from aiogram import Bot
 from telethon.tl.functions.channels import InviteToChannelRequest, EditAdminRequest
 from telethon.tl.types import ChatAdminRights
 
 logger = logging.getLogger(__name__)
 
-# Configure logging
-logger.setLevel(logging.DEBUG)
-
 # Константы для валидации
 MAX_CHAT_NAME_LENGTH = 128
 MAX_DESCRIPTION_LENGTH = 255
@@ -121,6 +119,168 @@ def validate_topic_name(name: str) -> tuple[bool, str]:
         return False, f"Название топика не может быть длиннее {MAX_TOPIC_NAME_LENGTH} символов"
     return True, ""
 
+async def get_created_chat_id(state: FSMContext) -> Optional[int]:
+    """ID последнего созданного чата (on_done пишет его в данные FSM, они переживают перезапуск)"""
+    return (await state.get_data()).get("created_chat_id")
+
+async def enqueue_chat_creation(message: Message, state: FSMContext, chat_jobs: ChatCreationQueue, chat_data: ChatCreate):
+    """
+    Ставит создание чата в очередь. Статусное сообщение обновляет воркер, итог — on_done.
+    ID созданного чата (для кнопки «Сделать меня админом») on_done сохраняет в данных FSM
+    """
+    await state.clear()
+    status_msg = await message.answer("⏳ Заявка на создание чата принята...", reply_markup=get_main_keyboard())
+
+    async def on_done(job: ChatCreationJob):
+        result = job.result
+        if not result:
+            await status_msg.edit_text("❌ Не удалось создать чат. Попробуйте позже.")
+            return
+        # Состояние очищено при постановке в очередь: сохраняется только ID чата
+        await state.update_data(created_chat_id=result['chat_id'])
+        summary = (
+            f"Название: {result['chat_name']}\n"
+            f"Топиков создано: {result.get('topics_created', 0)} из {len(chat_data.topics)}"
+        )
+        if result.get('user_added'):
+            await status_msg.edit_text(f"✅ Чат успешно создан! Вы уже добавлены и назначены админом.\n\n{summary}")
+            return
+        await status_msg.edit_text(f"✅ Чат успешно создан!\n\n{summary}")
+        await message.answer(
+            f"🔗 <b>Ссылка для входа:</b> {result.get('invite_link')}\n\n"
+            f"<b>Внимание:</b> Вы не были автоматически добавлены в чат (лимит Telegram или настройки приватности).\n"
+            f"1. Перейдите по ссылке выше и войдите в чат.\n"
+            f"2. После входа нажмите кнопку ниже, чтобы стать админом.",
+            reply_markup=InlineKeyboardMarkup(
+                inline_keyboard=[
+                    [InlineKeyboardButton(text="🔑 Сделать меня админом", callback_data="make_admin")]
+                ]
+            ),
+            parse_mode="HTML"
+        )
+
+    try:
+        job = chat_jobs.submit(message.from_user.id, chat_data, status_msg, on_done)
+    except asyncio.QueueFull:
+        await status_msg.edit_text("❌ Сейчас создаётся слишком много чатов. Попробуйте через несколько минут.")
+        return
+    if job is None:
+        await status_msg.edit_text("⏳ У вас уже создаётся чат. Дождитесь его завершения.")
+        return
+    position = chat_jobs.position(job)
+    if position > 1:
+        await status_msg.edit_text(f"⏳ Заявка в очереди, перед вами: {position - 1}")
+
+# Поля черновика шаблона. В FSM хранится только ссылка на сохранённый шаблон (template_ref)
+# и поля, которые пользователь изменил, а не весь шаблон целиком. Полный список topics
+# хранится только у нового шаблона; у сохранённого — правки топиков:
+# topic_overrides (индекс в шаблоне -> изменённые поля), topics_removed (индексы), topics_added
+DRAFT_FIELDS = ("template_name", "chat_name", "chat_description", "topics")
+
+def template_to_draft(template: ChatTemplate) -> dict:
+    """Преобразует сохранённый шаблон в черновик"""
+    data = template_to_dict(template)
+    return {
+        "template_name": data["name"],
+        "chat_name": data["chat_name"],
+        "chat_description": data["description"],
+        "topics": data["topics"]
+    }
+
+async def load_template_draft(state: FSMContext, telethon: TelethonService, user_id: int) -> dict:
+    """Собирает черновик: шаблон по template_ref + изменённые поля из состояния"""
+    data = await state.get_data()
+    draft = {}
+    template_ref = data.get("template_ref")
+    if template_ref:
+        template = await telethon.get_user_template(user_id, template_ref)
+        if template:
+            draft = template_to_draft(template)
+    draft.update({key: data[key] for key in DRAFT_FIELDS if key in data})
+    if "topics" not in data:
+        draft["topics"] = apply_topic_diff(draft.get("topics", []), data)
+    return draft
+
+def _topics_in_state(data: dict) -> bool:
+    """Черновик нового шаблона (или старая запись FSM): весь список topics лежит в состоянии"""
+    return "topics" in data or not data.get("template_ref")
+
+def apply_topic_diff(base: list, data: dict) -> list:
+    """Топики сохранённого шаблона с правками из состояния"""
+    removed = set(data.get("topics_removed", ()))
+    overrides = data.get("topic_overrides", {})
+    topics = [{**topic, **overrides.get(str(i), {})} for i, topic in enumerate(base) if i not in removed]
+    return topics + [dict(topic) for topic in data.get("topics_added", ())]
+
+async def _template_topic_count(data: dict, telethon: TelethonService, user_id: int) -> int:
+    template_ref = data.get("template_ref")
+    template = await telethon.get_user_template(user_id, template_ref) if template_ref else None
+    return len(template.topics) if template else 0
+
+async def _topic_source(data: dict, telethon: TelethonService, user_id: int, index: int):
+    """Позиция в черновике -> (True, индекс в шаблоне) или (False, индекс в topics_added)"""
+    removed = set(data.get("topics_removed", ()))
+    kept = [i for i in range(await _template_topic_count(data, telethon, user_id)) if i not in removed]
+    if index < len(kept):
+        return True, kept[index]
+    return False, index - len(kept)
+
+async def set_draft_topic(state: FSMContext, telethon: TelethonService, user_id: int, index: int, **fields):
+    """Меняет поля топика черновика (в состояние пишется только правка)"""
+    data = await state.get_data()
+    if index is None or index < 0:
+        return
+    if _topics_in_state(data):
+        topics = data.get("topics", [])
+        if index < len(topics):
+            topics[index].update(fields)
+            await state.update_data(topics=topics)
+        return
+    from_template, i = await _topic_source(data, telethon, user_id, index)
+    if from_template:
+        overrides = data.get("topic_overrides", {})
+        overrides[str(i)] = {**overrides.get(str(i), {}), **fields}
+        await state.update_data(topic_overrides=overrides)
+    else:
+        added = data.get("topics_added", [])
+        if i < len(added):
+            added[i].update(fields)
+            await state.update_data(topics_added=added)
+
+async def remove_draft_topic(state: FSMContext, telethon: TelethonService, user_id: int, index: int):
+    """Удаляет топик из черновика"""
+    data = await state.get_data()
+    if _topics_in_state(data):
+        topics = data.get("topics", [])
+        topics.pop(index)
+        await state.update_data(topics=topics)
+        return
+    from_template, i = await _topic_source(data, telethon, user_id, index)
+    if from_template:
+        overrides = data.get("topic_overrides", {})
+        overrides.pop(str(i), None)
+        await state.update_data(topics_removed=data.get("topics_removed", []) + [i], topic_overrides=overrides)
+    else:
+        added = data.get("topics_added", [])
+        added.pop(i)
+        await state.update_data(topics_added=added)
+
+async def add_draft_topic(state: FSMContext, topic: dict):
+    """Добавляет топик в конец черновика"""
+    data = await state.get_data()
+    key = "topics" if _topics_in_state(data) else "topics_added"
+    await state.update_data({key: data.get(key, []) + [topic]})
+
+def chat_topics(topics: list) -> List[Topic]:
+    """Топики для создания чата; описание "." означает «без описания»"""
+    result = []
+    for t in topics:
+        topic = t if isinstance(t, Topic) else Topic(**t)
+        if topic.description == ".":
+            topic = topic.model_copy(update={"description": ""})
+        result.append(topic)
+    return result
+
 # Создаем роутер на уровне модуля
 router = Router(name=__name__)
 
@@ -166,7 +326,6 @@ async def process_topic_emoji_selection(callback: CallbackQuery, state: FSMConte
         return
     emoji = callback.data.replace("emoji_", "")
     data = await state.get_data()
-    topics = data.get("topics", [])
     description = data.get("current_topic_description", "")
     # Если описание пустое, ставим точку
     if not description:
@@ -179,8 +338,9 @@ async def process_topic_emoji_selection(callback: CallbackQuery, state: FSMConte
         "is_closed": False,
         "is_hidden": False
     }
-    topics.append(new_topic)
-    await state.update_data(topics=topics)
+    # Новый шаблон: его черновик и есть список топиков
+    await add_draft_topic(state, new_topic)
+    topics = (await state.get_data())["topics"]
     preview = format_template_preview(data["template_name"], data["chat_name"], topics, data.get("chat_description", ""))
     await callback.message.edit_reply_markup()
     await callback.message.answer(
@@ -199,7 +359,6 @@ async def process_topic_emoji_selection(callback: CallbackQuery, state: FSMConte
 @router.message(TemplateCreation.waiting_topic_emoji, F.text == ".")
 async def skip_topic_emoji_creation(message: Message, state: FSMContext):
     data = await state.get_data()
-    topics = data.get("topics", [])
     new_topic = {
         "title": data["current_topic_name"],
         "description": data.get("current_topic_description", ""),
@@ -208,8 +367,9 @@ async def skip_topic_emoji_creation(message: Message, state: FSMContext):
         "is_closed": False,
         "is_hidden": False
     }
-    topics.append(new_topic)
-    await state.update_data(topics=topics)
+    # Новый шаблон: его черновик и есть список топиков
+    await add_draft_topic(state, new_topic)
+    topics = (await state.get_data())["topics"]
     preview = format_template_preview(data["template_name"], data["chat_name"], topics, data.get("chat_description", ""))
     await message.answer(
         f"{preview}\n\nВыберите действие:",
@@ -227,11 +387,10 @@ async def skip_topic_emoji_creation(message: Message, state: FSMContext):
 async def handle_admin_actions(callback: CallbackQuery, state: FSMContext, telethon: TelethonService):
     """Handle admin action callbacks"""
     try:
-        logger.info(f"Processing admin action: {callback.data}")
+        logger.info("Processing admin action: %s", callback.data)
         
-        # Get chat_id from state
-        state_data = await state.get_data()
-        chat_id = state_data.get("created_chat_id")
+        # Get chat_id of the last created chat from state
+        chat_id = await get_created_chat_id(state)
         
         if not chat_id:
             logger.error("No chat_id found in state")
@@ -240,7 +399,7 @@ async def handle_admin_actions(callback: CallbackQuery, state: FSMContext, telet
             return
 
         if callback.data == "make_admin":
-            logger.info(f"Making user {callback.from_user.id} admin in chat {chat_id}")
+            logger.info("Making user %s admin in chat %s", callback.from_user.id, chat_id)
             # Show processing message
             await callback.answer("⏳ Назначаю вас администратором...", show_alert=False)
             
@@ -266,7 +425,7 @@ async def handle_admin_actions(callback: CallbackQuery, state: FSMContext, telet
                         ])
                     )
             except Exception as e:
-                logger.error(f"Error making user admin: {str(e)}", exc_info=True)
+                logger.error("Error making user admin: %s", str(e), exc_info=True)
                 await callback.message.edit_text(
                     "❌ Произошла ошибка при назначении администратором.\n"
                     "Попробуйте позже или обратитесь к владельцу бота.",
@@ -290,7 +449,7 @@ async def handle_admin_actions(callback: CallbackQuery, state: FSMContext, telet
         await state.clear()
         
     except Exception as e:
-        logger.error(f"Error in handle_admin_actions: {str(e)}", exc_info=True)
+        logger.error("Error in handle_admin_actions: %s", str(e), exc_info=True)
         await callback.answer("❌ Произошла ошибка", show_alert=True)
         await state.clear()
 
@@ -331,9 +490,8 @@ async def make_me_admin_callback(callback: CallbackQuery, state: FSMContext, tel
 async def process_admin_request(message: Message, state: FSMContext, telethon: TelethonService, user_id: int):
     """Общая логика обработки запроса на получение прав администратора"""
     try:
-        # Получаем данные из состояния
-        state_data = await state.get_data()
-        chat_id = state_data.get("created_chat_id")
+        # ID последнего созданного чата из состояния
+        chat_id = await get_created_chat_id(state)
         
         if not chat_id:
             await message.answer(
@@ -346,7 +504,7 @@ async def process_admin_request(message: Message, state: FSMContext, telethon: T
         # Отправляем сообщение о процессе
         status_msg = await message.answer("⏳ Назначаю вас супер-администратором...")
         
-        logger.info(f"Attempting to make user {user_id} super admin in chat {chat_id}")
+        logger.info("Attempting to make user %s super admin in chat %s", user_id, chat_id)
         
         # Пытаемся сделать пользователя супер-администратором
         success = await telethon.make_chat_admin(chat_id, user_id)
@@ -371,7 +529,7 @@ async def process_admin_request(message: Message, state: FSMContext, telethon: T
             )
             
     except Exception as e:
-        logger.error(f"Error in process_admin_request: {str(e)}", exc_info=True)
+        logger.error("Error in process_admin_request: %s", str(e), exc_info=True)
         await message.answer(
             "❌ Произошла ошибка при назначении администратора.",
             reply_markup=get_main_keyboard()
@@ -391,14 +549,8 @@ async def skip_admin(callback: CallbackQuery, state: FSMContext):
 
 @router.message(F.text == "📁 Мои шаблоны")
 async def show_templates(message: Message, state: FSMContext, telethon: TelethonService):
+    # Имена шаблонов уникальны (проверяется при сохранении), дубликатов в списке нет
     templates = await telethon.get_user_templates(message.from_user.id)
-    # Фильтруем по уникальному имени шаблона (или паре name+chat_name)
-    unique = {}
-    for t in templates:
-        key = (t.name, t.chat_name)
-        if key not in unique:
-            unique[key] = t
-    templates = list(unique.values())
     if not templates:
         await message.answer(
             "У вас пока нет сохраненных шаблонов.\nСоздайте новый шаблон с помощью кнопки '🛠 Создать шаблон'",
@@ -429,9 +581,9 @@ async def handle_template_selection(message: Message, state: FSMContext, teletho
         )
         return
 
-    templates = await telethon.get_user_templates(message.from_user.id)
-    selected_template = next((t for t in templates if t.name == message.text), None)
+    selected_template = await telethon.get_user_template(message.from_user.id, message.text)
     if not selected_template:
+        templates = await telethon.get_user_templates(message.from_user.id)
         await message.answer(
             "❌ Шаблон не найден. Пожалуйста, выберите шаблон из списка.",
             reply_markup=ReplyKeyboardMarkup(
@@ -442,7 +594,8 @@ async def handle_template_selection(message: Message, state: FSMContext, teletho
             )
         )
         return
-    await state.update_data(selected_template=selected_template.dict(), original_template_name=selected_template.name)
+    # Новый выбор сбрасывает правки, оставшиеся от предыдущего шаблона
+    await state.set_data({"template_ref": selected_template.name})
     # Вместо цикла по топикам выводим предпросмотр всего шаблона
     topics_text = format_template_preview(
         selected_template.name,
@@ -464,7 +617,7 @@ async def handle_template_selection(message: Message, state: FSMContext, teletho
     await state.set_state(TemplateManagement.selected_template)
 
 @router.message(TemplateManagement.selected_template)
-async def handle_template_actions(message: Message, state: FSMContext, telethon: TelethonService):
+async def handle_template_actions(message: Message, state: FSMContext, telethon: TelethonService, chat_jobs: ChatCreationQueue):
     """Обработчик действий с выбранным шаблоном"""
     if message.text == "🔙 Назад к списку":
         # Возвращаемся к списку шаблонов
@@ -472,18 +625,18 @@ async def handle_template_actions(message: Message, state: FSMContext, telethon:
         return
 
     if message.text == "❌ Удалить":
-        # Получаем данные шаблона из состояния
+        # Получаем ссылку на шаблон из состояния
         data = await state.get_data()
-        template = data.get("selected_template")
-        if not template:
+        template_name = data.get("template_ref")
+        if not template_name:
             await message.answer("❌ Ошибка: шаблон не найден", reply_markup=get_main_keyboard())
             await state.clear()
             return
             
         # Удаляем шаблон
-        if await telethon.delete_template(message.from_user.id, template["name"]):
+        if await telethon.delete_template(message.from_user.id, template_name):
             await message.answer(
-                f"✅ Шаблон '{template['name']}' успешно удален!",
+                f"✅ Шаблон '{template_name}' успешно удален!",
                 reply_markup=get_main_keyboard()
             )
         else:
@@ -495,9 +648,9 @@ async def handle_template_actions(message: Message, state: FSMContext, telethon:
         return
 
     elif message.text == "🚀 Создать чат":
-        # Получаем данные шаблона из состояния
+        # Получаем шаблон по ссылке из состояния
         data = await state.get_data()
-        template = data.get("selected_template")
+        template = await telethon.get_user_template(message.from_user.id, data.get("template_ref"))
         if not template:
             await message.answer("❌ Ошибка: шаблон не найден", reply_markup=get_main_keyboard())
             await state.clear()
@@ -506,50 +659,15 @@ async def handle_template_actions(message: Message, state: FSMContext, telethon:
         # Создаем чат из шаблона
         try:
             chat_data = ChatCreate(
-                title=template["chat_name"],
-                description=template["description"],
-                topics=[Topic(**t) for t in template["topics"]]
+                title=template.chat_name,
+                description=template.description or "",
+                topics=template.topics
             )
-            
-            # Отправляем сообщение о начале создания
-            status_msg = await message.answer("⏳ Создаю чат из шаблона...")
-            
-            # Создаем форум-чат через Telethon
-            result = await telethon.create_forum(chat_data, message.from_user.id)
-            if result:
-                if result.get('user_added'):
-                    await status_msg.edit_text(
-                        f"✅ Чат успешно создан! Вы уже добавлены и назначены админом. (подождите 1 минуту до создания всех топиков)\n\n"
-                        f"Название: {result['chat_name']}"
-                    )
-                    await state.clear()
-                    await cmd_start(message, state)
-                    return
-                else:
-                    invite_link = result.get('invite_link')
-                    await status_msg.edit_text(
-                        f"✅ Чат успешно создан!\n\n"
-                        f"🔗 <b>Ссылка для входа:</b> {invite_link}\n\n"
-                        f"<b>Внимание:</b> Вы не были автоматически добавлены в чат (лимит Telegram или настройки приватности).\n"
-                        f"1. Перейдите по ссылке выше и войдите в чат.\n"
-                        f"2. После входа нажмите кнопку ниже, чтобы стать админом.",
-                        reply_markup=InlineKeyboardMarkup(
-                            inline_keyboard=[
-                                [InlineKeyboardButton(text="🔑 Сделать меня админом", callback_data="make_admin")]
-                            ]
-                        ),
-                        parse_mode="HTML"
-                    )
-                    await state.update_data(created_chat_id=result['chat_id'])
-                    return
-            else:
-                await status_msg.edit_text(
-                    "❌ Не удалось создать чат. Попробуйте позже.",
-                    reply_markup=None
-                )
-                await state.clear()
+
+            # Создание идёт в фоне, итог сообщит очередь
+            await enqueue_chat_creation(message, state, chat_jobs, chat_data)
         except Exception as e:
-            logger.error(f"Error creating chat from template: {e}")
+            logger.error("Error creating chat from template: %s", e)
             await message.answer(
                 "❌ Произошла ошибка при создании чата.",
                 reply_markup=get_main_keyboard()
@@ -560,8 +678,7 @@ async def handle_template_actions(message: Message, state: FSMContext, telethon:
     elif message.text == "✏️ Редактировать":
         # Логика редактирования шаблона
         data = await state.get_data()
-        template = data.get("selected_template")
-        if not template:
+        if not data.get("template_ref"):
             await message.answer("❌ Ошибка: шаблон не найден", reply_markup=get_main_keyboard())
             await state.clear()
             return
@@ -612,7 +729,7 @@ async def create_template_start(message: Message, state: FSMContext):
 @router.message(TemplateCreation.waiting_template_name)
 async def process_template_name(message: Message, state: FSMContext):
     """Обработка названия шаблона"""
-    logger.info(f"Обработка названия шаблона: {message.text}")
+    logger.info("Обработка названия шаблона: %s", message.text)
     
     if message.text == "❌ Отменить":
         await state.clear()
@@ -637,7 +754,7 @@ async def process_template_name(message: Message, state: FSMContext):
 @router.message(TemplateCreation.waiting_name)
 async def process_chat_name_for_template(message: Message, state: FSMContext):
     """Обработка названия чата для шаблона"""
-    logger.info(f"Обработка названия чата для шаблона: {message.text}")
+    logger.info("Обработка названия чата для шаблона: %s", message.text)
     
     if message.text == "❌ Отменить":
         await state.clear()
@@ -663,7 +780,7 @@ async def process_chat_name_for_template(message: Message, state: FSMContext):
 @router.message(TemplateCreation.waiting_description)
 async def process_template_description(message: Message, state: FSMContext):
     """Обработка описания чата для шаблона"""
-    logger.info(f"Обработка описания чата для шаблона: {message.text}")
+    logger.info("Обработка описания чата для шаблона: %s", message.text)
     
     if message.text == "❌ Отменить":
         await state.clear()
@@ -779,64 +896,25 @@ async def finish_topics(message: Message, state: FSMContext):
     await state.set_state(TemplateManagement.completed)
 
 @router.message(TemplateManagement.completed, F.text.func(lambda t: t and t.strip() == "⚡️ Создать чат"))
-async def create_chat_from_template(message: Message, state: FSMContext, telethon: TelethonService, bot: Bot):
-    data = await state.get_data()
+async def create_chat_from_template(message: Message, state: FSMContext, telethon: TelethonService, chat_jobs: ChatCreationQueue):
+    draft = await load_template_draft(state, telethon, message.from_user.id)
     try:
-        template_name = data.get("template_name")
-        chat_name = data.get("chat_name")
-        chat_description = data.get("chat_description", "")
-        topics = data.get("topics", [])
+        chat_name = draft.get("chat_name")
+        chat_description = draft.get("chat_description") or ""
+        topics = draft.get("topics", [])
         if not chat_name or not topics:
             await message.answer("❌ Ошибка: не хватает данных для создания чата.", reply_markup=get_main_keyboard())
             await state.clear()
             return
-        clean_topics = []
-        for t in topics:
-            t = dict(t) if isinstance(t, dict) else t.dict()
-            if t.get("description", "") == ".":
-                t["description"] = ""
-            clean_topics.append(Topic(**t))
         chat_data = ChatCreate(
             title=chat_name,
             description=chat_description,
-            topics=clean_topics
+            topics=chat_topics(topics)
         )
-        status_msg = await message.answer("⏳ Создаю чат из шаблона...")
-        result = await telethon.create_forum(chat_data, message.from_user.id)
-        if result:
-            if result.get('user_added'):
-                await status_msg.edit_text(
-                    f"✅ Чат успешно создан! Вы уже добавлены и назначены админом. (подождите 1 минуту до создания всех топиков)\n\n"
-                    f"Название: {result['chat_name']}"
-                )
-                await state.clear()
-                await cmd_start(message, state)
-                return
-            else:
-                invite_link = result.get('invite_link')
-                await status_msg.edit_text(
-                    f"✅ Чат успешно создан!\n\n"
-                    f"🔗 <b>Ссылка для входа:</b> {invite_link}\n\n"
-                    f"<b>Внимание:</b> Вы не были автоматически добавлены в чат (лимит Telegram или настройки приватности).\n"
-                    f"1. Перейдите по ссылке выше и войдите в чат.\n"
-                    f"2. После входа нажмите кнопку ниже, чтобы стать админом.",
-                    reply_markup=InlineKeyboardMarkup(
-                        inline_keyboard=[
-                            [InlineKeyboardButton(text="🔑 Сделать меня админом", callback_data="make_admin")]
-                        ]
-                    ),
-                    parse_mode="HTML"
-                )
-                await state.update_data(created_chat_id=result['chat_id'])
-                return
-        else:
-            await status_msg.edit_text(
-                "❌ Не удалось создать чат. Попробуйте позже.",
-                reply_markup=None
-            )
-            await state.clear()
+        # Создание идёт в фоне, итог сообщит очередь
+        await enqueue_chat_creation(message, state, chat_jobs, chat_data)
     except Exception as e:
-        logger.error(f"Error creating chat from template (completed menu): {e}")
+        logger.error("Error creating chat from template (completed menu): %s", e)
         await message.answer(
             "❌ Произошла ошибка при создании чата.",
             reply_markup=get_main_keyboard()
@@ -846,11 +924,11 @@ async def create_chat_from_template(message: Message, state: FSMContext, teletho
 @router.message(TemplateManagement.completed, F.text.func(lambda t: t and t.strip() == "💾 Сохранить шаблон"))
 async def save_template(message: Message, state: FSMContext, telethon: TelethonService):
     data = await state.get_data()
-    template = data.get("selected_template") or data
-    template_name = template.get("template_name") or template.get("name")
-    chat_name = template.get("chat_name")
-    chat_description = template.get("chat_description") or template.get("description")
-    topics = template.get("topics")
+    draft = await load_template_draft(state, telethon, message.from_user.id)
+    template_name = draft.get("template_name")
+    chat_name = draft.get("chat_name")
+    chat_description = draft.get("chat_description")
+    topics = draft.get("topics")
     if not template_name or not chat_name or not topics or not isinstance(topics, list) or len(topics) == 0:
         await message.answer("❌ Не хватает данных для сохранения шаблона. Похоже, шаблон повреждён.", reply_markup=get_main_keyboard())
         await state.clear()
@@ -864,35 +942,28 @@ async def save_template(message: Message, state: FSMContext, telethon: TelethonS
             user_id=message.from_user.id
         )
         # Если редактируется существующий шаблон, передаём old_name
-        if "selected_template" in data:
-            old_name = data["selected_template"].get("name") or data["selected_template"].get("template_name")
-            result = await telethon.save_chat_template(
-                user_id=message.from_user.id,
-                template=chat_template,
-                old_name=old_name
-            )
-        else:
-            result = await telethon.save_chat_template(
-                user_id=message.from_user.id,
-                template=chat_template
-            )
+        result = await telethon.save_chat_template(
+            user_id=message.from_user.id,
+            template=chat_template,
+            old_name=data.get("template_ref")
+        )
         if result:
             await message.answer("Шаблон сохранён!", reply_markup=get_main_keyboard())
         else:
             await message.answer("❌ Не удалось сохранить шаблон.", reply_markup=get_main_keyboard())
     except Exception as e:
-        logger.error(f"Error saving template: {e}")
+        logger.error("Error saving template: %s", e)
         await message.answer("❌ Произошла ошибка при сохранении шаблона.", reply_markup=get_main_keyboard())
     await state.clear()
 
 @router.message(TemplateManagement.completed, F.text.func(lambda t: t and t.strip() == "🚀 Сохранить и создать"))
-async def save_and_create(message: Message, state: FSMContext, telethon: TelethonService):
+async def save_and_create(message: Message, state: FSMContext, telethon: TelethonService, chat_jobs: ChatCreationQueue):
     data = await state.get_data()
-    template = data.get("selected_template") or data
-    template_name = template.get("template_name") or template.get("name")
-    chat_name = template.get("chat_name")
-    chat_description = template.get("chat_description") or template.get("description")
-    topics = template.get("topics")
+    draft = await load_template_draft(state, telethon, message.from_user.id)
+    template_name = draft.get("template_name")
+    chat_name = draft.get("chat_name")
+    chat_description = draft.get("chat_description")
+    topics = draft.get("topics")
     if not template_name or not chat_name or not topics or not isinstance(topics, list) or len(topics) == 0:
         await message.answer("❌ Не хватает данных для сохранения шаблона. Похоже, шаблон повреждён.", reply_markup=get_main_keyboard())
         await state.clear()
@@ -906,69 +977,25 @@ async def save_and_create(message: Message, state: FSMContext, telethon: Teletho
             user_id=message.from_user.id
         )
         # Сохраняем шаблон
-        if "selected_template" in data:
-            old_name = data["selected_template"].get("name") or data["selected_template"].get("template_name")
-            save_result = await telethon.save_chat_template(
-                user_id=message.from_user.id,
-                template=chat_template,
-                old_name=old_name
-            )
-        else:
-            save_result = await telethon.save_chat_template(
-                user_id=message.from_user.id,
-                template=chat_template
-            )
+        save_result = await telethon.save_chat_template(
+            user_id=message.from_user.id,
+            template=chat_template,
+            old_name=data.get("template_ref")
+        )
         if not save_result:
             await message.answer("❌ Не удалось сохранить шаблон.", reply_markup=get_main_keyboard())
             await state.clear()
             return
-        clean_topics = []
-        for t in topics:
-            t = dict(t) if isinstance(t, dict) else t.dict()
-            if t.get("description", "") == ".":
-                t["description"] = ""
-            clean_topics.append(Topic(**t))
+        # Топики уже проверены при сборке шаблона — не валидируем их второй раз
         chat_data = ChatCreate(
             title=chat_name,
             description=chat_description,
-            topics=clean_topics
+            topics=chat_topics(chat_template.topics)
         )
-        status_msg = await message.answer("⏳ Создаю чат из шаблона...")
-        result = await telethon.create_forum(chat_data, message.from_user.id)
-        if result:
-            if result.get('user_added'):
-                await status_msg.edit_text(
-                    f"✅ Чат успешно создан! Вы уже добавлены и назначены админом. (подождите 1 минуту до создания всех топиков)\n\n"
-                    f"Название: {result['chat_name']}"
-                )
-                await state.clear()
-                await cmd_start(message, state)
-                return
-            else:
-                invite_link = result.get('invite_link')
-                await status_msg.edit_text(
-                    f"✅ Чат успешно создан!\n\n"
-                    f"🔗 <b>Ссылка для входа:</b> {invite_link}\n\n"
-                    f"<b>Внимание:</b> Вы не были автоматически добавлены в чат (лимит Telegram или настройки приватности).\n"
-                    f"1. Перейдите по ссылке выше и войдите в чат.\n"
-                    f"2. После входа нажмите кнопку ниже, чтобы стать админом.",
-                    reply_markup=InlineKeyboardMarkup(
-                        inline_keyboard=[
-                            [InlineKeyboardButton(text="🔑 Сделать меня админом", callback_data="make_admin")]
-                        ]
-                    ),
-                    parse_mode="HTML"
-                )
-                await state.update_data(created_chat_id=result['chat_id'])
-                return
-        else:
-            await status_msg.edit_text(
-                "❌ Не удалось создать чат. Попробуйте позже.",
-                reply_markup=None
-            )
-            await state.clear()
+        # Создание идёт в фоне, итог сообщит очередь
+        await enqueue_chat_creation(message, state, chat_jobs, chat_data)
     except Exception as e:
-        logger.error(f"Error in save_and_create: {e}")
+        logger.error("Error in save_and_create: %s", e)
         await message.answer("❌ Произошла ошибка при сохранении шаблона или создании чата.", reply_markup=get_main_keyboard())
         await state.clear()
 
@@ -1000,9 +1027,9 @@ async def add_topic_in_edit(message: Message, state: FSMContext):
     )
 
 @router.message(TemplateManagement.adding_topic_name)
-async def process_new_topic_name_in_edit(message: Message, state: FSMContext):
+async def process_new_topic_name_in_edit(message: Message, state: FSMContext, telethon: TelethonService):
     if message.text == "❌ Отменить добавление":
-        await handle_edit_topics(message, state)
+        await handle_edit_topics(message, state, telethon)
         return
     is_valid, error_message = validate_topic_name(message.text)
     if not is_valid:
@@ -1019,9 +1046,9 @@ async def process_new_topic_name_in_edit(message: Message, state: FSMContext):
     )
 
 @router.message(TemplateManagement.adding_topic_description)
-async def process_new_topic_description_in_edit(message: Message, state: FSMContext):
+async def process_new_topic_description_in_edit(message: Message, state: FSMContext, telethon: TelethonService):
     if message.text == "❌ Отменить добавление":
-        await handle_edit_topics(message, state)
+        await handle_edit_topics(message, state, telethon)
         return
     await state.update_data(current_topic_description=(message.text if message.text != "." else ""))
     from handlers.forum_handlers import load_working_emojis
@@ -1047,29 +1074,19 @@ async def process_new_topic_description_in_edit(message: Message, state: FSMCont
     await state.set_state(TemplateManagement.adding_topic_emoji)
 
 @router.message(TemplateManagement.adding_topic_emoji, F.text.in_([".", "Пропустить", "Очистить эмодзи"]))
-async def skip_edit_topic_emoji(message: Message, state: FSMContext):
+async def skip_edit_topic_emoji(message: Message, state: FSMContext, telethon: TelethonService):
     data = await state.get_data()
-    topics = data.get("topics", [])
-    idx = data.get("editing_topic_index")
-    if idx is not None and 0 <= idx < len(topics):
-        topics[idx]["icon_emoji"] = None
-        await state.update_data(topics=topics)
-        # Синхронизируем с selected_template
-        if "selected_template" in data:
-            selected = data["selected_template"]
-            selected["topics"] = topics
-            await state.update_data(selected_template=selected)
+    await set_draft_topic(state, telethon, message.from_user.id, data.get("editing_topic_index"), icon_emoji=None)
     await message.answer("Эмодзи топика очищено!")
-    await handle_edit_topics(message, state)
+    await handle_edit_topics(message, state, telethon)
 
 @router.message(TemplateManagement.editing_topics, F.text == "✅ Завершить изменения")
-async def finish_editing_topics(message: Message, state: FSMContext):
-    data = await state.get_data()
-    template = data.get("selected_template", data)
+async def finish_editing_topics(message: Message, state: FSMContext, telethon: TelethonService):
+    draft = await load_template_draft(state, telethon, message.from_user.id)
     preview = format_template_preview(
-        template.get("template_name") or template.get("name"),
-        template.get("chat_name"),
-        template.get("topics", [])
+        draft.get("template_name"),
+        draft.get("chat_name"),
+        draft.get("topics", [])
     )
     await message.answer(
         f"✅ Шаблон обновлён!\n\n{preview}\n\nВыберите действие:",
@@ -1087,9 +1104,8 @@ async def cancel_editing_topics(message: Message, state: FSMContext):
 
 # --- Исправленные фильтры для кнопок ---
 @router.message(TemplateManagement.editing_topics, F.text.func(lambda t: t and t.strip() == "✏️ Изменить топик"))
-async def handle_edit_topic_select(message: Message, state: FSMContext):
-    data = await state.get_data()
-    topics = data.get("topics", [])
+async def handle_edit_topic_select(message: Message, state: FSMContext, telethon: TelethonService):
+    topics = (await load_template_draft(state, telethon, message.from_user.id))["topics"]
     if not topics:
         await message.answer("Нет топиков для изменения.")
         return
@@ -1104,9 +1120,8 @@ async def handle_edit_topic_select(message: Message, state: FSMContext):
     await state.set_state(TemplateManagement.editing_topic_select)
 
 @router.message(TemplateManagement.editing_topics, F.text == "🗑 Удалить топик")
-async def handle_delete_topic_select(message: Message, state: FSMContext):
-    data = await state.get_data()
-    topics = data.get("topics", [])
+async def handle_delete_topic_select(message: Message, state: FSMContext, telethon: TelethonService):
+    topics = (await load_template_draft(state, telethon, message.from_user.id))["topics"]
     if not topics:
         await message.answer("Нет топиков для удаления.")
         return
@@ -1121,15 +1136,12 @@ async def handle_delete_topic_select(message: Message, state: FSMContext):
     await state.set_state(TemplateManagement.deleting_topic_select)
 
 @router.message(TemplateManagement.deleting_topic_select)
-async def handle_delete_topic(message: Message, state: FSMContext):
-    import logging
-    logger = logging.getLogger(__name__)
-    logger.warning(f"[DEBUG] handle_delete_topic: message.text={message.text}, state={await state.get_state()}")
-    data = await state.get_data()
-    topics = data.get("topics", [])
+async def handle_delete_topic(message: Message, state: FSMContext, telethon: TelethonService):
+    logger.debug("[DEBUG] handle_delete_topic: message.text=%s", message.text)
+    topics = (await load_template_draft(state, telethon, message.from_user.id))["topics"]
     text = message.text.strip()
     if text == "❌ Отмена":
-        await handle_edit_topics(message, state)
+        await handle_edit_topics(message, state, telethon)
         return
     try:
         if text[0].isdigit() and "." in text:
@@ -1139,18 +1151,12 @@ async def handle_delete_topic(message: Message, state: FSMContext):
         if topic_index is None or topic_index < 0 or topic_index >= len(topics):
             raise ValueError
     except Exception:
-        logger.warning(f"[DEBUG] handle_delete_topic: failed to find topic_index for text={text}")
+        logger.debug("[DEBUG] handle_delete_topic: failed to find topic_index for text=%s", text)
         await message.answer("❌ Ошибка: не удалось найти выбранный топик", reply_markup=ReplyKeyboardMarkup(keyboard=[[KeyboardButton(text="❌ Отмена")]], resize_keyboard=True))
         return
-    logger.warning(f"[DEBUG] handle_delete_topic: deleting topic_index={topic_index}")
-    topics.pop(topic_index)
-    await state.update_data(topics=topics)
-    # Синхронизируем с selected_template
-    if "selected_template" in data:
-        selected = data["selected_template"]
-        selected["topics"] = topics
-        await state.update_data(selected_template=selected)
-    await handle_edit_topics(message, state)
+    logger.debug("[DEBUG] handle_delete_topic: deleting topic_index=%s", topic_index)
+    await remove_draft_topic(state, telethon, message.from_user.id, topic_index)
+    await handle_edit_topics(message, state, telethon)
 
 # --- Блокировка ручного ввода ---
 @router.message(TemplateManagement.editing_topics)
@@ -1163,22 +1169,21 @@ async def back_to_main_menu(message: Message, state: FSMContext):
     await cmd_start(message, state)
 
 @router.message(F.text == "🔙 Назад")
-async def back_generic(message: Message, state: FSMContext):
+async def back_generic(message: Message, state: FSMContext, telethon: TelethonService):
     current_state = await state.get_state()
     # Назад из выбора топика для редактирования/удаления — к списку топиков
     if current_state in ["TemplateManagement:editing_topic_select", "TemplateManagement:deleting_topic_select"]:
-        await handle_edit_topics(message, state)
+        await handle_edit_topics(message, state, telethon)
     # Назад из добавления топика — к списку топиков
     elif current_state in ["TemplateManagement.adding_topic_name", "TemplateManagement.adding_topic_description"]:
-        await handle_edit_topics(message, state)
+        await handle_edit_topics(message, state, telethon)
     # Назад из меню редактирования — к завершённому шаблону
     elif current_state == "TemplateManagement.editing":
-        data = await state.get_data()
-        template = data.get("selected_template", data)
+        draft = await load_template_draft(state, telethon, message.from_user.id)
         preview = format_template_preview(
-            template.get("template_name") or template.get("name"),
-            template.get("chat_name"),
-            template.get("topics", [])
+            draft.get("template_name"),
+            draft.get("chat_name"),
+            draft.get("topics", [])
         )
         await message.answer(
             f"Текущий шаблон:\n\n{preview}\n\nВыберите, что хотите отредактировать:",
@@ -1205,16 +1210,15 @@ async def edit_chat_description_emoji(message: Message, state: FSMContext):
     await state.set_state(TemplateManagement.editing_chat_description)
 
 @router.message(TemplateManagement.editing, F.text == "📑 Изменить топики")
-async def edit_topics_emoji(message: Message, state: FSMContext):
-    await handle_edit_topics(message, state)
+async def edit_topics_emoji(message: Message, state: FSMContext, telethon: TelethonService):
+    await handle_edit_topics(message, state, telethon)
 
 @router.message(TemplateManagement.editing_topic_select)
-async def handle_edit_topic_field_select(message: Message, state: FSMContext):
-    data = await state.get_data()
-    topics = data.get("topics", [])
+async def handle_edit_topic_field_select(message: Message, state: FSMContext, telethon: TelethonService):
+    topics = (await load_template_draft(state, telethon, message.from_user.id))["topics"]
     text = message.text.strip()
     if text == "❌ Отмена":
-        await handle_edit_topics(message, state)
+        await handle_edit_topics(message, state, telethon)
         return
     try:
         if text[0].isdigit() and "." in text:
@@ -1243,46 +1247,28 @@ async def handle_edit_topic_field_select(message: Message, state: FSMContext):
     await state.set_state(TemplateManagement.editing_topic_field_select)
 
 @router.message(TemplateManagement.editing_topic_field_select, F.text == "✏️ Изменить название")
-async def process_edit_topic_name(message: Message, state: FSMContext):
+async def process_edit_topic_name(message: Message, state: FSMContext, telethon: TelethonService):
     if message.text == "❌ Отмена":
-        await handle_edit_topics(message, state)
+        await handle_edit_topics(message, state, telethon)
         return
     is_valid, error_message = validate_topic_name(message.text)
     if not is_valid:
         await message.answer(f"❌ {error_message}\n\nПожалуйста, введите другое название:")
         return
     data = await state.get_data()
-    topics = data.get("topics", [])
-    idx = data.get("editing_topic_index")
-    if idx is not None and 0 <= idx < len(topics):
-        topics[idx]["title"] = message.text
-        await state.update_data(topics=topics)
-        # Синхронизируем с selected_template
-        if "selected_template" in data:
-            selected = data["selected_template"]
-            selected["topics"] = topics
-            await state.update_data(selected_template=selected)
+    await set_draft_topic(state, telethon, message.from_user.id, data.get("editing_topic_index"), title=message.text)
     await message.answer("Название топика обновлено!", reply_markup=ReplyKeyboardMarkup(keyboard=[[KeyboardButton(text="❌ Отмена")]], resize_keyboard=True))
-    await handle_edit_topics(message, state)
+    await handle_edit_topics(message, state, telethon)
 
 @router.message(TemplateManagement.editing_topic_field_select, F.text == "📝 Изменить описание")
-async def process_edit_topic_description(message: Message, state: FSMContext):
+async def process_edit_topic_description(message: Message, state: FSMContext, telethon: TelethonService):
     if message.text == "❌ Отмена":
-        await handle_edit_topics(message, state)
+        await handle_edit_topics(message, state, telethon)
         return
     data = await state.get_data()
-    topics = data.get("topics", [])
-    idx = data.get("editing_topic_index")
-    if idx is not None and 0 <= idx < len(topics):
-        topics[idx]["description"] = message.text if message.text != "." else "."
-        await state.update_data(topics=topics)
-        # Синхронизируем с selected_template
-        if "selected_template" in data:
-            selected = data["selected_template"]
-            selected["topics"] = topics
-            await state.update_data(selected_template=selected)
+    await set_draft_topic(state, telethon, message.from_user.id, data.get("editing_topic_index"), description=message.text)
     await message.answer("Описание топика обновлено!", reply_markup=ReplyKeyboardMarkup(keyboard=[[KeyboardButton(text="❌ Отмена")]], resize_keyboard=True))
-    await handle_edit_topics(message, state)
+    await handle_edit_topics(message, state, telethon)
 
 @router.message(TemplateManagement.editing_topic_field_select, F.text == "🎨 Изменить эмодзи")
 async def select_edit_topic_emoji(message: Message, state: FSMContext):
@@ -1317,27 +1303,18 @@ async def select_edit_topic_emoji(message: Message, state: FSMContext):
     await state.set_state(TemplateManagement.editing_topic_emoji)
 
 @router.callback_query(TemplateManagement.editing_topic_emoji)
-async def process_edit_topic_emoji(callback: CallbackQuery, state: FSMContext):
+async def process_edit_topic_emoji(callback: CallbackQuery, state: FSMContext, telethon: TelethonService):
     current_state = await state.get_state()
-    logger.warning(f"[DEBUG] process_edit_topic_emoji: callback.data={callback.data}, state={current_state}")
+    logger.debug("[DEBUG] process_edit_topic_emoji: callback.data=%s, state=%s", callback.data, current_state)
     if not callback.data or not callback.data.startswith("edit_emoji_"):
         await callback.answer("Пожалуйста, выберите эмодзи с клавиатуры.", show_alert=True)
         return
     emoji = callback.data.replace("edit_emoji_", "")
     data = await state.get_data()
-    topics = data.get("topics", [])
-    idx = data.get("editing_topic_index")
-    if idx is not None and 0 <= idx < len(topics):
-        topics[idx]["icon_emoji"] = emoji
-        await state.update_data(topics=topics)
-        # Синхронизируем с selected_template
-        if "selected_template" in data:
-            selected = data["selected_template"]
-            selected["topics"] = topics
-            await state.update_data(selected_template=selected)
+    await set_draft_topic(state, telethon, callback.from_user.id, data.get("editing_topic_index"), icon_emoji=emoji)
     await callback.message.edit_reply_markup()
     await callback.message.answer("Эмодзи топика обновлено!")
-    await handle_edit_topics(callback.message, state)
+    await handle_edit_topics(callback.message, state, telethon)
 
 @router.message(F.text == "⚡️ Создать форум-чат/шаблон")
 async def handle_create_forum_chat(message: Message, state: FSMContext):
@@ -1345,68 +1322,38 @@ async def handle_create_forum_chat(message: Message, state: FSMContext):
     await create_template_start(message, state)
 
 @router.message(TemplateManagement.editing_template_name)
-async def save_template_name(message: Message, state: FSMContext):
-    data = await state.get_data()
+async def save_template_name(message: Message, state: FSMContext, telethon: TelethonService):
     await state.update_data(template_name=message.text)
-    # Синхронизируем selected_template, если есть
-    if "selected_template" in data:
-        selected = data["selected_template"]
-        selected["template_name"] = message.text
-        selected["name"] = message.text
-        await state.update_data(selected_template=selected)
-        template = selected
-    else:
-        template = data
-        template["template_name"] = message.text
-        template["name"] = message.text
+    draft = await load_template_draft(state, telethon, message.from_user.id)
     preview = format_template_preview(
-        template.get("template_name") or template.get("name"),
-        template.get("chat_name"),
-        template.get("topics", [])
+        draft.get("template_name"),
+        draft.get("chat_name"),
+        draft.get("topics", [])
     )
     await message.answer(f"Название шаблона обновлено!\n\n{preview}", reply_markup=get_edit_keyboard())
     await state.set_state(TemplateManagement.editing)
 
 @router.message(TemplateManagement.editing_chat_name)
-async def save_chat_name(message: Message, state: FSMContext):
-    data = await state.get_data()
+async def save_chat_name(message: Message, state: FSMContext, telethon: TelethonService):
     await state.update_data(chat_name=message.text)
-    if "selected_template" in data:
-        selected = data["selected_template"]
-        selected["chat_name"] = message.text
-        await state.update_data(selected_template=selected)
-        template = selected
-    else:
-        template = data
-        template["chat_name"] = message.text
+    draft = await load_template_draft(state, telethon, message.from_user.id)
     preview = format_template_preview(
-        template.get("template_name") or template.get("name"),
-        template.get("chat_name"),
-        template.get("topics", [])
+        draft.get("template_name"),
+        draft.get("chat_name"),
+        draft.get("topics", [])
     )
     await message.answer(f"Название чата обновлено!\n\n{preview}", reply_markup=get_edit_keyboard())
     await state.set_state(TemplateManagement.editing)
 
 @router.message(TemplateManagement.editing_chat_description)
-async def save_chat_description(message: Message, state: FSMContext):
-    data = await state.get_data()
-    # Всегда обновляем и chat_description, и description везде
-    await state.update_data(chat_description=message.text, description=message.text)
-    if "selected_template" in data:
-        selected = data["selected_template"]
-        selected["chat_description"] = message.text
-        selected["description"] = message.text
-        await state.update_data(selected_template=selected)
-        template = selected
-    else:
-        template = data
-        template["chat_description"] = message.text
-        template["description"] = message.text
+async def save_chat_description(message: Message, state: FSMContext, telethon: TelethonService):
+    await state.update_data(chat_description=message.text)
+    draft = await load_template_draft(state, telethon, message.from_user.id)
     preview = format_template_preview(
-        template.get("template_name") or template.get("name"),
-        template.get("chat_name"),
-        template.get("topics", []),
-        template.get("chat_description") or template.get("description")
+        draft.get("template_name"),
+        draft.get("chat_name"),
+        draft.get("topics", []),
+        draft.get("chat_description")
     )
     await message.answer(f"Описание чата обновлено!\n\n{preview}", reply_markup=get_edit_keyboard())
     await state.set_state(TemplateManagement.editing)
@@ -1429,7 +1376,7 @@ async def cancel_template_creation(message: Message, state: FSMContext):
 async def cancel_any_template_creation(message: Message, state: FSMContext):
     current_state = await state.get_state()
     if current_state and str(current_state).startswith("TemplateCreation"):
-        logger.info(f"[CANCEL] Universal cancel handler called, state: {current_state}")
+        logger.info("[CANCEL] Universal cancel handler called, state: %s", current_state)
         await state.clear()
         await message.answer("Создание шаблона отменено.", reply_markup=get_main_keyboard())
 
@@ -1441,11 +1388,11 @@ async def cancel_template_topics(message: Message, state: FSMContext):
 @router.message(TemplateManagement.editing, F.text == "💾 Сохранить изменения")
 async def save_template_editing(message: Message, state: FSMContext, telethon: TelethonService):
     data = await state.get_data()
-    template = data.get("selected_template", data)
-    template_name = template.get("template_name") or template.get("name")
-    chat_name = template.get("chat_name")
-    chat_description = template.get("chat_description") or template.get("description")
-    topics = template.get("topics", [])
+    draft = await load_template_draft(state, telethon, message.from_user.id)
+    template_name = draft.get("template_name")
+    chat_name = draft.get("chat_name")
+    chat_description = draft.get("chat_description")
+    topics = draft.get("topics", [])
     if not template_name or not chat_name or not topics:
         await message.answer("❌ Не хватает данных для сохранения шаблона.", reply_markup=get_main_keyboard())
         await state.clear()
@@ -1459,7 +1406,7 @@ async def save_template_editing(message: Message, state: FSMContext, telethon: T
             user_id=message.from_user.id
         )
         # Используем оригинальное имя для поиска
-        old_name = data.get("original_template_name") or template.get("name")
+        old_name = data.get("template_ref") or template_name
         result = await telethon.save_chat_template(
             user_id=message.from_user.id,
             template=chat_template,
@@ -1470,26 +1417,19 @@ async def save_template_editing(message: Message, state: FSMContext, telethon: T
         else:
             await message.answer("❌ Не удалось сохранить изменения.", reply_markup=get_main_keyboard())
     except Exception as e:
-        logger.error(f"Error saving template (editing): {e}")
+        logger.error("Error saving template (editing): %s", e)
         await message.answer("❌ Произошла ошибка при сохранении изменений.", reply_markup=get_main_keyboard())
     await state.clear()
 
 # --- Обработчик редактирования топиков ---
-async def handle_edit_topics(message, state):
+async def handle_edit_topics(message, state, telethon):
     """Обработчик редактирования топиков"""
-    data = await state.get_data()
-    template = data.get("selected_template", data)
-    template_name = template.get("template_name") or template.get("name")
-    chat_name = template.get("chat_name")
-    topics = template.get("topics", [])
-    chat_description = template.get("chat_description") or template.get("description")
-    # Явно обновляем все ключевые поля
-    await state.update_data(
-        template_name=template_name,
-        chat_name=chat_name,
-        chat_description=chat_description,
-        topics=topics
-    )
+    # Бот работает в личных чатах: chat.id совпадает с ID пользователя (в т.ч. для callback.message)
+    draft = await load_template_draft(state, telethon, message.chat.id)
+    template_name = draft.get("template_name")
+    chat_name = draft.get("chat_name")
+    topics = draft.get("topics", [])
+    chat_description = draft.get("chat_description")
     preview = format_template_preview(template_name, chat_name, topics, chat_description)
     await message.answer(
         f"📑 Текущие топики:\n\n{preview}\n\nВыберите действие:",
@@ -1502,33 +1442,23 @@ async def test_all_callbacks(callback: CallbackQuery, state: FSMContext):
     current_state = await state.get_state()
     if current_state and current_state != "None":
         return
-    logger.warning(f"[DEBUG] Callback data: {callback.data}")
+    logger.debug("[DEBUG] Callback data: %s", callback.data)
     await callback.answer("Callback получен (debug)", show_alert=True)
 
 @router.message(TemplateManagement.editing_topic_emoji, F.text.in_([".", "Пропустить", "Очистить эмодзи"]))
-async def skip_editing_topic_emoji(message: Message, state: FSMContext):
+async def skip_editing_topic_emoji(message: Message, state: FSMContext, telethon: TelethonService):
     data = await state.get_data()
-    topics = data.get("topics", [])
-    idx = data.get("editing_topic_index")
-    if idx is not None and 0 <= idx < len(topics):
-        topics[idx]["icon_emoji"] = None
-        await state.update_data(topics=topics)
-        # Синхронизируем с selected_template
-        if "selected_template" in data:
-            selected = data["selected_template"]
-            selected["topics"] = topics
-            await state.update_data(selected_template=selected)
+    await set_draft_topic(state, telethon, message.from_user.id, data.get("editing_topic_index"), icon_emoji=None)
     await message.answer("Эмодзи топика очищено!")
-    await handle_edit_topics(message, state)
+    await handle_edit_topics(message, state, telethon)
 
 @router.callback_query(TemplateManagement.adding_topic_emoji)
-async def process_add_topic_emoji(callback: CallbackQuery, state: FSMContext):
+async def process_add_topic_emoji(callback: CallbackQuery, state: FSMContext, telethon: TelethonService):
     if not callback.data or not callback.data.startswith("add_emoji_"):
         await callback.answer("Пожалуйста, выберите эмодзи с клавиатуры.", show_alert=True)
         return
     emoji = callback.data.replace("add_emoji_", "")
     data = await state.get_data()
-    topics = data.get("topics", [])
     new_topic = {
         "title": data["current_topic_name"],
         "description": data.get("current_topic_description", ""),
@@ -1537,14 +1467,9 @@ async def process_add_topic_emoji(callback: CallbackQuery, state: FSMContext):
         "is_closed": False,
         "is_hidden": False
     }
-    topics.append(new_topic)
-    await state.update_data(topics=topics)
-    # Синхронизируем с selected_template
-    if "selected_template" in data:
-        selected = data["selected_template"]
-        selected["topics"] = topics
-        await state.update_data(selected_template=selected)
-    preview = format_template_preview(data.get("template_name") or data.get("name"), data.get("chat_name"), topics, data.get("chat_description", ""))
+    await add_draft_topic(state, new_topic)
+    draft = await load_template_draft(state, telethon, callback.from_user.id)
+    preview = format_template_preview(draft.get("template_name"), draft.get("chat_name"), draft["topics"], draft.get("chat_description", ""))
     await callback.message.edit_reply_markup()
     await callback.message.answer(
         f"{preview}\n\nВыберите действие:",
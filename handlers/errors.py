@@ -0,0 +1,28 @@
+import logging
+import math
+
+from aiogram import Router
+from aiogram.filters import ExceptionTypeFilter
+from aiogram.types import ErrorEvent
+
+from services.telegram_scheduler import FloodWaitTooLong
+
+router = Router(name=__name__)
+logger = logging.getLogger(__name__)
+
+@router.errors(ExceptionTypeFilter(FloodWaitTooLong))
+async def flood_wait_error(event: ErrorEvent):
+    """Telegram ограничил частоту запросов: сообщаем пользователю, а не держим обработчик минутами"""
+    error = event.exception
+    logger.warning("[FLOOD] Обработчик прерван: %s", error)
+    text = f"⏳ Telegram временно ограничил запросы бота. Попробуйте ещё раз через {math.ceil(error.retry_after)} сек."
+    update = event.update
+    try:
+        if update.callback_query:
+            await update.callback_query.answer(text, show_alert=True)
+        elif update.message:
+            await update.message.answer(text)
+    except Exception as e:
+        # Ограничение может касаться и самого ответа
+        logger.warning("[FLOOD] Не удалось предупредить пользователя: %s", e)
+    return True
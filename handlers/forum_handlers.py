@@ -5,24 +5,20 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from services.forum_utils import change_topic_icon, generate_invite_link, smart_change_icon, STANDARD_EMOJIS
 from services.telethon_service import TelethonService
+from services.emoji_registry import emoji_registry
+from services.emoji_probe import start_probe
+from services.handler_timing import handler_timings
 import logging
-import json
-import os
 
-router = Router()
+router = Router(name=__name__)
 logger = logging.getLogger(__name__)
 
-WORKING_EMOJI_FILE = "working_topic_emojis.json"
-
 def save_working_emojis(emoji_map):
-    with open(WORKING_EMOJI_FILE, "w", encoding="utf-8") as f:
-        json.dump(emoji_map, f, ensure_ascii=False)
+    emoji_registry.save(emoji_map)
 
 def load_working_emojis():
-    if os.path.exists(WORKING_EMOJI_FILE):
-        with open(WORKING_EMOJI_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return None
+    """Рабочий список эмодзи из кэша реестра (None, если списка нет)"""
+    return emoji_registry.get_map() or None
 
 class ForumTopicStates(StatesGroup):
     waiting_for_name = State()
@@ -53,7 +49,7 @@ async def process_topic_description(message: types.Message, state: FSMContext, b
             await message.answer("❌ Рабочий список значков не найден. Пожалуйста, обновите его командой /refresh_topic_emojis")
             await state.clear()
             return
-        logger.info(f"[EMOJI MAP - FINAL] {emoji_map}")
+        logger.debug("[EMOJI MAP] Рабочих значков: %d", len(emoji_map))
         # Популярные эмодзи (можно расширить или изменить порядок)
         popular_emojis = ["📄", "🏆", "❤️", "👑", "💬", "📚", "📦", "📊", "📈", "📉", "📁", "📂", "📒", "📕", "📗"]
         # Оставляем только те, что реально есть в emoji_map
@@ -68,7 +64,6 @@ async def process_topic_description(message: types.Message, state: FSMContext, b
         all_emojis = list(emoji_map.keys())
         all_emojis_text = ' '.join(all_emojis)
         await message.answer(f"Если нужного значка нет на кнопках выше, скопируйте его из списка ниже и отправьте сообщением:\n{all_emojis_text}")
-        await state.update_data(emoji_map=emoji_map)
     except Exception as e:
         await message.answer(f"Ошибка при получении списка эмодзи для топиков: {e}")
         await state.clear()
@@ -97,21 +92,16 @@ async def process_emoji_selection(
     chat_id = data.get("chat_id") or callback.message.chat.id
     topic_name = data["topic_name"]
     topic_description = data["topic_description"]
-    emoji_map = data.get("emoji_map")
     
     try:
-        # Загружаем рабочий список эмодзи
-        with open("working_topic_emojis.json", "r", encoding="utf-8") as f:
-            working_emoji_map = json.load(f)
-        
         # Получаем emoji_id из рабочего списка
-        emoji_id = working_emoji_map.get(emoji)
+        emoji_id = emoji_registry.get_id(emoji)
         if not emoji_id:
-            logger.warning(f"Эмодзи {emoji} не найден в рабочем списке")
+            logger.warning("Эмодзи %s не найден в рабочем списке", emoji)
             await callback.message.answer("❌ Ошибка: выбранный значок не поддерживается для топиков. Выберите другой из списка.")
             return
 
-        logger.info(f"[TOPIC CREATE] chat_id={chat_id} title={topic_name} emoji={emoji} emoji_id={emoji_id}")
+        logger.info("[TOPIC CREATE] chat_id=%s title=%s emoji=%s emoji_id=%s", chat_id, topic_name, emoji, emoji_id)
         topic = await bot.create_forum_topic(
             chat_id=chat_id,
             name=topic_name,
@@ -123,7 +113,7 @@ async def process_emoji_selection(
         await state.clear()
         return
     except Exception as e:
-        logger.error(f"[TOPIC CREATE ERROR] chat_id={chat_id} title={topic_name} emoji={emoji} error={e}")
+        logger.error("[TOPIC CREATE ERROR] chat_id=%s title=%s emoji=%s error=%s", chat_id, topic_name, emoji, e)
         await callback.message.edit_text(
             f"❌ Ошибка при создании топика: {str(e)}"
         )
@@ -172,12 +162,8 @@ async def process_emoji_text(message: types.Message, state: FSMContext, bot: Bot
     emoji = message.text.strip()
     
     try:
-        # Загружаем рабочий список эмодзи
-        with open("working_topic_emojis.json", "r", encoding="utf-8") as f:
-            working_emoji_map = json.load(f)
-        
         # Получаем emoji_id из рабочего списка
-        emoji_id = working_emoji_map.get(emoji)
+        emoji_id = emoji_registry.get_id(emoji)
         if not emoji_id:
             await message.answer("❌ Такой эмодзи нельзя использовать для иконки топика. Выберите из разрешённых (можно нажать на кнопку или скопировать из списка выше).")
             return
@@ -185,7 +171,7 @@ async def process_emoji_text(message: types.Message, state: FSMContext, bot: Bot
         topic_name = data["topic_name"]
         chat_id = message.chat.id
         
-        logger.info(f"[TOPIC CREATE] chat_id={chat_id} title={topic_name} emoji={emoji} emoji_id={emoji_id}")
+        logger.info("[TOPIC CREATE] chat_id=%s title=%s emoji=%s emoji_id=%s", chat_id, topic_name, emoji, emoji_id)
         await bot.create_forum_topic(
             chat_id=chat_id,
             name=topic_name,
@@ -194,75 +180,44 @@ async def process_emoji_text(message: types.Message, state: FSMContext, bot: Bot
         await message.answer(f"✅ Топик '{topic_name}' создан с иконкой {emoji}!")
         await state.clear()
     except Exception as e:
-        logger.error(f"[TOPIC CREATE ERROR] chat_id={chat_id} title={topic_name} emoji={emoji} error={e}")
+        logger.error("[TOPIC CREATE ERROR] chat_id=%s title=%s emoji=%s error=%s", chat_id, topic_name, emoji, e)
         await message.answer(f"❌ Ошибка при создании топика: {str(e)}")
         await state.clear()
 
 @router.message(Command("test_topic_emojis"))
 async def test_topic_emojis(message: types.Message, bot: Bot):
-    chat_id = message.chat.id
-    try:
-        stickers = await bot.get_forum_topic_icon_stickers()
-        emoji_map = {s.emoji: s.custom_emoji_id for s in stickers if s.custom_emoji_id}
-        working = {}
-        failed = []
-        await message.answer("⏳ Начинаю тест значков. Это может занять несколько минут из-за лимитов Telegram.")
-        import asyncio
-        for i, (emoji, emoji_id) in enumerate(emoji_map.items()):
-            try:
-                topic = await bot.create_forum_topic(
-                    chat_id=chat_id,
-                    name=f"test_{emoji}",
-                    icon_custom_emoji_id=emoji_id
-                )
-                working[emoji] = emoji_id
-                await asyncio.sleep(1.5)
-                await bot.delete_forum_topic(chat_id=chat_id, message_thread_id=topic.message_thread_id)
-            except Exception as e:
-                failed.append((emoji, str(e)))
-                await asyncio.sleep(1.5)
-        if working:
-            save_working_emojis(working)
-            text = '\n'.join([f"{emoji} — <code>{emoji_id}</code>" for emoji, emoji_id in working.items()])
-            await message.answer(f"<b>Рабочие значки для топиков в этом чате сохранены:</b>\n{text}", parse_mode="HTML")
-        else:
-            await message.answer("❌ Не удалось создать ни одного топика с этими значками. Telegram ограничил доступ.")
-        if failed:
-            await message.answer(f"<b>Не сработали:</b>\n" + '\n'.join([f"{emoji}: {err}" for emoji, err in failed]), parse_mode="HTML")
-    except Exception as e:
-        await message.answer(f"Ошибка теста: {e}")
+    """Проверяет значки в фоне; недавно сработавшие и уже проверенные пропускаются."""
+    status_msg = await message.answer("⏳ Начинаю тест значков. Прогресс будет обновляться в этом сообщении.")
+    if not start_probe(bot, message.chat.id, status_msg, "Рабочие значки для топиков в этом чате сохранены:"):
+        await status_msg.edit_text("⏳ Проверка значков в этом чате уже идёт.")
 
 @router.message(Command("refresh_topic_emojis"))
 async def refresh_topic_emojis(message: types.Message, bot: Bot):
     """Принудительно обновляет рабочий список emoji_id для топиков (перезапускает тест)."""
-    chat_id = message.chat.id
-    try:
-        stickers = await bot.get_forum_topic_icon_stickers()
-        emoji_map = {s.emoji: s.custom_emoji_id for s in stickers if s.custom_emoji_id}
-        working = {}
-        failed = []
-        await message.answer("⏳ Обновляю рабочий список значков. Это может занять несколько минут из-за лимитов Telegram.")
-        import asyncio
-        for i, (emoji, emoji_id) in enumerate(emoji_map.items()):
-            try:
-                topic = await bot.create_forum_topic(
-                    chat_id=chat_id,
-                    name=f"test_{emoji}",
-                    icon_custom_emoji_id=emoji_id
-                )
-                working[emoji] = emoji_id
-                await asyncio.sleep(1.5)
-                await bot.delete_forum_topic(chat_id=chat_id, message_thread_id=topic.message_thread_id)
-            except Exception as e:
-                failed.append((emoji, str(e)))
-                await asyncio.sleep(1.5)
-        if working:
-            save_working_emojis(working)
-            text = '\n'.join([f"{emoji} — <code>{emoji_id}</code>" for emoji, emoji_id in working.items()])
-            await message.answer(f"<b>Рабочие значки для топиков обновлены и сохранены:</b>\n{text}", parse_mode="HTML")
-        else:
-            await message.answer("❌ Не удалось создать ни одного топика с этими значками. Telegram ограничил доступ.")
-        if failed:
-            await message.answer(f"<b>Не сработали:</b>\n" + '\n'.join([f"{emoji}: {err}" for emoji, err in failed]), parse_mode="HTML")
-    except Exception as e:
-        await message.answer(f"Ошибка обновления: {e}") 
\ No newline at end of file
+    status_msg = await message.answer("⏳ Обновляю рабочий список значков. Прогресс будет обновляться в этом сообщении.")
+    if not start_probe(bot, message.chat.id, status_msg, "Рабочие значки для топиков обновлены и сохранены:", force=True):
+        await status_msg.edit_text("⏳ Проверка значков в этом чате уже идёт.") 
+
+TIMINGS_ROWS = 15  # Строк в каждой таблице /timings
+
+def format_timings(title: str, rows) -> str:
+    lines = [title]
+    for name, count, p50, p95, p99 in rows[:TIMINGS_ROWS]:
+        lines.append(f"{name}: n={count}, p50 {p50 * 1000:.0f} / p95 {p95 * 1000:.0f} / p99 {p99 * 1000:.0f} мс")
+    if len(lines) == 1:
+        lines.append("нет данных")
+    return "\n".join(lines)
+
+def is_admin(message: types.Message, admin_ids: list[int]) -> bool:
+    """Фильтр по config.tg_bot.admin_ids (передаётся через dp["admin_ids"] после загрузки .env)"""
+    return message.from_user is not None and message.from_user.id in admin_ids
+
+@router.message(Command("timings"), is_admin)
+async def show_timings(message: types.Message):
+    """Перцентили времени обработчиков и шагов FSM (только для администраторов)"""
+    text = "\n\n".join((
+        format_timings("⏱ Обработчики (по p95):", handler_timings.handler_summary()),
+        format_timings("⏱ Состояния FSM (по p95):", handler_timings.state_summary()),
+        f"Медленных апдейтов (> {handler_timings.slow_threshold:g} с): {handler_timings.slow}"
+    ))
+    await message.answer(text, parse_mode=None)
@@ -1,51 +1,77 @@
 import asyncio
 import logging
-import sys
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
-from aiogram.fsm.storage.memory import MemoryStorage
 from config import Config, load_config
 from handlers import register_all_handlers
 from services.telethon_service import TelethonService
+from services.fsm_storage import create_fsm_storage
+from services.chat_jobs import ChatCreationQueue
+from services.telegram_scheduler import attach_scheduler
+from services.startup_timing import startup_timer
+from services.logging_setup import setup_logging
+from services.metrics import MetricsExporter
+from middlewares import HandlerTimingMiddleware, StartupTimingMiddleware, instrument_routers
 from aiogram.filters import Filter
 from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
 from handlers.bot_forum_handlers import router as bot_forum_router
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('bot.log', encoding='utf-8'),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+# Настройка логирования: уровни из config, запись в bot.log в отдельном потоке
+setup_logging()
 logger = logging.getLogger(__name__)
 
+async def on_shutdown(bot: Bot, telethon_service: TelethonService, chat_jobs: ChatCreationQueue, dispatcher: Dispatcher,
+                      metrics_exporter: MetricsExporter):
+    """Закрывает соединения при остановке бота"""
+    logger.info("Shutting down...")
+    await chat_jobs.stop()
+    await telethon_service.disconnect()
+    await metrics_exporter.stop()
+    await dispatcher.storage.close()
+    await bot.session.close()
+
 async def main():
     logger.info("Starting bot...")
+    startup_timer.start()
     
-    # Загружаем конфигурацию
-    config: Config = load_config()
-    
-    # Инициализируем хранилище состояний
-    storage = MemoryStorage()
-    
-    # Инициализируем бота и диспетчер с новым синтаксисом
-    bot = Bot(
-        token=config.tg_bot.token,
-        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
-    )
-    dp = Dispatcher(storage=storage)
+    with startup_timer.phase("Конфигурация"):
+        # Загружаем конфигурацию
+        config: Config = load_config()
     
-    # Инициализируем сервис Telethon
-    telethon_service = TelethonService(
-        api_id=config.telethon.api_id,
-        api_hash=config.telethon.api_hash,
-        session_name="user_session"  # Используем пользовательскую сессию
-    )
+    with startup_timer.phase("Бот и диспетчер"):
+        # Инициализируем хранилище состояний (переживает перезапуск, см. FSM_STORAGE)
+        storage = create_fsm_storage()
+        
+        # Инициализируем бота и диспетчер с новым синтаксисом
+        bot = Bot(
+            token=config.tg_bot.token,
+            default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+        )
+        # Все вызовы Bot API идут через общий планировщик (лимиты, FloodWait, приоритеты)
+        attach_scheduler(bot)
+        dp = Dispatcher(storage=storage)
+        dp.update.outer_middleware(StartupTimingMiddleware())
+        
+        # Инициализируем сервис Telethon (использует тот же Bot и его пул соединений)
+        telethon_service = TelethonService(
+            api_id=config.telethon.api_id,
+            api_hash=config.telethon.api_hash,
+            session_name="user_session",  # Используем пользовательскую сессию
+            bot=bot
+        )
+    dp["telethon_service"] = telethon_service
+    # Очередь создания чатов: обработчики только ставят задачу и сразу возвращаются
+    chat_jobs = ChatCreationQueue(telethon_service)
+    dp["chat_jobs"] = chat_jobs
+    # Метрики Prometheus: /metrics на METRICS_PORT и/или файл METRICS_FILE
+    metrics_exporter = MetricsExporter()
+    dp["metrics_exporter"] = metrics_exporter
+    # Администраторы для служебных команд (/timings)
+    dp["admin_ids"] = config.tg_bot.admin_ids
+    dp.shutdown.register(on_shutdown)
+    polling_started = False
     
     try:
         # Подключаем Telethon
@@ -56,20 +82,29 @@ async def main():
         
         # Регистрируем все обработчики
         logger.info("Registering handlers...")
-        register_all_handlers(dp, telethon_service)
-        dp.include_router(bot_forum_router)
+        with startup_timer.phase("Обработчики"):
+            register_all_handlers(dp, telethon_service)
+            dp.include_router(bot_forum_router)
+            # Длительность обработчиков по роутерам
+            instrument_routers(dp)
+            # Время обработчиков по шагам мастера шаблонов (/timings)
+            dp.message.middleware(HandlerTimingMiddleware())
+            dp.callback_query.middleware(HandlerTimingMiddleware())
+            chat_jobs.start()
+            await metrics_exporter.start()
+        startup_timer.report()
         
         # Запускаем бота
         logger.info("Starting Aiogram polling...")
+        polling_started = True
         await dp.start_polling(bot)
         
     except Exception as e:
-        logger.exception(f"Critical error: {e}")
+        logger.exception("Critical error: %s", e)
     finally:
-        # Закрываем соединения
-        logger.info("Shutting down...")
-        await telethon_service.disconnect()
-        await bot.session.close()
+        # После polling соединения закрывает on_shutdown
+        if not polling_started:
+            await on_shutdown(bot, telethon_service, chat_jobs, dp, metrics_exporter)
         
 if __name__ == '__main__':
     try:
@@ -1,7 +1,18 @@
+import time
 from typing import Any, Awaitable, Callable, Dict
-from aiogram import BaseMiddleware
+from aiogram import BaseMiddleware, Router
 from aiogram.types import Message
 from services.telethon_service import TelethonService
+from services.startup_timing import startup_timer
+from services.metrics import metrics
+from services.handler_timing import handler_timings
+
+HANDLER_SECONDS = metrics.histogram(
+    "handler_seconds", "Длительность обработчиков aiogram", ("router", "event")
+)
+HANDLER_CALLS = metrics.counter(
+    "handler_calls_total", "Вызовы обработчиков aiogram по результату", ("router", "event", "status")
+)
 
 class DatabaseMiddleware(BaseMiddleware):
     def __init__(self, db_service):
@@ -40,4 +51,84 @@ class BotAPIMiddleware(BaseMiddleware):
         data: Dict[str, Any]
     ) -> Any:
         data["bot_api"] = self.bot_api_service
-        return await handler(event, data) 
\ No newline at end of file
+        return await handler(event, data) 
+
+class StartupTimingMiddleware(BaseMiddleware):
+    """Отмечает время до первого обработанного обновления"""
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any]
+    ) -> Any:
+        try:
+            return await handler(event, data)
+        finally:
+            startup_timer.mark_first_update()
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Длительность и результат обработчиков по роутерам (метрики handler_*)"""
+
+    def __init__(self, event_name: str):
+        self.event_name = event_name
+
+    @staticmethod
+    def _router_name(data: Dict[str, Any]) -> str:
+        router = data.get("event_router")
+        if router is not None and not router.name.startswith("0x"):
+            return router.name
+        # Безымянный роутер (имя по умолчанию — id объекта): подписываем модулем обработчика
+        handler = data.get("handler")
+        return getattr(getattr(handler, "callback", None), "__module__", "unknown")
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any]
+    ) -> Any:
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            return await handler(event, data)
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            router_name = self._router_name(data)
+            HANDLER_SECONDS.observe(time.perf_counter() - start, router=router_name, event=self.event_name)
+            HANDLER_CALLS.inc(router=router_name, event=self.event_name, status=status)
+
+class HandlerTimingMiddleware(BaseMiddleware):
+    """
+    Время обработчиков сообщений и колбэков по обработчику и состоянию FSM
+    (перцентили — /timings, медленные апдейты — в лог с вызовами Telegram внутри)
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any]
+    ) -> Any:
+        callback = getattr(data.get("handler"), "callback", None)
+        name = f"{getattr(callback, '__module__', '?')}.{getattr(callback, '__name__', '?')}"
+        # Состояние на входе: шаг мастера, который обрабатывается
+        state = data.get("raw_state")
+        token = handler_timings.start()
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            handler_timings.finish(token, name, state, started)
+
+def instrument_routers(dispatcher: Router):
+    """
+    Подключает HandlerMetricsMiddleware к диспетчеру: inner-middleware корневого роутера
+    срабатывают и для обработчиков всех вложенных роутеров
+    """
+    for event_name, observer in dispatcher.observers.items():
+        if event_name in ("update", "error"):
+            continue
+        observer.middleware(HandlerMetricsMiddleware(event_name))
@@ -0,0 +1,68 @@
+from datetime import datetime
+from typing import NamedTuple, Optional, Tuple
+
+from models.schemas import ChatTemplate, Topic
+
+
+class TopicRecord(NamedTuple):
+    """Компактный неизменяемый топик для кэша шаблонов (без pydantic и created_at)"""
+    title: str
+    description: str = ""
+    icon_emoji: Optional[str] = None
+    icon_color: int = 0
+    is_closed: bool = False
+    is_hidden: bool = False
+
+
+class TemplateRecord(NamedTuple):
+    """
+    Компактный неизменяемый шаблон для кэша шаблонов.
+
+    Внутри сервиса шаблоны хранятся в этом виде; в pydantic-модели ChatTemplate
+    они превращаются только на границе (record_to_template / record_from_template).
+    Поля читаются так же, как у ChatTemplate.
+    """
+    name: str
+    chat_name: str
+    description: str
+    topics: Tuple[TopicRecord, ...]
+    user_id: int
+    created_at: Optional[datetime] = None
+
+
+def record_from_template(template: ChatTemplate, created_at: Optional[datetime] = None) -> TemplateRecord:
+    """Преобразует проверенный ChatTemplate в запись кэша"""
+    return TemplateRecord(
+        name=template.name,
+        chat_name=template.chat_name,
+        description=template.description or "",
+        topics=tuple(
+            TopicRecord(
+                title=t.title,
+                description=t.description or "",
+                icon_emoji=t.icon_emoji,
+                icon_color=t.icon_color if t.icon_color is not None else 0,
+                is_closed=t.is_closed,
+                is_hidden=t.is_hidden
+            )
+            for t in template.topics
+            if t.title
+        ),
+        user_id=template.user_id,
+        created_at=created_at or template.created_at
+    )
+
+
+def record_to_template(record: TemplateRecord) -> ChatTemplate:
+    """
+    Преобразует запись кэша в ChatTemplate без повторной валидации:
+    данные уже проверены при сохранении
+    """
+    return ChatTemplate.model_construct(
+        name=record.name,
+        chat_name=record.chat_name,
+        description=record.description,
+        topics=[Topic.model_construct(**t._asdict()) for t in record.topics],
+        user_id=record.user_id,
+        created_at=record.created_at
+    )
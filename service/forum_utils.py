@@ -26,10 +26,10 @@ async def change_topic_icon(
                     "icon_emoji_id": emoji  # Для стандартных эмодзи
                 }
             )
-            logger.info(f"Иконка изменена через Bot API: {emoji}")
+            logger.info("Иконка изменена через Bot API: %s", emoji)
             return True
         except Exception as e:
-            logger.error(f"Bot API error: {e}")
+            logger.error("Bot API error: %s", e)
 
     # Если не получилось, пробуем через Telethon (для кастомных эмодзи)
     if telethon_client:
@@ -43,10 +43,10 @@ async def change_topic_icon(
                 topic_id=topic_id,
                 icon_emoji_id=emoji_id
             ))
-            logger.info(f"Иконка изменена через Telethon: {emoji}")
+            logger.info("Иконка изменена через Telethon: %s", emoji)
             return True
         except Exception as e:
-            logger.error(f"Telethon error: {e}")
+            logger.error("Telethon error: %s", e)
     return False
 
 async def _get_custom_emoji_id(emoji: str, client) -> Optional[int]:
@@ -58,7 +58,7 @@ async def _get_custom_emoji_id(emoji: str, client) -> Optional[int]:
                 return getattr(icon, 'id', None)
         return None
     except Exception as e:
-        logger.error(f"Emoji fetch error: {e}")
+        logger.error("Emoji fetch error: %s", e)
         return None
 
 async def create_invite_link(chat_id: int, telethon_client) -> str:
@@ -73,5 +73,5 @@ async def create_invite_link(chat_id: int, telethon_client) -> str:
         )
         return getattr(result, 'link', '')
     except Exception as e:
-        logger.error(f"Invite link error: {e}")
+        logger.error("Invite link error: %s", e)
         return '' 
\ No newline at end of file
@@ -1,21 +1,70 @@
 from typing import List, Dict, Optional
 import aiohttp
+import asyncio
 import logging
 import json
 from models.schemas import Topic
+from config import BOT_API_CONNECTOR_LIMIT, BOT_API_CONCURRENCY
+from services.metrics import metrics
+from services.telegram_scheduler import ACCOUNT_BOT, PRIORITY_BULK, call_priority, telegram_scheduler
 
 logger = logging.getLogger(__name__)
 
+REQUEST_SECONDS = metrics.histogram("bot_api_request_seconds", "Запросы BotAPIService к Bot API", ("method",))
+REQUEST_ERRORS = metrics.counter("bot_api_request_errors_total", "Неудачные запросы BotAPIService", ("method",))
+
+
+class BotAPIError(Exception):
+    """Ответ Bot API с ok=false; retry_after заполнен для флуд-контроля (его повторяет планировщик)"""
+
+    def __init__(self, description: str, retry_after: Optional[float] = None):
+        super().__init__(description)
+        self.retry_after = retry_after
+
 class BotAPIService:
-    def __init__(self, bot_token: str, base_url: str = "https://api.telegram.org"):
+    def __init__(
+        self,
+        bot_token: str,
+        base_url: str = "https://api.telegram.org",
+        connector_limit: int = BOT_API_CONNECTOR_LIMIT,
+        concurrency: int = BOT_API_CONCURRENCY,
+        keepalive_timeout: float = 30,
+        dns_cache_ttl: int = 300
+    ):
         """
         Инициализация сервиса Bot API
         :param bot_token: Токен бота
         :param base_url: Базовый URL API Telegram
+        :param connector_limit: Максимум одновременных соединений в пуле
+        :param concurrency: Максимум одновременных запросов в create_topics_batch
+        :param keepalive_timeout: Сколько секунд держать простаивающее соединение
+        :param dns_cache_ttl: Время жизни DNS-кэша в секундах
         """
         self.bot_token = bot_token
         self.base_url = base_url
-        
+        self.connector_limit = connector_limit
+        self.concurrency = concurrency
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Возвращает общую сессию сервиса (создаётся при первом запросе)"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.connector_limit,
+                ttl_dns_cache=self.dns_cache_ttl,
+                keepalive_timeout=self.keepalive_timeout
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def close(self):
+        """Закрывает сессию и все соединения пула"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
     async def _make_request(self, method: str, params: Dict = None) -> Optional[Dict]:
         """
         Выполняет запрос к Bot API
@@ -24,73 +73,87 @@ class BotAPIService:
         :return: Ответ от API или None в случае ошибки
         """
         url = f"{self.base_url}/bot{self.bot_token}/{method}"
-        try:
-            async with aiohttp.ClientSession() as session:
+
+        async def request():
+            session = await self._get_session()
+            with REQUEST_SECONDS.time(method=method):
                 async with session.post(url, json=params) as response:
                     result = await response.json()
-                    if result.get("ok"):
-                        return result.get("result")
-                    else:
-                        logger.error(f"Ошибка запроса к API: {result.get('description')}")
-                        return None
+            if not result.get("ok"):
+                retry_after = (result.get("parameters") or {}).get("retry_after")
+                raise BotAPIError(result.get("description", ""), retry_after)
+            return result.get("result")
+
+        chat_id = (params or {}).get("chat_id")
+        try:
+            # Как и запросы aiogram Bot: общие лимиты, FloodWait и приоритеты планировщика
+            return await telegram_scheduler.call(
+                request, method,
+                chat_id=chat_id if isinstance(chat_id, int) else None,
+                account=ACCOUNT_BOT
+            )
+        except BotAPIError as e:
+            REQUEST_ERRORS.inc(method=method)
+            logger.error("Ошибка запроса к API: %s", e)
+            return None
         except Exception as e:
-            logger.error(f"Ошибка при выполнении запроса к API: {str(e)}")
+            REQUEST_ERRORS.inc(method=method)
+            logger.error("Ошибка при выполнении запроса к API: %s", str(e))
             return None
 
+    async def create_forum_topic(self, chat_id: int, name: str, icon_color: int = 7322096) -> Optional[Dict]:
+        """
+        Создает один топик в форум-чате
+        :param chat_id: ID чата
+        :param name: Название топика
+        :param icon_color: Цвет иконки (по умолчанию синий)
+        :return: Созданный топик (ForumTopic) или None в случае ошибки
+        """
+        result = await self._make_request("createForumTopic", {
+            "chat_id": chat_id,
+            "name": name,
+            "icon_color": icon_color
+        })
+        if result is not None:
+            logger.info("Топик '%s' создан успешно", name)
+        else:
+            logger.error("Ошибка при создании топика '%s'", name)
+        return result
+
     async def create_forum_topics(self, chat_id: int, topics: List[Topic]) -> bool:
         """
         Создание топиков в форуме
-        
+
         Args:
             chat_id: ID чата
             topics: Список топиков для создания
-            
+
         Returns:
             bool: True если все топики созданы успешно
         """
-        try:
-            async with aiohttp.ClientSession() as session:
-                for topic in topics:
-                    url = f"{self.base_url}/createForumTopic"
-                    data = {
-                        "chat_id": chat_id,
-                        "name": topic.name,
-                        "icon_color": 7322096  # Синий цвет по умолчанию
-                    }
-                    
-                    async with session.post(url, json=data) as response:
-                        if response.status == 200:
-                            result = await response.json()
-                            if result.get("ok"):
-                                logger.info(f"Топик '{topic.name}' создан успешно")
-                            else:
-                                logger.error(f"Ошибка при создании топика '{topic.name}': {result.get('description')}")
-                                return False
-                        else:
-                            logger.error(f"Ошибка HTTP {response.status} при создании топика '{topic.name}'")
-                            return False
-                
-                return True
-                
-        except Exception as e:
-            logger.error(f"Ошибка при создании топиков: {str(e)}")
-            return False
+        results = await self.create_topics_batch(
+            chat_id=chat_id,
+            topics=[{"name": topic.title} for topic in topics]
+        )
+        return all(result is not None for result in results)
 
     async def create_topics_batch(self, chat_id: int, topics: List[Dict[str, str]]) -> List[Optional[Dict]]:
         """
-        Создает несколько топиков в форум-чате
+        Создает несколько топиков в форум-чате параллельно (не больше concurrency запросов
+        одновременно) через общую сессию
         :param chat_id: ID чата
         :param topics: Список топиков с их названиями и описаниями
-        :return: Список результатов создания топиков
+        :return: Список результатов создания топиков в том же порядке
         """
-        results = []
-        for topic in topics:
-            result = await self.create_forum_topics(
-                chat_id=chat_id,
-                topics=[Topic(name=topic.get("name", "Без названия"))]
-            )
-            results.append(result)
-        return results
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def create(topic: Dict[str, str]) -> Optional[Dict]:
+            async with semaphore:
+                return await self.create_forum_topic(chat_id, topic.get("name", "Без названия"))
+
+        # Массовое создание: без корзины чата, темп задаёт retry_after
+        with call_priority(PRIORITY_BULK):
+            return await asyncio.gather(*(create(topic) for topic in topics))
 
     async def delete_forum_topic(self, chat_id: int, topic_id: int) -> bool:
         """
@@ -118,4 +181,4 @@ class BotAPIService:
             "message_thread_id": topic_id,
             "name": name
         })
-        return result is not None 
\ No newline at end of file
+        return result is not None
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from aiogram.types import Message
+
+from config import CHAT_JOB_WORKERS, CHAT_JOB_QUEUE_SIZE
+from models.schemas import ChatCreate
+
+logger = logging.getLogger(__name__)
+
+# Статусы задачи
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+@dataclass
+class ChatCreationJob:
+    """Задача на создание форум-чата"""
+    user_id: int
+    chat_data: ChatCreate
+    status_msg: Message
+    on_done: Optional[Callable[["ChatCreationJob"], Awaitable[None]]] = None
+    status: str = JOB_QUEUED
+    stage: str = ""
+    result: Optional[dict] = None
+    created_at: float = field(default_factory=time.monotonic)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def active(self) -> bool:
+        return self.status in (JOB_QUEUED, JOB_RUNNING)
+
+
+class ChatCreationQueue:
+    """
+    Очередь создания форум-чатов с ограниченным числом воркеров.
+
+    Обработчик только ставит задачу в очередь и сразу возвращается. Воркер выполняет
+    TelethonService.create_forum и редактирует статусное сообщение по мере прохождения
+    этапов; у пользователя одновременно может быть только одна активная задача.
+    Завершённые задачи не хранятся: итог получает on_done (ID чата он пишет в FSM).
+    """
+
+    def __init__(self, telethon, workers: int = CHAT_JOB_WORKERS,
+                 max_queue: int = CHAT_JOB_QUEUE_SIZE, min_edit_interval: float = 1.0):
+        self.telethon = telethon
+        self.workers = workers
+        self.min_edit_interval = min_edit_interval
+        self._queue: "asyncio.Queue[ChatCreationJob]" = asyncio.Queue(maxsize=max_queue)
+        # Только активные задачи (в очереди и выполняющиеся), по пользователю
+        self._jobs: Dict[int, ChatCreationJob] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        """Запускает воркеры"""
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info("[CHAT JOBS] Запущено воркеров: %s", self.workers)
+
+    async def stop(self):
+        """Останавливает воркеры; пользователям незавершённых задач сообщается, что создание прервано"""
+        interrupted = [job for job in self._jobs.values() if job.active]
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Статус правим после остановки воркеров, чтобы его не перезаписал очередной этап
+        for job in interrupted:
+            job.status = JOB_FAILED
+        self._jobs.clear()
+        await asyncio.gather(*(
+            self._edit(job, "⚠️ Создание чата прервано: бот перезапускается. Попробуйте ещё раз позже.")
+            for job in interrupted
+        ))
+
+    def get_job(self, user_id: int) -> Optional[ChatCreationJob]:
+        """Активная задача пользователя (в очереди или выполняющаяся)"""
+        return self._jobs.get(user_id)
+
+    def submit(self, user_id: int, chat_data: ChatCreate, status_msg: Message,
+               on_done: Optional[Callable[[ChatCreationJob], Awaitable[None]]] = None) -> Optional[ChatCreationJob]:
+        """
+        Ставит создание чата в очередь
+
+        Returns:
+            Optional[ChatCreationJob]: Задача или None, если у пользователя уже есть активная задача
+
+        Raises:
+            asyncio.QueueFull: Очередь переполнена
+        """
+        current = self._jobs.get(user_id)
+        if current and current.active:
+            return None
+        job = ChatCreationJob(user_id=user_id, chat_data=chat_data, status_msg=status_msg, on_done=on_done)
+        self._queue.put_nowait(job)
+        self._jobs[user_id] = job
+        logger.info("[CHAT JOBS] Задача пользователя %s в очереди, позиция %s", user_id, self._queue.qsize())
+        return job
+
+    def position(self, job: ChatCreationJob) -> int:
+        """Примерная позиция задачи в очереди (1 — следующая)"""
+        queued = sorted(
+            (j for j in self._jobs.values() if j.status == JOB_QUEUED),
+            key=lambda j: j.created_at
+        )
+        return queued.index(job) + 1 if job in queued else 0
+
+    async def _edit(self, job: ChatCreationJob, text: str):
+        try:
+            await job.status_msg.edit_text(text)
+        except Exception as e:
+            logger.debug("[CHAT JOBS] Не удалось обновить статус: %s", e)
+
+    async def _run(self, job: ChatCreationJob):
+        last_edit = 0.0
+
+        async def stage_func(stage: str):
+            nonlocal last_edit
+            job.stage = stage
+            last_edit = time.monotonic()
+            await self._edit(job, f"⏳ {stage}...")
+
+        async def progress_func(done: int, total: int, title: str, ok: bool):
+            nonlocal last_edit
+            now = time.monotonic()
+            # Не редактируем сообщение чаще раза в min_edit_interval секунд, кроме последнего топика
+            if done < total and now - last_edit < self.min_edit_interval:
+                return
+            last_edit = now
+            await self._edit(job, f"⏳ Создаю топики: {done}/{total}")
+
+        job.result = await self.telethon.create_forum(
+            job.chat_data,
+            job.user_id,
+            progress_func=progress_func,
+            stage_func=stage_func
+        )
+
+    async def _worker(self, index: int):
+        while True:
+            job = await self._queue.get()
+            job.status = JOB_RUNNING
+            job.started_at = time.monotonic()
+            try:
+                await self._run(job)
+                job.status = JOB_DONE if job.result else JOB_FAILED
+            except asyncio.CancelledError:
+                job.status = JOB_FAILED
+                raise
+            except Exception as e:
+                logger.error("[CHAT JOBS] Ошибка задачи пользователя %s: %s", job.user_id, e)
+                job.status = JOB_FAILED
+            finally:
+                job.finished_at = time.monotonic()
+                self._queue.task_done()
+            logger.info(
+                "[CHAT JOBS] Воркер %s: задача пользователя %s — %s, ожидание %.1f сек, выполнение %.1f сек",
+                index, job.user_id, job.status, job.started_at - job.created_at, job.finished_at - job.started_at
+            )
+            try:
+                if job.on_done:
+                    await job.on_done(job)
+            except Exception as e:
+                logger.error("[CHAT JOBS] Ошибка обработки результата для %s: %s", job.user_id, e)
+            finally:
+                # Пока шёл on_done, пользователь мог поставить новую задачу — её не трогаем
+                if self._jobs.get(job.user_id) is job:
+                    del self._jobs[job.user_id]
@@ -1,13 +1,15 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker, declarative_base
-from sqlalchemy import Column, Integer, String, JSON, DateTime, ForeignKey
-from typing import List, Optional
-import json
+from sqlalchemy.orm import sessionmaker, declarative_base, relationship
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index, event, select, delete, func
+from typing import Dict, List, Optional
+import asyncio
 import logging
+import sys
 from datetime import datetime
 
 from config import DATABASE_URL
 from models.schemas import ChatTemplate, Topic
+from models.records import TemplateRecord, TopicRecord
 
 logger = logging.getLogger(__name__)
 
@@ -15,146 +17,314 @@ Base = declarative_base()
 
 class Template(Base):
     """Модель шаблона в БД"""
-    __tablename__ = "templates"
-    
+    __tablename__ = "chat_templates"
+    __table_args__ = (
+        # Имя шаблона уникально в пределах пользователя, индекс обслуживает все выборки
+        Index("ix_chat_templates_user_name", "user_id", "name", unique=True),
+    )
+
     id = Column(Integer, primary_key=True)
-    name = Column(String(64), nullable=False)
-    chat_name = Column(String(128), nullable=False)
+    user_id = Column(Integer, nullable=False)
+    name = Column(String(100), nullable=False)
+    chat_name = Column(String(255), nullable=False)
     description = Column(String(255), nullable=True, default="")
-    topics = Column(JSON, nullable=False)  # Хранит список топиков в JSON
     created_at = Column(DateTime, default=datetime.now)
-    user_id = Column(Integer, nullable=False)
+    topics = relationship(
+        "TemplateTopic",
+        order_by="TemplateTopic.position",
+        cascade="all, delete-orphan",
+        lazy="selectin"
+    )
+
+class TemplateTopic(Base):
+    """Модель топика шаблона в БД (по строке на топик вместо JSON внутри шаблона)"""
+    __tablename__ = "template_topics"
+    __table_args__ = (
+        Index("ix_template_topics_template_position", "template_id", "position"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    template_id = Column(Integer, ForeignKey("chat_templates.id", ondelete="CASCADE"), nullable=False)
+    position = Column(Integer, nullable=False)
+    title = Column(String(255), nullable=False)
+    description = Column(String(255), nullable=True, default="")
+    icon_emoji = Column(String(16), nullable=True)
+    icon_color = Column(Integer, nullable=True, default=0)
+    is_closed = Column(Boolean, nullable=False, default=False)
+    is_hidden = Column(Boolean, nullable=False, default=False)
+
+def _to_schema(row: Template) -> ChatTemplate:
+    """Преобразует строку БД в модель ChatTemplate"""
+    return ChatTemplate(
+        name=row.name,
+        chat_name=row.chat_name,
+        description=row.description,
+        topics=[
+            Topic(
+                title=t.title,
+                description=t.description,
+                icon_emoji=t.icon_emoji,
+                icon_color=t.icon_color,
+                is_closed=t.is_closed,
+                is_hidden=t.is_hidden
+            )
+            for t in row.topics
+        ],
+        created_at=row.created_at,
+        user_id=row.user_id
+    )
+
+def _to_record(row: Template) -> TemplateRecord:
+    """Преобразует строку БД в запись кэша шаблонов (без pydantic)"""
+    return TemplateRecord(
+        name=row.name,
+        chat_name=row.chat_name,
+        description=row.description or "",
+        topics=tuple(
+            TopicRecord(
+                title=t.title,
+                description=t.description or "",
+                icon_emoji=t.icon_emoji,
+                icon_color=t.icon_color or 0,
+                is_closed=t.is_closed,
+                is_hidden=t.is_hidden
+            )
+            for t in row.topics
+        ),
+        user_id=row.user_id,
+        created_at=row.created_at
+    )
+
+def _to_row(user_id: int, template) -> Template:
+    """Преобразует шаблон (ChatTemplate или TemplateRecord) в строку БД"""
+    return Template(
+        user_id=user_id,
+        name=template.name,
+        chat_name=template.chat_name,
+        description=template.description or "",
+        created_at=template.created_at or datetime.now(),
+        topics=[
+            TemplateTopic(
+                position=i,
+                title=t.title,
+                description=t.description or "",
+                icon_emoji=t.icon_emoji,
+                icon_color=t.icon_color if t.icon_color is not None else 0,
+                is_closed=t.is_closed,
+                is_hidden=t.is_hidden
+            )
+            for i, t in enumerate(template.topics)
+            if t.title
+        ]
+    )
 
 class DatabaseService:
-    def __init__(self):
+    """
+    Репозиторий шаблонов в SQLite.
+
+    Реализует тот же интерфейс хранилища, что и TemplateStore (load_all/save_user),
+    поэтому TelethonService может работать с любым из них (см. TEMPLATE_BACKEND).
+    """
+
+    def __init__(self, database_url: str = DATABASE_URL):
         """Инициализация сервиса БД"""
-        self.engine = create_async_engine(DATABASE_URL)
+        self.engine = create_async_engine(database_url)
         self.async_session = sessionmaker(
             self.engine, class_=AsyncSession, expire_on_commit=False
         )
-    
+
+        @event.listens_for(self.engine.sync_engine, "connect")
+        def _set_sqlite_pragma(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute("PRAGMA foreign_keys=ON")
+            cursor.close()
+
     async def init_db(self):
         """Инициализация базы данных"""
         async with self.engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
-    
+
+    async def close(self):
+        """Закрывает пул соединений"""
+        await self.engine.dispose()
+
     async def save_template(self, template: ChatTemplate) -> bool:
         """
-        Сохранение шаблона
-        
+        Сохранение шаблона (существующий шаблон с тем же именем заменяется)
+
         Args:
             template: Шаблон для сохранения
-            
+
         Returns:
             bool: Успешно ли сохранен шаблон
         """
         async with self.async_session() as session:
             try:
-                db_template = Template(
-                    name=template.name,
-                    chat_name=template.chat_name,
-                    description=template.description,
-                    topics=json.dumps([t.dict() for t in template.topics]),
-                    user_id=template.user_id
+                await session.execute(
+                    delete(Template).where(
+                        (Template.user_id == template.user_id) &
+                        (Template.name == template.name)
+                    )
                 )
-                session.add(db_template)
+                session.add(_to_row(template.user_id, template))
                 await session.commit()
-                logger.info(f"Шаблон '{template.name}' успешно сохранен для пользователя {template.user_id}")
+                logger.info("Шаблон '%s' успешно сохранен для пользователя %s", template.name, template.user_id)
                 return True
             except Exception as e:
-                logger.error(f"Ошибка при сохранении шаблона '{template.name}': {str(e)}")
+                logger.error("Ошибка при сохранении шаблона '%s': %s", template.name, str(e))
                 await session.rollback()
                 return False
-    
+
     async def get_templates(self, user_id: int) -> List[ChatTemplate]:
         """
         Получение всех шаблонов пользователя
-        
+
         Args:
             user_id: ID пользователя
-            
+
         Returns:
             List[ChatTemplate]: Список шаблонов
         """
         async with self.async_session() as session:
             try:
                 result = await session.execute(
-                    Template.__table__.select().where(Template.user_id == user_id)
+                    select(Template).where(Template.user_id == user_id).order_by(Template.id)
                 )
-                templates = []
-                for row in result:
-                    topics = [Topic(**t) for t in json.loads(row.topics)]
-                    templates.append(ChatTemplate(
-                        name=row.name,
-                        chat_name=row.chat_name,
-                        description=row.description,
-                        topics=topics,
-                        created_at=row.created_at,
-                        user_id=row.user_id
-                    ))
-                return templates
+                return [_to_schema(row) for row in result.scalars()]
             except Exception as e:
-                logger.error(f"Ошибка при получении шаблонов пользователя {user_id}: {str(e)}")
+                logger.error("Ошибка при получении шаблонов пользователя %s: %s", user_id, str(e))
                 return []
-    
+
     async def get_template(self, user_id: int, template_name: str) -> Optional[ChatTemplate]:
         """
         Получение конкретного шаблона
-        
+
         Args:
             user_id: ID пользователя
             template_name: Название шаблона
-            
+
         Returns:
             Optional[ChatTemplate]: Шаблон или None
         """
         async with self.async_session() as session:
             try:
                 result = await session.execute(
-                    Template.__table__.select().where(
-                        (Template.user_id == user_id) & 
+                    select(Template).where(
+                        (Template.user_id == user_id) &
                         (Template.name == template_name)
                     )
                 )
-                row = result.first()
-                if row:
-                    topics = [Topic(**t) for t in json.loads(row.topics)]
-                    return ChatTemplate(
-                        name=row.name,
-                        chat_name=row.chat_name,
-                        description=row.description,
-                        topics=topics,
-                        created_at=row.created_at,
-                        user_id=row.user_id
-                    )
-                return None
+                row = result.scalar_one_or_none()
+                return _to_schema(row) if row else None
             except Exception as e:
-                logger.error(f"Ошибка при получении шаблона '{template_name}' пользователя {user_id}: {str(e)}")
+                logger.error("Ошибка при получении шаблона '%s' пользователя %s: %s", template_name, user_id, str(e))
                 return None
-    
+
     async def delete_template(self, user_id: int, template_name: str) -> bool:
         """
         Удаление шаблона
-        
+
         Args:
             user_id: ID пользователя
             template_name: Название шаблона
-            
+
         Returns:
             bool: Успешно ли удален шаблон
         """
         async with self.async_session() as session:
             try:
                 await session.execute(
-                    Template.__table__.delete().where(
-                        (Template.user_id == user_id) & 
+                    delete(Template).where(
+                        (Template.user_id == user_id) &
                         (Template.name == template_name)
                     )
                 )
                 await session.commit()
-                logger.info(f"Шаблон '{template_name}' пользователя {user_id} успешно удален")
+                logger.info("Шаблон '%s' пользователя %s успешно удален", template_name, user_id)
                 return True
             except Exception as e:
-                logger.error(f"Ошибка при удалении шаблона '{template_name}' пользователя {user_id}: {str(e)}")
+                logger.error("Ошибка при удалении шаблона '%s' пользователя %s: %s", template_name, user_id, str(e))
                 await session.rollback()
-                return False 
\ No newline at end of file
+                return False
+
+    # --- Интерфейс хранилища для TelethonService ---
+
+    async def load_all(self) -> Dict[int, List[TemplateRecord]]:
+        """Загружает шаблоны всех пользователей"""
+        async with self.async_session() as session:
+            result = await session.execute(select(Template).order_by(Template.user_id, Template.id))
+            templates: Dict[int, List[TemplateRecord]] = {}
+            for row in result.scalars():
+                templates.setdefault(row.user_id, []).append(_to_record(row))
+            return templates
+
+    async def load_user(self, user_id: int) -> List[TemplateRecord]:
+        """Загружает шаблоны одного пользователя (ошибки пробрасываются, чтобы не закэшировать пустой список)"""
+        async with self.async_session() as session:
+            result = await session.execute(
+                select(Template).where(Template.user_id == user_id).order_by(Template.id)
+            )
+            return [_to_record(row) for row in result.scalars()]
+
+    async def save_user(self, user_id: int, templates: List[TemplateRecord]) -> bool:
+        """
+        Заменяет все шаблоны пользователя одной транзакцией
+
+        Returns:
+            bool: True если сохранение прошло успешно
+        """
+        async with self.async_session() as session:
+            try:
+                await session.execute(delete(Template).where(Template.user_id == user_id))
+                session.add_all(
+                    _to_row(user_id, t) for t in templates if t.name and t.chat_name and t.topics
+                )
+                await session.commit()
+                return True
+            except Exception as e:
+                logger.error("Ошибка при сохранении шаблонов пользователя %s: %s", user_id, str(e))
+                await session.rollback()
+                return False
+
+    async def migrate_from_json(self, json_store) -> int:
+        """
+        Однократный перенос шаблонов из JSON-хранилища (TemplateStore).
+        Ничего не делает, если в БД уже есть шаблоны.
+
+        Returns:
+            int: Количество перенесённых шаблонов
+        """
+        async with self.async_session() as session:
+            count = await session.scalar(select(func.count()).select_from(Template))
+        if count:
+            logger.info("В БД уже есть %s шаблонов, миграция не нужна", count)
+            return 0
+
+        data = await json_store.load_all()
+        migrated = 0
+        for user_id, templates in data.items():
+            if await self.save_user(user_id, templates):
+                migrated += len(templates)
+        logger.info("Перенесено %s шаблонов для %s пользователей", migrated, len(data))
+        return migrated
+
+async def _migrate():
+    """Запуск миграции: python -m services.database"""
+    import os
+    from services.template_store import TemplateStore
+
+    data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+    db = DatabaseService()
+    try:
+        await db.init_db()
+        await db.migrate_from_json(
+            TemplateStore(os.path.join(data_dir, "templates"), legacy_file=os.path.join(data_dir, "templates.json"))
+        )
+    finally:
+        await db.close()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+    asyncio.run(_migrate())
@@ -0,0 +1,199 @@
+import asyncio
+import html
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+from aiogram import Bot
+from aiogram.types import Message
+
+from config import EMOJI_PROBE_CONCURRENCY, EMOJI_PROBE_SKIP_HOURS
+from services.emoji_registry import EmojiRegistry, emoji_registry
+from services.json_codec import json_codec
+from services.telegram_scheduler import PRIORITY_BULK, call_priority
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_FILE = "emoji_probe_state.json"
+MESSAGE_LIMIT = 4096  # Максимальная длина сообщения Telegram
+
+
+def join_lines(lines, limit: int = MESSAGE_LIMIT) -> str:
+    """Склеивает строки, пока текст помещается в сообщение (строки не разрезаются — HTML-теги целы)"""
+    result, size = [], 0
+    for line in lines:
+        size += len(line) + (1 if result else 0)
+        if size > limit:
+            break
+        result.append(line)
+    return "\n".join(result)
+
+
+class EmojiProbe:
+    """
+    Фоновая проверка, какие эмодзи можно ставить иконкой топика.
+
+    Каждый эмодзи проверяется созданием и удалением тестового топика, до concurrency
+    проверок одновременно. Вызовы идут через TelegramScheduler с низким приоритетом,
+    поэтому лимиты и FloodWait соблюдаются, а ответы пользователям не ждут проверку.
+    Результаты сохраняются в checkpoint-файл после каждой проверки, поэтому
+    прерванный запуск продолжается с места остановки, а эмодзи, которые
+    сработали за последние skip_hours часов, повторно не проверяются.
+    """
+
+    def __init__(self, bot: Bot, registry: EmojiRegistry = emoji_registry,
+                 checkpoint_file: str = CHECKPOINT_FILE,
+                 concurrency: int = EMOJI_PROBE_CONCURRENCY,
+                 skip_hours: float = EMOJI_PROBE_SKIP_HOURS):
+        self.bot = bot
+        self.registry = registry
+        self.checkpoint_file = checkpoint_file
+        self.concurrency = concurrency
+        self.skip_seconds = skip_hours * 3600
+        self._results: Dict[str, dict] = {}
+        self._save_lock = asyncio.Lock()
+
+    def _load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_file):
+            return {}
+        try:
+            with open(self.checkpoint_file, "rb") as f:
+                return json_codec.loads(f.read()).get("results", {})
+        except (OSError, ValueError, AttributeError) as e:
+            logger.warning("[EMOJI PROBE] Не удалось прочитать checkpoint: %s", e)
+            return {}
+
+    def _write_checkpoint(self, results: Dict[str, dict]):
+        temp_file = f"{self.checkpoint_file}.tmp"
+        with open(temp_file, "wb") as f:
+            f.write(json_codec.dumps({"results": results}))
+        os.replace(temp_file, self.checkpoint_file)
+
+    async def _save_checkpoint(self):
+        async with self._save_lock:
+            await asyncio.to_thread(self._write_checkpoint, dict(self._results))
+
+    def _is_fresh(self, emoji: str, emoji_id: str) -> bool:
+        """Эмодзи уже сработал с этим же id за последние skip_hours часов"""
+        result = self._results.get(emoji)
+        return bool(
+            result
+            and result.get("ok")
+            and result.get("id") == emoji_id
+            and time.time() - result.get("checked_at", 0) < self.skip_seconds
+        )
+
+    async def _probe_one(self, chat_id: int, emoji: str, emoji_id: str) -> Optional[str]:
+        """Проверяет один эмодзи. Возвращает текст ошибки или None при успехе"""
+        try:
+            topic = await self.bot.create_forum_topic(
+                chat_id=chat_id,
+                name=f"test_{emoji}",
+                icon_custom_emoji_id=emoji_id
+            )
+        except Exception as e:
+            return str(e)
+        # Удаление не влияет на результат проверки
+        try:
+            await self.bot.delete_forum_topic(chat_id=chat_id, message_thread_id=topic.message_thread_id)
+        except Exception as e:
+            logger.warning("[EMOJI PROBE] Не удалось удалить тестовый топик %s: %s", emoji, e)
+        return None
+
+    async def run(self, chat_id: int, status_msg: Message, title: str, force: bool = False) -> Dict[str, str]:
+        """
+        Проверяет все значки для топиков и сохраняет рабочий список
+
+        Args:
+            chat_id: Форум-чат для тестовых топиков
+            status_msg: Сообщение, которое редактируется по ходу проверки
+            title: Заголовок итогового сообщения
+            force: Перепроверить и недавно сработавшие значки
+
+        Returns:
+            Dict[str, str]: Рабочий список эмодзи
+        """
+        stickers = await self.bot.get_forum_topic_icon_stickers()
+        emoji_map = {s.emoji: s.custom_emoji_id for s in stickers if s.custom_emoji_id}
+        self._results = await asyncio.to_thread(self._load_checkpoint)
+
+        pending = [(e, i) for e, i in emoji_map.items() if force or not self._is_fresh(e, i)]
+        total = len(emoji_map)
+        done = total - len(pending)
+        last_edit = 0.0
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def update_status(force: bool = False):
+            nonlocal last_edit
+            now = time.monotonic()
+            if not force and now - last_edit < 2:
+                return
+            last_edit = now
+            try:
+                await status_msg.edit_text(f"⏳ Проверяю значки: {done}/{total}")
+            except Exception as e:
+                logger.debug("[EMOJI PROBE] Не удалось обновить статус: %s", e)
+
+        async def probe(emoji: str, emoji_id: str):
+            nonlocal done
+            async with semaphore:
+                error = await self._probe_one(chat_id, emoji, emoji_id)
+            self._results[emoji] = {"id": emoji_id, "ok": error is None, "error": error, "checked_at": time.time()}
+            done += 1
+            await self._save_checkpoint()
+            await update_status()
+
+        logger.info("[EMOJI PROBE] Всего значков: %s, к проверке: %s", total, len(pending))
+        await update_status(force=True)
+        with call_priority(PRIORITY_BULK):
+            await asyncio.gather(*(probe(e, i) for e, i in pending))
+
+        working = {e: i for e, i in emoji_map.items() if self._results.get(e, {}).get("ok")}
+        failed = [(e, self._results[e].get("error")) for e in emoji_map if e not in working and e in self._results]
+        if working:
+            # Запись файла — в потоке, не в event loop
+            await asyncio.to_thread(self.registry.save, working)
+            lines = [f"<b>{html.escape(title)}</b>"]
+            lines.extend(f"{emoji} — <code>{emoji_id}</code>" for emoji, emoji_id in working.items())
+        else:
+            lines = ["❌ Не удалось создать ни одного топика с этими значками. Telegram ограничил доступ."]
+        if failed:
+            lines.extend(["", "<b>Не сработали:</b>"])
+            lines.extend(f"{emoji}: {html.escape(str(err))}" for emoji, err in failed)
+        try:
+            await status_msg.edit_text(join_lines(lines), parse_mode="HTML")
+        except Exception as e:
+            logger.warning("[EMOJI PROBE] Не удалось отправить итог: %s", e)
+        return working
+
+
+# Запущенные проверки по чатам: не даём запустить вторую и не теряем ссылку на задачу
+_running: Dict[int, asyncio.Task] = {}
+
+
+def start_probe(bot: Bot, chat_id: int, status_msg: Message, title: str, force: bool = False) -> bool:
+    """
+    Запускает проверку в фоне
+
+    Returns:
+        bool: False, если в этом чате проверка уже идёт
+    """
+    task = _running.get(chat_id)
+    if task and not task.done():
+        return False
+
+    async def job():
+        try:
+            await EmojiProbe(bot).run(chat_id, status_msg, title, force=force)
+        except Exception as e:
+            logger.error("[EMOJI PROBE] Ошибка проверки: %s", e)
+            try:
+                await status_msg.edit_text(f"Ошибка проверки значков: {html.escape(str(e))}", parse_mode="HTML")
+            except Exception:
+                pass
+        finally:
+            _running.pop(chat_id, None)
+
+    _running[chat_id] = asyncio.create_task(job())
+    return True
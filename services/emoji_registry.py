@@ -0,0 +1,71 @@
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+from services.json_codec import json_codec
+
+logger = logging.getLogger(__name__)
+
+WORKING_EMOJI_FILE = "working_topic_emojis.json"
+
+
+class EmojiRegistry:
+    """
+    Рабочий список эмодзи для иконок топиков (эмодзи -> custom_emoji_id).
+
+    Файл читается один раз и перечитывается, только если изменилось его время
+    модификации (проверяется не чаще раза в check_interval секунд) или если
+    новый список записан через save().
+    """
+
+    def __init__(self, path: str = WORKING_EMOJI_FILE, check_interval: float = 1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._map: Dict[str, str] = {}
+        self._mtime: Optional[float] = None
+        self._checked_at = float("-inf")
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            self._map, self._mtime = {}, None
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path, "rb") as f:
+                self._map = json_codec.loads(f.read())
+            self._mtime = mtime
+            logger.info("Загружен рабочий список эмодзи: %s шт.", len(self._map))
+        except (OSError, ValueError) as e:
+            logger.error("Не удалось прочитать %s: %s", self.path, e)
+
+    def get_map(self) -> Dict[str, str]:
+        """Возвращает рабочий список (не изменяйте его — используйте save())"""
+        self._refresh()
+        return self._map
+
+    def get_id(self, emoji: Optional[str]) -> Optional[str]:
+        """custom_emoji_id для эмодзи или None, если эмодзи нет в рабочем списке"""
+        if not emoji:
+            return None
+        return self.get_map().get(emoji)
+
+    def save(self, emoji_map: Dict[str, str]):
+        """Сохраняет новый рабочий список и сразу обновляет кэш"""
+        temp_file = f"{self.path}.tmp"
+        with open(temp_file, "wb") as f:
+            f.write(json_codec.dumps(emoji_map))
+        os.replace(temp_file, self.path)
+        self._map = dict(emoji_map)
+        self._mtime = os.stat(self.path).st_mtime
+        self._checked_at = time.monotonic()
+
+
+emoji_registry = EmojiRegistry()
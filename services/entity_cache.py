@@ -0,0 +1,72 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple, Union
+
+from telethon import utils
+
+from config import ENTITY_CACHE_TTL, ENTITY_CACHE_SIZE
+
+# ID в формате Telethon (положительный — пользователь, -100… — канал), username или Peer*
+Peer = Union[int, str, Any]
+
+
+class EntityCache:
+    """
+    Кэш сущностей Telethon (пользователи, каналы, бот) с TTL и ограничением размера.
+
+    Сущность доступна и по id, и по username, поэтому повторные get_entity
+    не ходят в сеть и не упираются в лимиты ResolveUsername. InputPeer Telethon
+    строит из закэшированной сущности сам, без запросов.
+
+    Ключ по id — помеченный id (utils.get_peer_id): у пользователей и каналов
+    голые id пересекаются, и канал не должен найтись по id пользователя.
+    Целые числа понимаются так же, как их понимает get_entity, а PeerChannel/PeerUser
+    приводятся к помеченному id.
+    """
+
+    def __init__(self, ttl: float = ENTITY_CACHE_TTL, maxsize: int = ENTITY_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Peer, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(peer: Peer) -> Union[int, str]:
+        if isinstance(peer, str):
+            return peer.lstrip("@").lower()
+        if isinstance(peer, int):
+            return peer
+        return utils.get_peer_id(peer)
+
+    def get(self, peer: Peer) -> Optional[Any]:
+        """Возвращает сущность или None, если её нет или она устарела"""
+        key = self._key(peer)
+        item = self._data.get(key)
+        if item is None or time.monotonic() > item[0]:
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._data.move_to_end(key)
+        return item[1]
+
+    def set(self, entity: Any, *aliases: Peer):
+        """Кладёт сущность под её помеченным id, username и дополнительными ключами"""
+        expires = time.monotonic() + self.ttl
+        keys = [utils.get_peer_id(entity), getattr(entity, "username", None), *aliases]
+        for key in keys:
+            if key is None:
+                continue
+            key = self._key(key)
+            self._data[key] = (expires, entity)
+            self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, peer: Peer):
+        self._data.pop(self._key(peer), None)
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
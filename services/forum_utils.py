@@ -6,6 +6,8 @@ from telethon.tl import functions
 from aiogram import Bot
 from telethon import TelegramClient
 
+from services.telegram_scheduler import telegram_scheduler
+
 logger = logging.getLogger(__name__)
 
 STANDARD_EMOJIS = {"📌", "⭐", "❗", "⚠️", "🔒", "📝", "📢", "💡", "❓", "📚", "🎮", "🎵", "🎬", "📷"}
@@ -16,15 +18,20 @@ async def smart_change_icon(
     emoji: str,
     bot: Bot,
     max_retries: int = 3,
-    delay: int = 10
+    delay: float = 1.0
 ) -> bool:
-    """Смена иконки с задержкой и повторами через Bot API для стандартных эмодзи"""
+    """
+    Смена иконки с повторами через Bot API для стандартных эмодзи.
+    Повторы нужны, пока у бота не появились права в новом чате (пауза растёт вдвое);
+    FloodWait обрабатывает планировщик вызовов.
+    """
     if emoji not in STANDARD_EMOJIS:
-        logger.warning(f"Эмодзи {emoji} не поддерживается Bot API")
+        logger.warning("Эмодзи %s не поддерживается Bot API", emoji)
         return False
     for attempt in range(max_retries):
         try:
-            await asyncio.sleep(delay if attempt > 0 else 0)
+            if attempt > 0:
+                await asyncio.sleep(delay * 2 ** (attempt - 1))
             await bot.request(
                 "editForumTopic",
                 {
@@ -33,10 +40,10 @@ async def smart_change_icon(
                     "icon_emoji_id": emoji
                 }
             )
-            logger.info(f"Иконка {emoji} успешно установлена на попытке {attempt+1}")
+            logger.info("Иконка %s успешно установлена на попытке %s", emoji, attempt + 1)
             return True
         except Exception as e:
-            logger.warning(f"Попытка {attempt+1} не удалась: {e}")
+            logger.warning("Попытка %s не удалась: %s", attempt + 1, e)
             if "CHAT_NOT_FOUND" in str(e) or "not enough rights" in str(e):
                 continue
             else:
@@ -66,10 +73,10 @@ async def change_topic_icon(
                     "icon_emoji_id": emoji
                 }
             )
-            logger.info(f"Иконка {emoji} установлена через Bot API")
+            logger.info("Иконка %s установлена через Bot API", emoji)
             return True
         except Exception as e:
-            logger.error(f"Ошибка Bot API: {str(e)}")
+            logger.error("Ошибка Bot API: %s", str(e))
 
     # Fallback на Telethon (для кастомных эмодзи)
     if telethon_client and emoji not in STANDARD_EMOJIS:
@@ -80,15 +87,19 @@ async def change_topic_icon(
                 return False
 
             # Используем raw API-вызов
-            await telethon_client(EditForumTopicRequest(
-                channel=chat_id,
-                topic_id=topic_id,
-                icon_emoji_id=emoji_id
-            ))
-            logger.info(f"Иконка {emoji} (ID: {emoji_id}) установлена через Telethon")
+            await telegram_scheduler.call(
+                lambda: telethon_client(EditForumTopicRequest(
+                    channel=chat_id,
+                    topic_id=topic_id,
+                    icon_emoji_id=emoji_id
+                )),
+                "EditForumTopicRequest",
+                chat_id=chat_id if isinstance(chat_id, int) else None
+            )
+            logger.info("Иконка %s (ID: %s) установлена через Telethon", emoji, emoji_id)
             return True
         except Exception as e:
-            logger.error(f"Ошибка Telethon: {str(e)}")
+            logger.error("Ошибка Telethon: %s", str(e))
 
     return False
 
@@ -98,7 +109,7 @@ async def _get_custom_emoji_id(emoji: str, client: TelegramClient) -> Optional[i
         icons = await client.get_forum_topic_icons()
         return next((icon.id for icon in icons if icon.emoticon == emoji), None)
     except Exception as e:
-        logger.error(f"Ошибка получения эмодзи: {str(e)}")
+        logger.error("Ошибка получения эмодзи: %s", str(e))
         return None
 
 async def generate_invite_link(
@@ -115,5 +126,5 @@ async def generate_invite_link(
         )
         return result.link
     except Exception as e:
-        logger.error(f"Ошибка генерации ссылки: {str(e)}")
+        logger.error("Ошибка генерации ссылки: %s", str(e))
         return None 
\ No newline at end of file
@@ -0,0 +1,142 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict, Mapping, Optional
+
+import aiosqlite
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from config import FSM_STORAGE, FSM_SQLITE_PATH, FSM_REDIS_URL, FSM_STATE_TTL
+
+logger = logging.getLogger(__name__)
+
+SQL_CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS fsm_states (
+        key TEXT PRIMARY KEY,
+        state TEXT,
+        data TEXT NOT NULL DEFAULT '{}',
+        updated_at REAL NOT NULL
+    )
+"""
+SQL_CREATE_INDEX = "CREATE INDEX IF NOT EXISTS ix_fsm_states_updated_at ON fsm_states (updated_at)"
+SQL_GET = "SELECT state, data, updated_at FROM fsm_states WHERE key = ?"
+SQL_SET_STATE = """
+    INSERT INTO fsm_states (key, state, updated_at) VALUES (?, ?, ?)
+    ON CONFLICT(key) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at
+"""
+SQL_SET_DATA = """
+    INSERT INTO fsm_states (key, data, updated_at) VALUES (?, ?, ?)
+    ON CONFLICT(key) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at
+"""
+SQL_DELETE_EMPTY = "DELETE FROM fsm_states WHERE key = ? AND state IS NULL AND data = '{}'"
+SQL_DELETE_KEY_EXPIRED = "DELETE FROM fsm_states WHERE key = ? AND updated_at < ?"
+SQL_DELETE_EXPIRED = "DELETE FROM fsm_states WHERE updated_at < ?"
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM-хранилище в локальном SQLite: состояние диалога переживает перезапуск бота.
+
+    Состояние и данные пользователя лежат в одной строке. Строки, которые не менялись
+    дольше ttl секунд, считаются истёкшими: при чтении они не возвращаются,
+    а периодически удаляются из таблицы.
+    """
+
+    def __init__(self, path: str = FSM_SQLITE_PATH, ttl: Optional[int] = FSM_STATE_TTL,
+                 key_builder: Optional[KeyBuilder] = None, purge_interval: float = 600):
+        self.path = path
+        self.ttl = ttl
+        self.key_builder = key_builder or DefaultKeyBuilder()
+        self.purge_interval = purge_interval
+        self._conn: Optional[aiosqlite.Connection] = None
+        self._connect_lock = asyncio.Lock()
+        self._write_lock = asyncio.Lock()
+        self._purged_at = 0.0
+
+    async def _get_conn(self) -> aiosqlite.Connection:
+        """Возвращает общее соединение (открывается и инициализирует таблицу один раз)"""
+        if self._conn is None:
+            async with self._connect_lock:
+                if self._conn is None:
+                    conn = await aiosqlite.connect(self.path)
+                    await conn.execute("PRAGMA journal_mode=WAL")
+                    await conn.execute("PRAGMA synchronous=NORMAL")
+                    await conn.execute(SQL_CREATE_TABLE)
+                    await conn.execute(SQL_CREATE_INDEX)
+                    await conn.commit()
+                    self._conn = conn
+        return self._conn
+
+    def _is_expired(self, updated_at: float) -> bool:
+        return self.ttl is not None and time.time() - updated_at > self.ttl
+
+    async def _get_row(self, key: StorageKey):
+        db = await self._get_conn()
+        async with db.execute(SQL_GET, (self.key_builder.build(key),)) as cursor:
+            row = await cursor.fetchone()
+        if row and self._is_expired(row[2]):
+            return None
+        return row
+
+    async def _write(self, sql: str, key: StorageKey, value: Optional[str]):
+        db = await self._get_conn()
+        now = time.time()
+        storage_key = self.key_builder.build(key)
+        async with self._write_lock:
+            if self.ttl is not None:
+                # Истёкшие состояние и данные не должны «воскреснуть» при частичной записи
+                await db.execute(SQL_DELETE_KEY_EXPIRED, (storage_key, now - self.ttl))
+            await db.execute(sql, (storage_key, value, now))
+            # После state.clear() строка пустая — не храним её
+            await db.execute(SQL_DELETE_EMPTY, (storage_key,))
+            if self.ttl is not None and now - self._purged_at > self.purge_interval:
+                self._purged_at = now
+                cursor = await db.execute(SQL_DELETE_EXPIRED, (now - self.ttl,))
+                if cursor.rowcount:
+                    logger.info("[FSM] Удалено истёкших состояний: %s", cursor.rowcount)
+            await db.commit()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        value = state.state if isinstance(state, State) else state
+        await self._write(SQL_SET_STATE, key, value)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        row = await self._get_row(key)
+        return row[0] if row else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise TypeError(f"Data must be a dict, not {type(data).__name__}")
+        await self._write(SQL_SET_DATA, key, json.dumps(data, ensure_ascii=False))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        row = await self._get_row(key)
+        return json.loads(row[1]) if row else {}
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+
+def create_fsm_storage(backend: str = FSM_STORAGE) -> BaseStorage:
+    """
+    Создаёт FSM-хранилище по настройке FSM_STORAGE
+
+    Args:
+        backend: "sqlite", "redis" или "memory"
+    """
+    if backend == "sqlite":
+        logger.info("FSM-хранилище: SQLite (%s), TTL %s сек", FSM_SQLITE_PATH, FSM_STATE_TTL)
+        return SQLiteStorage()
+    if backend == "redis":
+        from aiogram.fsm.storage.redis import RedisStorage
+
+        logger.info("FSM-хранилище: Redis (%s), TTL %s сек", FSM_REDIS_URL, FSM_STATE_TTL)
+        return RedisStorage.from_url(FSM_REDIS_URL, state_ttl=FSM_STATE_TTL, data_ttl=FSM_STATE_TTL)
+    if backend != "memory":
+        logger.warning("Неизвестное FSM-хранилище '%s', используется память", backend)
+    return MemoryStorage()
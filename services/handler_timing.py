@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Deque, Dict, List, Optional, Tuple
+
+from config import HANDLER_TIMING_WINDOW, HANDLER_TRACE_MAX_SPANS, SLOW_UPDATE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Вызовы Telegram внутри текущего обработчика: (метод, начало, ожидание в очереди, длительность)
+Span = Tuple[str, float, float, float]
+# Задача обработчика и её вызовы. Задачи, созданные в обработчике, копируют контекст вместе
+# с этим списком, поэтому записывает в него только задача, начавшая трассировку
+_trace: ContextVar[Optional[Tuple[Optional[asyncio.Task], List[Span]]]] = ContextVar("handler_trace", default=None)
+
+
+def record_span(name: str, started: float, queued: float, duration: float):
+    """Добавляет вызов Telegram в трассировку обработчика, если она идёт (вызывает планировщик)"""
+    trace = _trace.get()
+    if trace is None:
+        return
+    owner, spans = trace
+    # Фоновые задачи (проверка значков, воркеры очереди чатов) живут дольше обработчика
+    if owner is not asyncio.current_task():
+        return
+    if len(spans) < HANDLER_TRACE_MAX_SPANS:
+        spans.append((name, started, queued, duration))
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Перцентиль по ближайшему рангу (значения уже отсортированы)"""
+    return sorted_values[max(0, math.ceil(p * len(sorted_values)) - 1)]
+
+
+class HandlerTimings:
+    """
+    Время обработчиков aiogram по имени обработчика и по состоянию FSM.
+
+    Для каждого ключа хранятся последние HANDLER_TIMING_WINDOW замеров, перцентили
+    считаются по ним при запросе. Обработчики дольше SLOW_UPDATE_SECONDS попадают
+    в лог вместе с вызовами Telegram (Bot API и Telethon), сделанными внутри.
+    """
+
+    def __init__(self, window: int = HANDLER_TIMING_WINDOW, slow_threshold: float = SLOW_UPDATE_SECONDS):
+        self.window = window
+        self.slow_threshold = slow_threshold
+        self._handlers: Dict[str, Deque[float]] = {}
+        self._states: Dict[str, Deque[float]] = {}
+        self.slow = 0
+
+    def start(self):
+        """Начинает трассировку вызовов Telegram для текущего обработчика"""
+        return _trace.set((asyncio.current_task(), []))
+
+    def finish(self, token, handler: str, state: Optional[str], started: float):
+        """Записывает время обработчика и, если он медленный, трассировку в лог"""
+        elapsed = time.perf_counter() - started
+        trace = _trace.get()
+        spans = trace[1] if trace else []
+        _trace.reset(token)
+        state = state or "-"
+        self._handlers.setdefault(handler, deque(maxlen=self.window)).append(elapsed)
+        self._states.setdefault(state, deque(maxlen=self.window)).append(elapsed)
+        if elapsed < self.slow_threshold:
+            return
+        self.slow += 1
+        lines = [
+            f"  +{span_started - started:.3f} {name}: очередь {queued:.3f} с, вызов {duration:.3f} с"
+            for name, span_started, queued, duration in spans
+        ]
+        in_calls = sum(span[3] for span in spans)
+        logger.warning(
+            "[SLOW] %s (состояние %s): %.3f с, вызовов Telegram: %d (%.3f с)%s",
+            handler, state, elapsed, len(spans), in_calls, "".join("\n" + line for line in lines)
+        )
+
+    @staticmethod
+    def _summary(data: Dict[str, Deque[float]]) -> List[Tuple[str, int, float, float, float]]:
+        rows = []
+        for key, values in data.items():
+            ordered = sorted(values)
+            rows.append((key, len(ordered), percentile(ordered, 0.5), percentile(ordered, 0.95), percentile(ordered, 0.99)))
+        rows.sort(key=lambda row: row[3], reverse=True)
+        return rows
+
+    def handler_summary(self) -> List[Tuple[str, int, float, float, float]]:
+        """(обработчик, замеров, p50, p95, p99), самые медленные по p95 первыми"""
+        return self._summary(self._handlers)
+
+    def state_summary(self) -> List[Tuple[str, int, float, float, float]]:
+        """(состояние FSM, замеров, p50, p95, p99), самые медленные по p95 первыми"""
+        return self._summary(self._states)
+
+
+handler_timings = HandlerTimings()
@@ -0,0 +1,70 @@
+import json
+import logging
+from typing import Any, Union
+
+from config import JSON_BACKEND
+
+logger = logging.getLogger(__name__)
+
+
+class JSONCodec:
+    """
+    Сериализация JSON для шаблонов и списков эмодзи.
+
+    Бэкенд выбирается один раз: orjson или msgspec, если установлены, иначе стандартный json.
+    По умолчанию вывод компактный (без отступов); pretty=True — с отступом в 2 пробела.
+    dumps всегда возвращает UTF-8 байты без экранирования не-ASCII символов,
+    ошибка разбора в loads у любого бэкенда — ValueError.
+    """
+
+    def __init__(self, backend: str = JSON_BACKEND):
+        self.backend = self._select(backend)
+        if self.backend == "orjson":
+            import orjson
+            self._orjson = orjson
+        elif self.backend == "msgspec":
+            import msgspec
+            self._encoder = msgspec.json.Encoder()
+            self._decoder = msgspec.json.Decoder()
+            self._format = msgspec.json.format
+            self._decode_error = msgspec.DecodeError
+        logger.debug("JSON-бэкенд: %s", self.backend)
+
+    @staticmethod
+    def _select(backend: str) -> str:
+        candidates = ("orjson", "msgspec") if backend == "auto" else (backend,)
+        for name in candidates:
+            if name == "json":
+                return name
+            try:
+                __import__(name)
+                return name
+            except ImportError:
+                if backend != "auto":
+                    logger.warning("JSON-бэкенд %s не установлен, используется json", name)
+        return "json"
+
+    def dumps(self, obj: Any, pretty: bool = False) -> bytes:
+        """Сериализует объект в UTF-8 байты"""
+        if self.backend == "orjson":
+            return self._orjson.dumps(obj, option=self._orjson.OPT_INDENT_2 if pretty else 0)
+        if self.backend == "msgspec":
+            data = self._encoder.encode(obj)
+            return self._format(data, indent=2) if pretty else data
+        if pretty:
+            return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        """Разбирает JSON из байт или строки"""
+        if self.backend == "orjson":
+            return self._orjson.loads(data)
+        if self.backend == "msgspec":
+            try:
+                return self._decoder.decode(data)
+            except self._decode_error as e:
+                raise ValueError(str(e)) from e
+        return json.loads(data)
+
+
+json_codec = JSONCodec()
@@ -0,0 +1,74 @@
+import atexit
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+from config import LOG_FILE, LOG_FORMAT, LOG_LEVEL, LOG_LEVELS, LOG_SAMPLE_EVERY
+
+_listener: Optional[QueueListener] = None
+
+
+def setup_logging(level: str = LOG_LEVEL, levels: Dict[str, str] = LOG_LEVELS, log_file: str = LOG_FILE):
+    """
+    Настраивает логирование один раз при запуске.
+
+    Корневой логгер пишет в очередь (QueueHandler), а в bot.log и stdout записи
+    выводит отдельный поток QueueListener: форматирование и запись в файл не блокируют
+    event loop. Уровни модулей берутся из LOG_LEVELS поверх общего LOG_LEVEL.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(level)
+    for name, module_level in levels.items():
+        logging.getLogger(name).setLevel(module_level)
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Дописывает оставшиеся в очереди записи и останавливает поток логирования"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class LogSampler:
+    """
+    Выборка для частых событий: в лог попадает первое событие с данным ключом
+    и затем каждое every-е, остальные только считаются.
+    """
+
+    def __init__(self, every: int = LOG_SAMPLE_EVERY):
+        self.every = every
+        self._counts: Dict[str, int] = {}
+
+    def allow(self, key: str) -> bool:
+        """Учитывает событие и возвращает True, если его нужно записать в лог"""
+        count = self._counts.get(key, 0)
+        self._counts[key] = count + 1
+        return count % self.every == 0
+
+    def count(self, key: str) -> int:
+        """Сколько раз событие произошло с момента запуска"""
+        return self._counts.get(key, 0)
+
+
+log_sampler = LogSampler()
@@ -0,0 +1,258 @@
+import asyncio
+import logging
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+
+from config import METRICS_FILE, METRICS_FILE_INTERVAL, METRICS_HOST, METRICS_PORT
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм по умолчанию, секунды: от быстрых вызовов API до создания чата
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def _samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+
+class Counter(_Metric):
+    """Монотонно растущий счётчик"""
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        for key, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class Gauge(_Metric):
+    """Текущее значение; с func значение читается в момент выгрузки"""
+    kind = "gauge"
+
+    def __init__(self, *args, func: Optional[Callable[[], float]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+        self.func = func
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def _samples(self):
+        if self.func is not None:
+            try:
+                yield f"{self.name} {self.func()}"
+            except Exception as e:
+                logger.debug("[METRICS] Не удалось прочитать %s: %s", self.name, e)
+            return
+        for key, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class Histogram(_Metric):
+    """Распределение длительностей по корзинам (сумма и количество — как в Prometheus)"""
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [счётчики по корзинам (+Inf последней), сумма]
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Замеряет длительность блока (в том числе завершившегося исключением)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self):
+        for key, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {total}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class StageTimer:
+    """Последовательные этапы одной операции: длительность этапа пишется в гистограмму при начале следующего"""
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+        self._stage: Optional[str] = None
+        self._started = 0.0
+
+    def start(self, stage: str):
+        self.stop()
+        self._stage = stage
+        self._started = time.perf_counter()
+
+    def stop(self):
+        if self._stage is not None:
+            self.histogram.observe(time.perf_counter() - self._started, stage=self._stage)
+            self._stage = None
+
+
+class MetricsRegistry:
+    """
+    Реестр метрик бота в формате Prometheus.
+
+    Метрики объявляются на уровне модулей (metrics.counter(...) и т.д.) и обновляются
+    без блокировок: всё выполняется в одном event loop. Повторное объявление с тем же
+    именем возвращает уже существующую метрику.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, cls, name: str, documentation: str, labelnames: Sequence[str] = (), **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              func: Optional[Callable[[], float]] = None) -> Gauge:
+        gauge = self._register(Gauge, name, documentation, labelnames)
+        if func is not None:
+            gauge.func = func
+        return gauge
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        """Текст для /metrics (Prometheus exposition format)"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+class MetricsExporter:
+    """
+    Выгрузка метрик: HTTP-эндпоинт /metrics на METRICS_HOST:METRICS_PORT
+    и/или файл METRICS_FILE, перезаписываемый раз в METRICS_FILE_INTERVAL секунд
+    (например, для textfile-коллектора node_exporter)
+    """
+
+    def __init__(self, registry: MetricsRegistry = metrics, host: str = METRICS_HOST, port: int = METRICS_PORT,
+                 path: str = METRICS_FILE, interval: float = METRICS_FILE_INTERVAL):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.path = path
+        self.interval = interval
+        self._runner: Optional[web.AppRunner] = None
+        self._file_task: Optional[asyncio.Task] = None
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.registry.render(), content_type="text/plain", charset="utf-8")
+
+    async def start(self):
+        if self.port:
+            app = web.Application()
+            app.router.add_get("/metrics", self._handle)
+            self._runner = web.AppRunner(app, access_log=None)
+            await self._runner.setup()
+            try:
+                await web.TCPSite(self._runner, self.host, self.port).start()
+                logger.info("[METRICS] Метрики доступны на http://%s:%s/metrics", self.host, self.port)
+            except OSError as e:
+                logger.error("[METRICS] Не удалось открыть порт %s: %s", self.port, e)
+                await self._runner.cleanup()
+                self._runner = None
+        if self.path:
+            self._file_task = asyncio.create_task(self._write_loop())
+
+    def _write_file(self, text: str):
+        temp_file = f"{self.path}.tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(temp_file, self.path)
+
+    async def _write_loop(self):
+        while True:
+            try:
+                await asyncio.to_thread(self._write_file, self.registry.render())
+            except OSError as e:
+                logger.error("[METRICS] Не удалось записать %s: %s", self.path, e)
+            await asyncio.sleep(self.interval)
+
+    async def stop(self):
+        if self._file_task is not None:
+            self._file_task.cancel()
+            await asyncio.gather(self._file_task, return_exceptions=True)
+            self._file_task = None
+            # Последний снимок, чтобы файл не отставал от остановленного бота
+            try:
+                await asyncio.to_thread(self._write_file, self.registry.render())
+            except OSError as e:
+                logger.error("[METRICS] Не удалось записать %s: %s", self.path, e)
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,77 @@
+import logging
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """
+    Достаёт время ожидания из ошибки флуд-контроля Telegram
+
+    Args:
+        error: Исключение aiogram (TelegramRetryAfter) или Telethon (FloodWaitError)
+
+    Returns:
+        Optional[float]: Сколько секунд нужно подождать или None, если это не флуд-контроль
+    """
+    # aiogram: TelegramRetryAfter.retry_after
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is None:
+        # Telethon: FloodWaitError.seconds
+        retry_after = getattr(error, "seconds", None)
+    if retry_after is None:
+        return None
+    try:
+        return max(float(retry_after), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Token bucket с учётом retry_after от Telegram"""
+
+    def __init__(self, rate: float, capacity: int):
+        """
+        :param rate: Скорость пополнения (запросов в секунду)
+        :param capacity: Максимальный размер всплеска
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def delay(self, now: Optional[float] = None) -> float:
+        """Через сколько секунд будет доступен токен (0 — уже доступен)"""
+        now = time.monotonic() if now is None else now
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        self._refill(now)
+        if self._tokens >= 1:
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def blocked_for(self, now: Optional[float] = None) -> float:
+        """Сколько секунд ещё длится пауза после FloodWait (0 — паузы нет)"""
+        now = time.monotonic() if now is None else now
+        return max(0.0, self._blocked_until - now)
+
+    def consume(self, now: Optional[float] = None):
+        """Забирает токен без ожидания (вызывать после delay() == 0)"""
+        self._refill(time.monotonic() if now is None else now)
+        self._tokens -= 1
+
+    def penalize(self, retry_after: float):
+        """Останавливает выдачу токенов на retry_after секунд (ответ Telegram на флуд)"""
+        now = time.monotonic()
+        self._blocked_until = max(self._blocked_until, now + retry_after)
+        self._tokens = 0.0
+        self._updated = now
+        logger.warning("[RATE LIMIT] Флуд-контроль Telegram, пауза %.1f сек", retry_after)
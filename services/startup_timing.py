@@ -0,0 +1,46 @@
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """Замеряет этапы запуска бота и время до первого обработанного обновления"""
+
+    def __init__(self):
+        self.started_at: Optional[float] = None
+        self.phases: Dict[str, float] = {}
+        self.first_update: Optional[float] = None
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self.phases.clear()
+        self.first_update = None
+
+    @contextmanager
+    def phase(self, name: str):
+        """Добавляет длительность блока к этапу name"""
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - begin
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started_at if self.started_at is not None else 0.0
+
+    def report(self):
+        """Пишет в лог длительность этапов запуска"""
+        lines = [f"  {name}: {seconds * 1000:.0f} мс" for name, seconds in self.phases.items()]
+        logger.info("[STARTUP] Запуск за %.0f мс:\n%s", self.elapsed() * 1000, "\n".join(lines))
+
+    def mark_first_update(self):
+        """Отмечает первое обработанное обновление (только один раз)"""
+        if self.first_update is None and self.started_at is not None:
+            self.first_update = self.elapsed()
+            logger.info("[STARTUP] Первое обновление обработано через %.2f сек после старта", self.first_update)
+
+
+startup_timer = StartupTimer()
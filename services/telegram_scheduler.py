@@ -0,0 +1,353 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple, TypeVar
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+
+from config import (
+    SCHEDULER_BOT_RATE, SCHEDULER_BOT_BURST,
+    SCHEDULER_USER_RATE, SCHEDULER_USER_BURST,
+    SCHEDULER_CHAT_RATE, SCHEDULER_CHAT_BURST,
+    SCHEDULER_METHOD_LIMITS, SCHEDULER_MAX_RETRIES,
+    SCHEDULER_RATE_GROWTH, SCHEDULER_RATE_STEP, SCHEDULER_RATE_MAX_FACTOR,
+    SCHEDULER_MAX_WAIT, SCHEDULER_INTERACTIVE_MAX_WAIT
+)
+from services.handler_timing import record_span
+from services.logging_setup import log_sampler
+from services.metrics import metrics
+from services.rate_limit import TokenBucket, get_retry_after
+
+logger = logging.getLogger(__name__)
+
+CALL_SECONDS = metrics.histogram(
+    "telegram_call_seconds", "Длительность вызовов Telegram (без ожидания в очереди)", ("account", "method")
+)
+QUEUE_SECONDS = metrics.histogram(
+    "telegram_queue_wait_seconds", "Ожидание вызова в очереди планировщика", ("account",)
+)
+FLOOD_WAITS = metrics.counter("telegram_flood_waits_total", "Полученные FloodWait / retry_after", ("account", "method"))
+CALL_ERRORS = metrics.counter("telegram_call_errors_total", "Вызовы Telegram, завершившиеся ошибкой", ("account", "method"))
+
+T = TypeVar("T")
+
+# Приоритеты: меньше — раньше
+PRIORITY_INTERACTIVE = 0  # Ответы пользователю
+PRIORITY_NORMAL = 1
+PRIORITY_BULK = 2  # Массовые операции (топики, проверка значков)
+
+# Аккаунты с отдельными лимитами Telegram
+ACCOUNT_BOT = "bot"  # Bot API
+ACCOUNT_USER = "user"  # MTProto (Telethon)
+
+# Методы Bot API, которые считаются ответом пользователю, если приоритет не задан явно
+INTERACTIVE_METHODS = {
+    "sendMessage", "editMessageText", "editMessageReplyMarkup",
+    "answerCallbackQuery", "deleteMessage", "sendChatAction"
+}
+
+_priority: ContextVar[Optional[int]] = ContextVar("telegram_call_priority", default=None)
+
+
+class FloodWaitTooLong(Exception):
+    """Вызов не выполнен: Telegram просит ждать дольше, чем допустимо для его приоритета"""
+
+    def __init__(self, method: str, retry_after: float):
+        super().__init__(f"{method}: Telegram просит подождать {retry_after:.0f} сек")
+        self.method = method
+        self.retry_after = retry_after
+
+
+@contextmanager
+def call_priority(priority: int):
+    """Задаёт приоритет всех вызовов Telegram внутри блока (и созданных в нём задач)"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TelegramScheduler:
+    """
+    Общий планировщик вызовов Telegram API для Telethon и aiogram.
+
+    Каждый вызов ждёт токены сразу в трёх корзинах: общей для аккаунта, корзине метода
+    и корзине чата. Ожидающие вызовы обслуживаются по приоритету, но вызов, упёршийся
+    в лимит своего чата, не задерживает вызовы в другие чаты. Массовые вызовы
+    (PRIORITY_BULK, например топики только что созданного чата) идут мимо корзины чата,
+    пока в этом чате не было FloodWait.
+
+    Настроенные скорости — стартовые: после каждого успешного вызова корзина ускоряется
+    (в rate_growth раз, после первого FloodWait — линейно на rate_step от стартовой),
+    но не выше max_rate_factor от стартовой. На FloodWait/retry_after планировщик ставит
+    паузу на корзины метода и чата и вдвое снижает их скорость. FloodWait дольше max_wait
+    (для ответов пользователю — interactive_max_wait) не ждётся: вызов сразу завершается
+    FloodWaitTooLong.
+    """
+
+    def __init__(self,
+                 account_limits: Optional[Dict[str, Tuple[float, int]]] = None,
+                 method_limits: Optional[Dict[str, Tuple[float, int]]] = None,
+                 chat_limit: Tuple[float, int] = (SCHEDULER_CHAT_RATE, SCHEDULER_CHAT_BURST),
+                 max_retries: int = SCHEDULER_MAX_RETRIES,
+                 min_rate: float = 0.05,
+                 rate_growth: float = SCHEDULER_RATE_GROWTH,
+                 rate_step: float = SCHEDULER_RATE_STEP,
+                 max_rate_factor: float = SCHEDULER_RATE_MAX_FACTOR,
+                 max_wait: float = SCHEDULER_MAX_WAIT,
+                 interactive_max_wait: float = SCHEDULER_INTERACTIVE_MAX_WAIT):
+        self.account_limits = account_limits or {
+            ACCOUNT_BOT: (SCHEDULER_BOT_RATE, SCHEDULER_BOT_BURST),
+            ACCOUNT_USER: (SCHEDULER_USER_RATE, SCHEDULER_USER_BURST),
+        }
+        self.method_limits = SCHEDULER_METHOD_LIMITS if method_limits is None else method_limits
+        self.chat_limit = chat_limit
+        self.max_retries = max_retries
+        self.min_rate = min_rate
+        self.rate_growth = rate_growth
+        self.rate_step = rate_step
+        self.max_rate_factor = max_rate_factor
+        self.max_wait = max_wait
+        self.interactive_max_wait = interactive_max_wait
+        self._buckets: Dict[Tuple, TokenBucket] = {}
+        self._base_rates: Dict[Tuple, float] = {}
+        # Корзины, получавшие FloodWait: дальше они ускоряются линейно
+        self._flooded: Set[Tuple] = set()
+        self._waiters: List[Tuple[int, int, List[TokenBucket], asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.calls: Dict[str, int] = {}
+        self.flood_waits: Dict[str, int] = {}
+
+    def _bucket(self, key: Tuple, rate: float, capacity: int) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(rate, capacity)
+            self._base_rates[key] = rate
+        return bucket
+
+    def _keys(self, account: str, method: str, chat_id: Optional[int], priority: int) -> List[Tuple]:
+        keys = [("account", account)]
+        if method in self.method_limits:
+            keys.append(("method", account, method))
+        if chat_id is not None:
+            chat_key = ("chat", account, chat_id)
+            if priority != PRIORITY_BULK or chat_key in self._flooded:
+                keys.append(chat_key)
+        return keys
+
+    def _max_wait(self, priority: int) -> float:
+        return self.interactive_max_wait if priority == PRIORITY_INTERACTIVE else self.max_wait
+
+    def _buckets_for(self, keys: List[Tuple], method: str) -> List[TokenBucket]:
+        buckets = []
+        for key in keys:
+            if key[0] == "account":
+                rate, capacity = self.account_limits[key[1]]
+            elif key[0] == "method":
+                rate, capacity = self.method_limits[method]
+            else:
+                rate, capacity = self.chat_limit
+            buckets.append(self._bucket(key, rate, capacity))
+        return buckets
+
+    async def acquire(self, account: str, method: str, chat_id: Optional[int] = None,
+                      priority: int = PRIORITY_NORMAL):
+        """
+        Ждёт своей очереди на вызов метода
+
+        Raises:
+            FloodWaitTooLong: Корзина на паузе после FloodWait дольше допустимого для приоритета
+        """
+        buckets = self._buckets_for(self._keys(account, method, chat_id, priority), method)
+        blocked = max(bucket.blocked_for() for bucket in buckets)
+        if blocked > self._max_wait(priority):
+            raise FloodWaitTooLong(method, blocked)
+        loop = asyncio.get_running_loop()
+        if self._dispatcher is None or self._dispatcher.done() or self._dispatcher.get_loop() is not loop:
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        future = loop.create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), buckets, future))
+        self._wakeup.set()
+        await future
+
+    async def _dispatch(self):
+        while True:
+            if not self._waiters:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            now = time.monotonic()
+            next_delay = None
+            granted = None
+            for entry in sorted(self._waiters):
+                future = entry[3]
+                if future.done():
+                    # Вызов отменён, пока ждал очереди
+                    granted = entry
+                    break
+                delay = max(bucket.delay(now) for bucket in entry[2])
+                if delay <= 0:
+                    for bucket in entry[2]:
+                        bucket.consume(now)
+                    future.set_result(None)
+                    granted = entry
+                    break
+                next_delay = delay if next_delay is None else min(next_delay, delay)
+            if granted is not None:
+                self._waiters.remove(granted)
+                heapq.heapify(self._waiters)
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=next_delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def _on_flood(self, account: str, method: str, chat_id: Optional[int], priority: int, retry_after: float):
+        """Пауза и снижение скорости для корзин метода и чата"""
+        name = f"{account}:{method}"
+        self.flood_waits[name] = self.flood_waits.get(name, 0) + 1
+        if chat_id is not None:
+            # С этого момента и массовые вызовы в чат идут через его корзину
+            self._flooded.add(("chat", account, chat_id))
+        keys = [k for k in self._keys(account, method, chat_id, priority) if k[0] != "account"]
+        if not keys:
+            # У метода нет своей корзины — тормозим весь аккаунт
+            keys = [("account", account)]
+        for bucket, key in zip(self._buckets_for(keys, method), keys):
+            bucket.penalize(retry_after)
+            bucket.rate = max(self.min_rate, bucket.rate / 2)
+            self._flooded.add(key)
+        # Под нагрузкой FloodWait приходят пачками: в лог попадает каждый LOG_SAMPLE_EVERY-й
+        if log_sampler.allow("scheduler.flood_wait"):
+            logger.warning("[SCHEDULER] FloodWait %.1f сек для %s (чат %s), всего: %d",
+                           retry_after, name, chat_id, log_sampler.count("scheduler.flood_wait"))
+
+    def _on_success(self, account: str, method: str, chat_id: Optional[int], priority: int):
+        """Ускоряет корзины: до первого FloodWait — в rate_growth раз, после — линейно"""
+        for key in self._keys(account, method, chat_id, priority):
+            bucket = self._buckets[key]
+            base = self._base_rates[key]
+            if key in self._flooded:
+                rate = bucket.rate + base * self.rate_step
+            else:
+                rate = bucket.rate * self.rate_growth
+            bucket.rate = min(base * self.max_rate_factor, rate)
+
+    async def call(self, func: Callable[[], Awaitable[T]], method: str, chat_id: Optional[int] = None,
+                   account: str = ACCOUNT_USER, priority: Optional[int] = None) -> T:
+        """
+        Выполняет вызов Telegram через планировщик
+
+        Args:
+            func: Функция без аргументов, выполняющая запрос
+            method: Имя метода (для лимитов и статистики)
+            chat_id: Чат, к которому относится вызов
+            account: ACCOUNT_USER (Telethon) или ACCOUNT_BOT (Bot API)
+            priority: Приоритет; по умолчанию берётся из call_priority() или PRIORITY_NORMAL
+
+        Raises:
+            FloodWaitTooLong: FloodWait дольше допустимого для приоритета (см. max_wait)
+            Исключение последней попытки, если FloodWait повторился больше max_retries раз
+        """
+        if priority is None:
+            priority = _priority.get()
+            if priority is None:
+                priority = PRIORITY_NORMAL
+        name = f"{account}:{method}"
+        for attempt in range(self.max_retries + 1):
+            queued = time.perf_counter()
+            try:
+                await self.acquire(account, method, chat_id, priority)
+            except FloodWaitTooLong:
+                CALL_ERRORS.inc(account=account, method=method)
+                raise
+            started = time.perf_counter()
+            QUEUE_SECONDS.observe(started - queued, account=account)
+            self.calls[name] = self.calls.get(name, 0) + 1
+            try:
+                result = await func()
+            except Exception as e:
+                record_span(name, queued, started - queued, time.perf_counter() - started)
+                CALL_SECONDS.observe(time.perf_counter() - started, account=account, method=method)
+                retry_after = get_retry_after(e)
+                if retry_after is None:
+                    CALL_ERRORS.inc(account=account, method=method)
+                    raise
+                FLOOD_WAITS.inc(account=account, method=method)
+                self._on_flood(account, method, chat_id, priority, retry_after)
+                if retry_after > self._max_wait(priority):
+                    # Долгую паузу не ждём: ответ пользователю важнее, чем повтор через минуты
+                    raise FloodWaitTooLong(method, retry_after) from e
+                if attempt == self.max_retries:
+                    raise
+                continue
+            record_span(name, queued, started - queued, time.perf_counter() - started)
+            CALL_SECONDS.observe(time.perf_counter() - started, account=account, method=method)
+            self._on_success(account, method, chat_id, priority)
+            return result
+
+    def waiting(self) -> int:
+        """Сколько вызовов ждёт своей очереди"""
+        return len(self._waiters)
+
+    def stats(self) -> Dict[str, Any]:
+        """Счётчики вызовов и FloodWait по методам, текущие скорости корзин"""
+        return {
+            "calls": dict(self.calls),
+            "flood_waits": dict(self.flood_waits),
+            "rates": {":".join(map(str, key)): bucket.rate for key, bucket in self._buckets.items()},
+            "waiting": self.waiting()
+        }
+
+
+class SchedulerRequestMiddleware(BaseRequestMiddleware):
+    """Пропускает все запросы aiogram Bot через TelegramScheduler"""
+
+    def __init__(self, scheduler: TelegramScheduler):
+        self.scheduler = scheduler
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        api_method = method.__api_method__
+        priority = _priority.get()
+        if priority is None:
+            priority = PRIORITY_INTERACTIVE if api_method in INTERACTIVE_METHODS else PRIORITY_NORMAL
+        chat_id = getattr(method, "chat_id", None)
+        return await self.scheduler.call(
+            lambda: make_request(bot, method),
+            api_method,
+            chat_id=chat_id if isinstance(chat_id, int) else None,
+            account=ACCOUNT_BOT,
+            priority=priority
+        )
+
+
+def attach_scheduler(bot: Bot, scheduler: Optional[TelegramScheduler] = None) -> Bot:
+    """Подключает планировщик к сессии бота (один раз)"""
+    scheduler = scheduler or telegram_scheduler
+    if not any(isinstance(m, SchedulerRequestMiddleware) for m in bot.session.middleware):
+        bot.session.middleware(SchedulerRequestMiddleware(scheduler))
+    return bot
+
+
+telegram_scheduler = TelegramScheduler()
+metrics.gauge(
+    "telegram_queue_length", "Вызовы, ждущие своей очереди в планировщике",
+    func=telegram_scheduler.waiting
+)
@@ -6,14 +6,16 @@ from typing import List, Optional, Dict, Any
 import logging
 import os
 import json
-import asyncio
 import datetime
 
+from services.telegram_scheduler import telegram_scheduler
+
 logger = logging.getLogger(__name__)
 
 class TelethonService:
     def __init__(self, api_id: int, api_hash: str, bot_token: str):
-        self.client = TelegramClient('bot', api_id, api_hash)
+        # FloodWait обрабатывает общий планировщик вызовов
+        self.client = TelegramClient('bot', api_id, api_hash, flood_sleep_threshold=0)
         self.bot_token = bot_token
         self.templates_dir = 'templates'
         
@@ -21,6 +23,10 @@ class TelethonService:
         if not os.path.exists(self.templates_dir):
             os.makedirs(self.templates_dir)
     
+    async def _mtproto(self, request, chat_id: Optional[int] = None):
+        """Выполняет MTProto-запрос через общий планировщик вызовов Telegram"""
+        return await telegram_scheduler.call(lambda: self.client(request), type(request).__name__, chat_id=chat_id)
+
     async def start(self):
         """Запускает клиент"""
         await self.client.start(bot_token=self.bot_token)
@@ -29,17 +35,17 @@ class TelethonService:
     async def create_forum(self, chat_data: dict, user_id: int) -> Optional[Dict[str, Any]]:
         """Создает форум-чат и добавляет пользователя"""
         try:
-            logger.info(f"Starting forum creation for user {user_id}")
+            logger.info("Starting forum creation for user %s", user_id)
             
             # Создаем канал (который автоматически станет супергруппой)
-            result = await self.client(CreateChannelRequest(
+            result = await self._mtproto(CreateChannelRequest(
                 title=chat_data['title'],
                 about=chat_data.get('description', ''),
                 megagroup=True  # Это создаст супергруппу
             ))
 
             channel = result.chats[0]
-            logger.info(f"Channel created with ID: {channel.id}")
+            logger.info("Channel created with ID: %s", channel.id)
             
             # Даем боту права администратора
             bot_admin_rights = ChatAdminRights(
@@ -57,27 +63,23 @@ class TelethonService:
             )
             
             # Получаем ID бота
-            bot_me = await self.client.get_me()
-            logger.info(f"Bot ID: {bot_me.id}")
+            bot_me = await telegram_scheduler.call(self.client.get_me, "get_me")
+            logger.info("Bot ID: %s", bot_me.id)
             
             # Назначаем бота администратором
-            await self.client(EditAdminRequest(
+            await self._mtproto(EditAdminRequest(
                 channel=channel.id,
                 user_id=bot_me.id,
                 admin_rights=bot_admin_rights,
                 rank="Bot Admin"
-            ))
+            ), chat_id=channel.id)
             logger.info("Bot promoted to admin")
             
-            # Небольшая задержка для уверенности
-            await asyncio.sleep(2)
-            
             # Добавляем пользователя в чат
-            await self.client.add_chat_user(channel.id, user_id)
-            logger.info(f"User {user_id} added to chat")
-            
-            # Еще небольшая задержка
-            await asyncio.sleep(2)
+            await telegram_scheduler.call(
+                lambda: self.client.add_chat_user(channel.id, user_id), "add_chat_user", chat_id=channel.id
+            )
+            logger.info("User %s added to chat", user_id)
             
             # Теперь делаем пользователя администратором
             user_admin_rights = ChatAdminRights(
@@ -94,17 +96,19 @@ class TelethonService:
                 other=True
             )
             
-            await self.client(EditAdminRequest(
+            await self._mtproto(EditAdminRequest(
                 channel=channel.id,
                 user_id=user_id,
                 admin_rights=user_admin_rights,
                 rank="Admin"
-            ))
-            logger.info(f"User {user_id} promoted to admin")
+            ), chat_id=channel.id)
+            logger.info("User %s promoted to admin", user_id)
             
             # Получаем ссылку-приглашение
-            invite_link = await self.client.export_chat_invite_link(channel.id)
-            logger.info(f"Invite link generated: {invite_link}")
+            invite_link = await telegram_scheduler.call(
+                lambda: self.client.export_chat_invite_link(channel.id), "export_chat_invite_link", chat_id=channel.id
+            )
+            logger.info("Invite link generated: %s", invite_link)
 
             return {
                 'chat_id': channel.id,
@@ -113,7 +117,7 @@ class TelethonService:
             }
 
         except Exception as e:
-            logger.error(f"Error creating forum: {e}", exc_info=True)
+            logger.error("Error creating forum: %s", e, exc_info=True)
             return None
     
     async def add_user_to_forum(self, forum_id: int, user_id: int) -> bool:
@@ -128,10 +132,12 @@ class TelethonService:
             bool: True if successful, False otherwise
         """
         try:
-            await self.client.add_chat_user(forum_id, user_id)
+            await telegram_scheduler.call(
+                lambda: self.client.add_chat_user(forum_id, user_id), "add_chat_user", chat_id=forum_id
+            )
             return True
         except Exception as e:
-            logger.error(f"Error adding user to forum: {e}")
+            logger.error("Error adding user to forum: %s", e)
             return False
     
     async def disconnect(self):
@@ -156,7 +162,7 @@ class TelethonService:
             else:
                 # Проверяем, существует ли шаблон с таким именем
                 if any(t.name == template.name for t in templates):
-                    logger.error(f"Template with name '{template.name}' already exists")
+                    logger.error("Template with name '%s' already exists", template.name)
                     return False
                 # Добавляем новый шаблон
                 templates.append(template)
@@ -172,11 +178,11 @@ class TelethonService:
             with open(file_path, 'w', encoding='utf-8') as f:
                 json.dump(templates_data, f, ensure_ascii=False, indent=2)
                 
-            logger.info(f"Successfully saved template '{template.name}' for user {user_id}")
+            logger.info("Successfully saved template '%s' for user %s", template.name, user_id)
             return True
             
         except Exception as e:
-            logger.error(f"Error saving template: {e}")
+            logger.error("Error saving template: %s", e)
             return False
 
     async def make_chat_admin(self, chat_id: int, user_id: int) -> bool:
@@ -200,16 +206,16 @@ class TelethonService:
                 )
 
                 # Выполняем запрос на назначение админа
-                await self.client(EditAdminRequest(
+                await self._mtproto(EditAdminRequest(
                     channel=chat_id,  # ID канала/супергруппы
                     user_id=user_id,  # ID пользователя
                     admin_rights=admin_rights,
                     rank="Admin"      # Ранг администратора
-                ))
+                ), chat_id=chat_id)
 
-                logger.info(f"Successfully made user {user_id} admin in chat {chat_id}")
+                logger.info("Successfully made user %s admin in chat %s", user_id, chat_id)
                 return True
 
         except Exception as e:
-            logger.error(f"Error making user {user_id} admin in chat {chat_id}: {e}")
+            logger.error("Error making user %s admin in chat %s: %s", user_id, chat_id, e)
             return False
\ No newline at end of file
@@ -1,35 +1,44 @@
 from telethon.sync import TelegramClient
 from telethon.tl.functions.channels import CreateChannelRequest, SetDiscussionGroupRequest, InviteToChannelRequest, CreateForumTopicRequest
 from telethon.tl.functions.messages import CreateChatRequest, MigrateChatRequest, ExportChatInviteRequest
-from telethon.tl.types import InputChannel, InputPeerUser, InputPeerChannel
+from telethon.tl.types import InputChannel, InputPeerUser, InputPeerChannel, PeerChannel
 from telethon.tl.functions.channels import EditTitleRequest, EditAdminRequest, EditCreatorRequest
 from telethon.tl.types import ChatAdminRights, ChannelParticipantsAdmins
 from typing import List, Dict, Optional, Any
 import logging
-import json
 import os
 from datetime import datetime
-import asyncio
-import aiofiles
-import shutil
-import sys
-from loguru import logger
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass
 
 from telethon.tl.types import ChatAdminRights
-from telethon.tl.functions.channels import EditAdminRequest
+from telethon.tl.functions.channels import EditAdminRequest, GetParticipantRequest
+from telethon.errors import UserNotParticipantError
+
+from models.schemas import ChatCreate, Template, ChatTemplate
+from models.records import TemplateRecord, record_from_template, record_to_template
+from config import (
+    TOPIC_CREATE_CONCURRENCY, TEMPLATE_BACKEND,
+    PARTICIPANT_CACHE_TTL, PARTICIPANT_NEGATIVE_TTL, PARTICIPANT_SCAN_LIMIT
+)
+from services.topic_pipeline import TopicCreationPipeline
+from services.template_store import TemplateStore
+from services.database import DatabaseService
+from services.emoji_registry import emoji_registry
+from services.entity_cache import EntityCache
+from services.template_cache import TemplateCache
+from services.template_writer import TemplateWriter
+from services.startup_timing import startup_timer
+from services.metrics import StageTimer, metrics
+from services.telegram_scheduler import ACCOUNT_USER, attach_scheduler, telegram_scheduler
 
-from models.schemas import ChatCreate, Topic, Template, ChatTemplate
-
-# Configure logging
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
 
-# Create console handler
-console_handler = logging.StreamHandler(sys.stdout)
-console_handler.setLevel(logging.DEBUG)
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-console_handler.setFormatter(formatter)
-logger.addHandler(console_handler)
+FORUM_SECONDS = metrics.histogram("forum_create_seconds", "Создание форум-чата целиком (create_forum)")
+FORUM_STAGE_SECONDS = metrics.histogram("forum_stage_seconds", "Этапы create_forum", ("stage",))
+FORUMS_CREATED = metrics.counter("forums_created_total", "Вызовы create_forum по результату", ("result",))
 
 # Хардкодим emoji_id для популярных эмодзи Telegram (примерные значения, их можно расширить)
 EMOJI_ID_MAP = {
@@ -86,15 +95,12 @@ class BotApiService:
     async def create_forum_topic(bot: Bot, chat_id: int, name: str, emoji_id: str):
         """Создать топик с эмодзи через Bot API"""
         try:
-            # Загружаем рабочий список эмодзи
-            with open("working_topic_emojis.json", "r", encoding="utf-8") as f:
-                emoji_map = json.load(f)
-            
             # Получаем emoji_id из рабочего списка
-            if emoji_id in emoji_map:
-                emoji_id = emoji_map[emoji_id]
+            working_id = emoji_registry.get_id(emoji_id)
+            if working_id:
+                emoji_id = working_id
             else:
-                logger.info(f"Эмодзи {emoji_id} не найден в рабочем списке — топик будет без иконки")
+                logger.info("Эмодзи %s не найден в рабочем списке — топик будет без иконки", emoji_id)
                 return None
 
             # Создаем топик через Bot API
@@ -104,395 +110,165 @@ class BotApiService:
                 icon_custom_emoji_id=emoji_id
             )
         except Exception as e:
-            logger.error(f"Ошибка при создании топика: {e}")
+            logger.error("Ошибка при создании топика: %s", e)
             return None
 
+@dataclass
+class ChatSetup:
+    """Шаги настройки созданного чата, которые уже выполнены"""
+    chat_id: int
+    user_id: Optional[int] = None
+    user_invited: bool = False
+    user_admin: bool = False
+    mtproto_calls: int = 0
+
+
+# Настройка чата, для которой сейчас считаются MTProto-вызовы (своя у каждой задачи)
+_current_setup: ContextVar[Optional[ChatSetup]] = ContextVar("chat_setup", default=None)
+
+
 class TelethonService:
-    def __init__(self, api_id: int, api_hash: str, session_name: str = "bot_session"):
+    def __init__(self, api_id: int, api_hash: str, session_name: str = "bot_session", bot: Optional[Bot] = None):
         """
         Инициализация сервиса Telethon
         :param api_id: API ID from Telegram
         :param api_hash: API Hash from Telegram
         :param session_name: Имя сессии
+        :param bot: Экземпляр aiogram Bot (из диспетчера) для вызовов Bot API
         """
         self.api_id = api_id
         self.api_hash = api_hash
         self.session_name = session_name
         self.client = None
-        self._templates: Dict[int, List[ChatTemplate]] = {}
+        self._bot = attach_scheduler(bot) if bot is not None else None
+        self._owns_bot = False
+        self._store_ready = False
+        self._ready = False
+        # Разрешённые сущности: повторные get_entity не ходят в сеть
+        self._entities = EntityCache()
+        # (чат, пользователь) -> (истекает, участник ли)
+        self._participants: Dict[tuple, tuple] = {}
+        # Состояние настройки недавно созданных чатов: повторные шаги пропускаются
+        self._setups: "OrderedDict[int, ChatSetup]" = OrderedDict()
         
-        # Используем абсолютный путь и создаем директорию, если её нет
-        self.templates_file = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "templates.json")
-        os.makedirs(os.path.dirname(self.templates_file), exist_ok=True)
+        # Используем абсолютный путь: у каждого пользователя свой файл в data/templates
+        data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+        self.templates_dir = os.path.join(data_dir, "templates")
+        self._json_store = TemplateStore(self.templates_dir, legacy_file=os.path.join(data_dir, "templates.json"))
         
-        logger.info(f"Путь к файлу шаблонов: {self.templates_file}")
-        self._load_templates()
-
-    def _load_templates(self):
-        """Загружает шаблоны из файла"""
-        try:
-            logger.info("Начало загрузки шаблонов")
-            self._templates = {}  # Очищаем словарь перед загрузкой
-            
-            if not os.path.exists(self.templates_file):
-                logger.info(f"Файл шаблонов {self.templates_file} не существует, создаем новый")
-                self._save_templates()  # Создаем пустой файл
-                return
-                
-            # Проверяем размер файла
-            file_size = os.path.getsize(self.templates_file)
-            if file_size == 0:
-                logger.warning("Файл шаблонов пуст")
-                return
-                
-            logger.info(f"Чтение файла шаблонов (размер: {file_size} байт)")
-            
-            with open(self.templates_file, 'r', encoding='utf-8') as f:
-                file_content = f.read()
-                if not file_content.strip():
-                    logger.warning("Файл шаблонов пуст")
-                    return
-                    
-                try:
-                    data = json.loads(file_content)
-                except json.JSONDecodeError as e:
-                    logger.error(f"Ошибка при разборе JSON: {e}")
-                    logger.error(f"Содержимое файла: {file_content[:200]}...")  # Логируем начало файла
-                    return
-                
-            if not isinstance(data, dict):
-                logger.error(f"Некорректный формат файла шаблонов: {type(data)}")
-                return
-                
-            logger.info(f"Найдено пользователей в файле: {len(data)}")
-            
-            for user_id_str, templates in data.items():
-                try:
-                    user_id = int(user_id_str)
-                    if not isinstance(templates, list):
-                        logger.error(f"Некорректный формат шаблонов для пользователя {user_id}: {type(templates)}")
-                        continue
-                        
-                    self._templates[user_id] = []
-                    logger.info(f"Загрузка {len(templates)} шаблонов для пользователя {user_id}")
-                    
-                    for t in templates:
-                        try:
-                            if not isinstance(t, dict):
-                                logger.error(f"Некорректный формат шаблона: {type(t)}")
-                                continue
-                                
-                            if 'name' not in t or 'chat_name' not in t:
-                                logger.error(f"Отсутствуют обязательные поля в шаблоне: {t}")
-                                continue
-                                
-                            # Преобразуем строку даты в объект datetime
-                            created_at = None
-                            if 'created_at' in t and t['created_at']:
-                                try:
-                                    created_at = datetime.fromisoformat(t['created_at'])
-                                except ValueError as e:
-                                    logger.warning(f"Не удалось преобразовать дату создания: {e}")
-                            
-                            topics = []
-                            for tt in t.get('topics', []):
-                                topic = Topic(
-                                    title=tt['title'],
-                                    description=tt.get('description', ''),
-                                    icon_emoji=tt.get('icon_emoji'),
-                                    icon_color=tt.get('icon_color', 0),
-                                    is_closed=tt.get('is_closed', False),
-                                    is_hidden=tt.get('is_hidden', False)
-                                )
-                                if topic.title:
-                                    topics.append(topic)
-                            if topics:
-                                self._templates[user_id].append(ChatTemplate(
-                                    name=t['name'],
-                                    chat_name=t['chat_name'],
-                                    description=t.get('description', ''),
-                                    topics=topics,
-                                    user_id=user_id,
-                                    created_at=created_at
-                                ))
-                                logger.info(f"Загружен шаблон '{t['name']}' с {len(topics)} топиками")
-                            else:
-                                logger.warning(f"Шаблон '{t['name']}' не содержит топиков, пропускаем")
-                            
-                        except Exception as template_error:
-                            logger.error(f"Ошибка при загрузке шаблона: {template_error}")
-                            continue
-                            
-                except Exception as user_error:
-                    logger.error(f"Ошибка при загрузке шаблонов пользователя {user_id_str}: {user_error}")
-                    continue
-                    
-            total_templates = sum(len(templates) for templates in self._templates.values())
-            logger.info(f"Загрузка завершена. Всего загружено {total_templates} шаблонов для {len(self._templates)} пользователей")
-            
-            # Выводим статистику по каждому пользователю
-            for user_id, templates in self._templates.items():
-                logger.info(f"Пользователь {user_id}: {len(templates)} шаблонов")
-                for template in templates:
-                    logger.info(f"  - Шаблон '{template.name}': {len(template.topics)} топиков")
-                
-        except Exception as e:
-            logger.error(f"Ошибка при загрузке шаблонов: {e}")
-            logger.exception(e)
-            self._templates = {}
-
-    async def _save_templates(self):
-        """Сохраняет шаблоны в файл"""
-        try:
-            logger.info("=== Начало сохранения шаблонов ===")
-            logger.info(f"Путь к файлу: {self.templates_file}")
-            
-            # Проверяем данные перед сохранением
-            if not self._templates:
-                logger.warning("Нет шаблонов для сохранения!")
-                return False
-            
-            # Подготавливаем данные для сохранения
-            data = {}
-            total_templates = 0
-            
-            for user_id, templates in self._templates.items():
-                if not templates:
-                    logger.warning(f"Пустой список шаблонов для пользователя {user_id}")
-                    continue
-                
-                valid_templates = []
-                for t in templates:
-                    if not t.name or not t.chat_name:
-                        logger.warning(f"Пропускаем шаблон с пустым именем или названием чата")
-                        continue
-                        
-                    if not t.topics:
-                        logger.warning(f"Пропускаем шаблон '{t.name}' без топиков")
-                        continue
-                        
-                    template_data = {
-                        'name': t.name,
-                        'chat_name': t.chat_name,
-                        'description': t.description,
-                        'topics': [
-                            {
-                                'title': topic.title,
-                                'description': topic.description or '',
-                                'icon_emoji': getattr(topic, 'icon_emoji', None),
-                                'icon_color': topic.icon_color if topic.icon_color is not None else 0,
-                                'is_closed': topic.is_closed,
-                                'is_hidden': topic.is_hidden
-                            }
-                            for topic in t.topics
-                            if topic.title
-                        ]
-                    }
-                    
-                    if template_data['topics']:
-                        valid_templates.append(template_data)
-                        logger.info(f"Подготовлен шаблон '{t.name}' с {len(template_data['topics'])} топиками")
-                    else:
-                        logger.warning(f"Пропускаем шаблон '{t.name}' - все топики оказались невалидными")
-                
-                if valid_templates:
-                    data[str(user_id)] = valid_templates
-                    total_templates += len(valid_templates)
-            
-            if not data:
-                logger.error("Нет валидных данных для сохранения!")
-                return False
-                
-            # Создаем резервную копию текущего файла, если он существует
-            if os.path.exists(self.templates_file):
-                backup_file = f"{self.templates_file}.bak"
-                logger.info(f"Создаем резервную копию: {backup_file}")
-                try:
-                    shutil.copy2(self.templates_file, backup_file)
-                except Exception as e:
-                    logger.error(f"Ошибка при создании резервной копии: {e}")
-            
-            # Сохраняем данные
-            logger.info(f"Сохраняем {total_templates} шаблонов для {len(data)} пользователей")
-            
-            # Используем aiofiles для асинхронной записи
-            async with aiofiles.open(self.templates_file, 'w', encoding='utf-8') as f:
-                await f.write(json.dumps(data, ensure_ascii=False, indent=2))
-            
-            # Проверяем сохраненные данные
-            try:
-                async with aiofiles.open(self.templates_file, 'r', encoding='utf-8') as f:
-                    content = await f.read()
-                    saved_data = json.loads(content)
-                
-                saved_templates = sum(len(templates) for templates in saved_data.values())
-                if saved_templates == total_templates:
-                    logger.info("=== Шаблоны успешно сохранены ===")
-                    logger.info(f"Сохранено {saved_templates} шаблонов для {len(saved_data)} пользователей")
-                    
-                    # Удаляем резервную копию
-                    if os.path.exists(f"{self.templates_file}.bak"):
-                        os.remove(f"{self.templates_file}.bak")
-                    return True
-                else:
-                    raise ValueError(f"Количество сохраненных шаблонов не совпадает: {saved_templates} != {total_templates}")
-                    
-            except Exception as e:
-                logger.error(f"Ошибка при проверке сохраненных данных: {e}")
-                # Восстанавливаем из резервной копии
-                if os.path.exists(f"{self.templates_file}.bak"):
-                    logger.info("Восстанавливаем данные из резервной копии")
-                    os.replace(f"{self.templates_file}.bak", self.templates_file)
-                return False
-            
-        except Exception as e:
-            logger.error(f"Ошибка при сохранении шаблонов: {e}")
-            # Восстанавливаем из резервной копии
-            if os.path.exists(f"{self.templates_file}.bak"):
-                logger.info("Восстанавливаем данные из резервной копии")
-                os.replace(f"{self.templates_file}.bak", self.templates_file)
-            return False
+        if TEMPLATE_BACKEND == "sqlite":
+            self._store = DatabaseService()
+            logger.info("Шаблоны хранятся в SQLite")
+        else:
+            self._store = self._json_store
+            logger.info("Директория шаблонов: %s", self.templates_dir)
+        # Шаблоны пользователя читаются при первом обращении, в памяти — только активные
+        self._templates = TemplateCache(self._load_user_index)
+        # Изменения шаблонов записывает одна фоновая задача, пачками
+        self._writer = TemplateWriter(self._store)
+        metrics.gauge("template_cache_users", "Пользователи, чьи шаблоны в памяти",
+                      func=lambda: len(self._templates))
+        metrics.gauge("template_pending_writes", "Пользователи с ещё не записанными шаблонами",
+                      func=self._writer.pending_count)
+
+    async def _load_user_index(self, user_id: int) -> Dict[str, TemplateRecord]:
+        """Загружает шаблоны пользователя в индекс имя -> шаблон (в порядке создания)"""
+        index: Dict[str, TemplateRecord] = {}
+        # Ещё не записанное состояние новее файла (пользователь мог быть вытеснен из памяти)
+        templates = self._writer.pending(user_id)
+        if templates is None:
+            templates = await self._store.load_user(user_id)
+        for template in templates:
+            if template.name in index:
+                logger.warning("Дубликат шаблона '%s' у пользователя %s, оставлен первый", template.name, user_id)
+                continue
+            index[template.name] = template
+        return index
+
+    async def save_chat_template(self, user_id: int, template: ChatTemplate, old_name: str = None,
+                                 durable: bool = False) -> bool:
+        """
+        Сохраняет шаблон чата для пользователя
 
-    async def save_chat_template(self, user_id: int, template: ChatTemplate, old_name: str = None) -> bool:
-        """Сохраняет шаблон чата для пользователя"""
+        Изменение сразу видно в памяти, а на диск уходит отложенно (TemplateWriter).
+        С durable=True метод ждёт, пока запись дойдёт до хранилища.
+        """
         try:
             # Проверяем входные данные
             if not template.name or not template.chat_name or not template.topics:
-                logger.error(f"Invalid template data: {template}")
+                logger.error("Invalid template data: %s", template)
                 return False
 
-            # Инициализируем список шаблонов пользователя, если его нет
-            if user_id not in self._templates:
-                self._templates[user_id] = []
-            
-            templates = self._templates[user_id]
-            logger.info(f"Current templates for user {user_id}: {len(templates)}")
+            index = await self._templates.get(user_id)
+            logger.debug("Current templates for user %s: %d", user_id, len(index))
             
             # Если это обновление существующего шаблона
             if old_name:
-                logger.info(f"Updating template '{old_name}' to '{template.name}'")
-                # Находим индекс старого шаблона
-                old_template_idx = next((i for i, t in enumerate(templates) if t.name == old_name), -1)
-                if old_template_idx != -1:
-                    # Проверяем, не конфликтует ли новое имя с другими шаблонами
-                    if any(t.name == template.name and t.name != old_name for t in templates):
-                        logger.error(f"Template with name '{template.name}' already exists")
-                        return False
-                    # Обновляем шаблон
-                    template.created_at = templates[old_template_idx].created_at
-                    templates[old_template_idx] = template
-                    logger.info(f"Template '{old_name}' updated to '{template.name}'")
-                else:
-                    logger.error(f"Template '{old_name}' not found")
+                logger.info("Updating template '%s' to '%s'", old_name, template.name)
+                old = index.get(old_name)
+                if old is None:
+                    logger.error("Template '%s' not found", old_name)
+                    return False
+                # Имя уникально в пределах пользователя
+                if template.name != old_name and template.name in index:
+                    logger.error("Template with name '%s' already exists", template.name)
                     return False
+                record = record_from_template(template, created_at=old.created_at)
+                if template.name == old_name:
+                    index[old_name] = record
+                else:
+                    # Переименование: шаблон остаётся на своём месте в списке
+                    index = {
+                        (record.name if name == old_name else name): (record if name == old_name else t)
+                        for name, t in index.items()
+                    }
+                logger.info("Template '%s' updated to '%s'", old_name, template.name)
             else:
-                # Проверяем, нет ли шаблона с таким именем для нового шаблона
-                if any(t.name == template.name for t in templates):
-                    logger.error(f"Template with name '{template.name}' already exists")
+                if template.name in index:
+                    logger.error("Template with name '%s' already exists", template.name)
                     return False
                 # Добавляем новый шаблон
-                template.created_at = datetime.now()
-                templates.append(template)
-                logger.info(f"New template '{template.name}' added")
+                index[template.name] = record_from_template(template, created_at=datetime.now())
+                logger.info("New template '%s' added", template.name)
             
-            # Подготавливаем данные для сохранения
-            data = {}
-            for uid, user_templates in self._templates.items():
-                if user_templates:  # Сохраняем только непустые списки шаблонов
-                    templates_data = []
-                    for t in user_templates:
-                        template_dict = {
-                            'name': t.name,
-                            'chat_name': t.chat_name,
-                            'description': t.description or '',
-                            'topics': [
-                                {
-                                    'title': topic.title,
-                                    'description': topic.description or '',
-                                    'icon_emoji': getattr(topic, 'icon_emoji', None),
-                                    'icon_color': topic.icon_color if topic.icon_color is not None else 0,
-                                    'is_closed': topic.is_closed,
-                                    'is_hidden': topic.is_hidden
-                                }
-                                for topic in t.topics
-                                if topic.title
-                            ],
-                            'user_id': t.user_id,
-                            'created_at': t.created_at.isoformat() if t.created_at else None
-                        }
-                        templates_data.append(template_dict)
-                    data[str(uid)] = templates_data
-            
-            # Создаем директорию, если её нет
-            os.makedirs(os.path.dirname(self.templates_file), exist_ok=True)
-            
-            # Создаем временный файл рядом с основным
-            temp_file = f"{self.templates_file}.tmp"
-            backup_file = f"{self.templates_file}.bak"
-            
-            try:
-                # Сохраняем во временный файл
-                async with aiofiles.open(temp_file, 'w', encoding='utf-8') as f:
-                    await f.write(json.dumps(data, ensure_ascii=False, indent=2))
-                
-                # Создаем бэкап текущего файла, если он существует
-                if os.path.exists(self.templates_file):
-                    shutil.copy2(self.templates_file, backup_file)
-                
-                # Атомарно заменяем основной файл временным
-                os.replace(temp_file, self.templates_file)
-                
-                # Проверяем сохраненные данные
-                async with aiofiles.open(self.templates_file, 'r', encoding='utf-8') as f:
-                    content = await f.read()
-                    saved_data = json.loads(content)
-                
-                # Проверяем корректность сохранения
-                saved_templates = sum(len(templates) for templates in saved_data.values())
-                expected_templates = sum(len(templates) for templates in self._templates.values())
-                
-                if saved_templates == expected_templates:
-                    logger.info(f"Successfully saved {saved_templates} templates")
-                    # Удаляем бэкап файл после успешного сохранения
-                    if os.path.exists(backup_file):
-                        os.remove(backup_file)
-                    return True
-                else:
-                    raise ValueError(f"Template count mismatch: saved {saved_templates}, expected {expected_templates}")
-                    
-            except Exception as save_error:
-                logger.error(f"Error during save operation: {save_error}")
-                # Восстанавливаем из бэкапа при ошибке
-                if os.path.exists(backup_file):
-                    os.replace(backup_file, self.templates_file)
-                # Очищаем временные файлы
-                for file in [temp_file, backup_file]:
-                    if os.path.exists(file):
-                        os.remove(file)
-                raise
+            # Записываем только файл этого пользователя, отложенно
+            self._templates.put(user_id, index)
+            saved = self._writer.submit(user_id, list(index.values()))
+            if durable and not await saved:
+                return False
+            logger.info("Successfully saved %s templates for user %s", len(index), user_id)
+            return True
             
         except Exception as e:
-            logger.error(f"Error saving template: {e}")
+            logger.error("Error saving template: %s", e)
             return False
 
-    async def get_user_templates(self, user_id: int) -> List[ChatTemplate]:
+    async def get_user_templates(self, user_id: int) -> List[TemplateRecord]:
         """
-        Получает список шаблонов пользователя
+        Получает список шаблонов пользователя (только для чтения)
         
         Args:
             user_id: ID пользователя
             
         Returns:
-            List[ChatTemplate]: Список шаблонов пользователя
+            List[TemplateRecord]: Список шаблонов пользователя; поля те же, что у ChatTemplate
         """
-        logger.info(f"Получение шаблонов для пользователя {user_id}")
-        templates = self._templates.get(user_id, [])
-        logger.info(f"Найдено {len(templates)} шаблонов")
-        for template in templates:
-            logger.info(f"Шаблон: {template.name}, топиков: {len(template.topics)}")
+        templates = list((await self._templates.get(user_id)).values())
+        logger.debug("Шаблонов пользователя %s: %d", user_id, len(templates))
         return templates
 
-    async def delete_template(self, user_id: int, template_name: str, chat_name: str = None) -> bool:
+    async def get_user_template(self, user_id: int, template_name: str) -> Optional[ChatTemplate]:
+        """
+        Получает шаблон пользователя по названию
+
+        Returns:
+            Optional[ChatTemplate]: Шаблон или None
+        """
+        record = (await self._templates.get(user_id)).get(template_name)
+        return record_to_template(record) if record else None
+
+    async def delete_template(self, user_id: int, template_name: str, chat_name: str = None,
+                              durable: bool = False) -> bool:
         """
         Удаляет шаблон пользователя
         
@@ -500,81 +276,41 @@ class TelethonService:
             user_id: ID пользователя
             template_name: Название шаблона
             chat_name: Название чата (опционально)
+            durable: Дождаться записи изменения в хранилище
             
         Returns:
             bool: True если шаблон успешно удален
         """
         try:
-            logger.info(f"[+] Удаление шаблона '{template_name}' для пользователя {user_id}")
+            logger.info("[+] Удаление шаблона '%s' для пользователя %s", template_name, user_id)
             
-            if user_id not in self._templates:
-                logger.warning(f"[!] Нет шаблонов для пользователя {user_id}")
+            index = await self._templates.get(user_id)
+            if not index:
+                logger.warning("[!] Нет шаблонов для пользователя %s", user_id)
                 return False
                 
-            templates = self._templates[user_id]
-            initial_count = len(templates)
-            logger.info(f"[*] Текущее количество шаблонов: {initial_count}")
-            
-            # Удаляем все шаблоны с совпадающим именем или названием чата
-            self._templates[user_id] = [
-                t for t in templates 
-                if not (t.name == template_name or (chat_name and t.chat_name == chat_name))
-            ]
-            
-            # Если список шаблонов пользователя стал пустым, удаляем и его
-            if not self._templates[user_id]:
-                logger.info(f"[*] Удаляем пустой список шаблонов пользователя {user_id}")
-                del self._templates[user_id]
-            
-            # Сохраняем изменения
-            logger.info("[*] Сохраняем изменения в файл...")
-            
-            # Создаем директорию, если её нет
-            os.makedirs(os.path.dirname(self.templates_file), exist_ok=True)
-            
-            # Подготавливаем данные для сохранения
-            data = {}
-            for uid, user_templates in self._templates.items():
-                if user_templates:  # Сохраняем только непустые списки шаблонов
-                    data[str(uid)] = [
-                        {
-                            'name': t.name,
-                            'chat_name': t.chat_name,
-                            'description': t.description or '',
-                            'topics': [
-                                {
-                                    'title': topic.title,
-                                    'description': topic.description or '',
-                                    'icon_emoji': getattr(topic, 'icon_emoji', None),
-                                    'icon_color': topic.icon_color if topic.icon_color is not None else 0,
-                                    'is_closed': topic.is_closed,
-                                    'is_hidden': topic.is_hidden
-                                }
-                                for topic in t.topics
-                                if topic.title
-                            ],
-                            'user_id': t.user_id,
-                            'created_at': t.created_at.isoformat() if t.created_at else None
-                        }
-                        for t in user_templates
-                    ]
-            
-            # Сохраняем во временный файл
-            temp_file = f"{self.templates_file}.tmp"
-            with open(temp_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            initial_count = len(index)
+            if chat_name:
+                # Удаляем все шаблоны с совпадающим именем или названием чата
+                index = {
+                    name: t for name, t in index.items()
+                    if not (name == template_name or t.chat_name == chat_name)
+                }
+            elif index.pop(template_name, None) is None:
+                logger.warning("[!] Шаблон '%s' не найден", template_name)
+                return False
+            self._templates.put(user_id, index)
             
-            # Если данные корректны, заменяем основной файл
-            if os.path.exists(self.templates_file):
-                os.replace(self.templates_file, f"{self.templates_file}.bak")
-            os.replace(temp_file, self.templates_file)
+            # Сохраняем изменения отложенно (пустой список удаляет файл пользователя)
+            saved = self._writer.submit(user_id, list(index.values()))
+            if durable and not await saved:
+                return False
             
-            final_count = len(self._templates.get(user_id, []))
-            logger.info(f"[+] Шаблоны обновлены. Было: {initial_count}, стало: {final_count}")
+            logger.info("[+] Шаблоны обновлены. Было: %s, стало: %s", initial_count, len(index))
             return True
             
         except Exception as e:
-            logger.error(f"[x] Ошибка при удалении шаблона: {e}")
+            logger.error("[x] Ошибка при удалении шаблона: %s", e)
             logger.exception(e)
             return False
 
@@ -587,7 +323,7 @@ class TelethonService:
         """
         try:
             # Создаем канал (форум-чат)
-            result = await self.client(CreateChannelRequest(
+            result = await self._mtproto(CreateChannelRequest(
                 title=chat_name,
                 about="Forum chat created by bot",
                 megagroup=True  # Это создаст супергруппу
@@ -599,41 +335,154 @@ class TelethonService:
             # К сожалению, прямого метода для создания топиков через Telethon нет
             # Нужно использовать Bot API или другие методы
             
-            logger.info(f"Successfully created forum chat: {chat_name} with ID: {channel_id}")
+            logger.info("Successfully created forum chat: %s with ID: %s", chat_name, channel_id)
             return channel_id
             
         except Exception as e:
-            logger.error(f"Error creating forum chat: {str(e)}")
+            logger.error("Error creating forum chat: %s", str(e))
+            return None
+
+    async def _call(self, func, method: str, chat_id: Optional[int] = None):
+        """Вызов Telethon через общий планировщик; учитывается в счётчике текущей настройки чата"""
+        setup = _current_setup.get()
+
+        async def counted():
+            if setup is not None:
+                setup.mtproto_calls += 1
+            return await func()
+
+        return await telegram_scheduler.call(counted, method, chat_id=chat_id, account=ACCOUNT_USER)
+
+    async def _mtproto(self, request, chat_id: Optional[int] = None):
+        """Выполняет MTProto-запрос через общий планировщик вызовов Telegram"""
+        return await self._call(lambda: self.client(request), type(request).__name__, chat_id=chat_id)
+
+    def _start_setup(self, chat_id: int, user_id: Optional[int]) -> ChatSetup:
+        setup = ChatSetup(chat_id=chat_id, user_id=user_id)
+        self._setups[chat_id] = setup
+        while len(self._setups) > 1000:
+            self._setups.popitem(last=False)
+        return setup
+
+    async def _get_entity(self, peer):
+        """get_entity с кэшем; при промахе запрос идёт через планировщик"""
+        entity = self._entities.get(peer)
+        if entity is None:
+            entity = await self._call(lambda: self.client.get_entity(peer), "get_entity")
+            self._entities.set(entity, peer)
+        return entity
+
+    async def _get_channel(self, chat_id: int):
+        """Сущность супергруппы по channel.id или по ID Bot API (-100…)"""
+        # Голый положительный id get_entity и кэш считают пользователем
+        return await self._get_entity(PeerChannel(chat_id) if chat_id > 0 else chat_id)
+
+    def _remember_participant(self, chat_id: int, user_id: int, member: bool):
+        ttl = PARTICIPANT_CACHE_TTL if member else PARTICIPANT_NEGATIVE_TTL
+        self._participants[(chat_id, user_id)] = (time.monotonic() + ttl, member)
+
+    async def is_participant(self, chat_id: int, user_id: int) -> bool:
+        """
+        Проверяет, состоит ли пользователь в чате, одним запросом GetParticipant
+        (без загрузки списка участников). Ответ кэшируется, отрицательный — ненадолго.
+
+        Raises:
+            Ошибки Telegram, кроме USER_NOT_PARTICIPANT
+        """
+        now = time.monotonic()
+        cached = self._participants.get((chat_id, user_id))
+        if cached and now < cached[0]:
+            return cached[1]
+        # Заодно чистим устаревшие записи
+        self._participants = {k: v for k, v in self._participants.items() if now < v[0]}
+        channel = await self._get_channel(chat_id)
+        user = await self._get_entity(user_id)
+        try:
+            result = await self._mtproto(GetParticipantRequest(channel=channel, participant=user), chat_id=chat_id)
+            for entity in result.users:
+                self._entities.set(entity)
+            member = True
+        except UserNotParticipantError:
+            member = False
+        self._remember_participant(chat_id, user_id, member)
+        return member
+
+    async def _find_recent_participant(self, chat, chat_id: int, user_id: int):
+        """Ищет пользователя среди недавних участников (одна страница, не весь чат)"""
+        async def scan():
+            async for participant in self.client.iter_participants(chat, limit=PARTICIPANT_SCAN_LIMIT):
+                if participant.id == user_id:
+                    return participant
             return None
 
+        user = await self._call(scan, "get_participants", chat_id=chat_id)
+        if user is not None:
+            self._entities.set(user)
+            self._remember_participant(chat_id, user_id, True)
+        return user
+
+    @property
+    def bot(self) -> Bot:
+        """Общий экземпляр Bot: один пул соединений на все вызовы Bot API"""
+        if self._bot is None:
+            # Бот не передан — создаём один раз и закрываем сами в disconnect()
+            self._bot = attach_scheduler(Bot(token=os.getenv("BOT_TOKEN")))
+            self._owns_bot = True
+        return self._bot
+
     def close(self):
         """Закрывает клиент Telethon"""
         self.client.disconnect()
 
-    async def create_forum(self, chat_data: ChatCreate, user_id: int = None, notify_func=None) -> Optional[dict]:
-        """Создание форум-чата с топиками и повторными попытками установки иконок"""
+    async def create_forum(self, chat_data: ChatCreate, user_id: int = None, notify_func=None, progress_func=None,
+                           stage_func=None) -> Optional[dict]:
+        """
+        Создание форум-чата с топиками и повторными попытками установки иконок
+
+        progress_func(готово, всего, название, успешно) вызывается после каждого топика,
+        stage_func(описание) — в начале каждого этапа
+        """
+        stages = StageTimer(FORUM_STAGE_SECONDS)
+        started = time.perf_counter()
+        outcome = "error"
+
+        async def stage(text: str, name: str):
+            stages.start(name)
+            if stage_func:
+                await stage_func(text)
+
+        # Вызовы до появления chat_id тоже считаем
+        setup = ChatSetup(chat_id=0, user_id=user_id)
+        token = _current_setup.set(setup)
         try:
             # Создаем чат через Telethon (userbot — владелец)
-            result = await self.client(CreateChannelRequest(
+            await stage("Создаю чат", "create_channel")
+            result = await self._mtproto(CreateChannelRequest(
                 title=chat_data.title,
                 about=chat_data.description,
                 megagroup=True,
                 forum=True
             ))
             channel = result.chats[0]
+            self._entities.set(channel)
+            calls = setup.mtproto_calls
+            setup = self._start_setup(channel.id, user_id)
+            setup.mtproto_calls = calls
+            _current_setup.set(setup)
 
             # Добавляем бота в канал через InviteToChannelRequest
+            await stage("Добавляю бота", "add_bot")
             bot_username = os.getenv("BOT_USERNAME")
             if bot_username:
                 try:
-                    await self.client(InviteToChannelRequest(channel=channel.id, users=[bot_username]))
+                    await self._mtproto(InviteToChannelRequest(channel=channel.id, users=[bot_username]), chat_id=channel.id)
                 except Exception as e:
-                    logger.warning(f"Не удалось добавить бота в канал через InviteToChannelRequest: {e}")
+                    logger.warning("Не удалось добавить бота в канал через InviteToChannelRequest: %s", e)
             else:
                 logger.warning("Не указан BOT_USERNAME в .env, InviteToChannelRequest пропущен")
 
             # Назначаем бота админом
-            bot_entity = await self.client.get_entity(bot_username)
+            bot_entity = await self._get_entity(bot_username)
             admin_rights = ChatAdminRights(
                 add_admins=True,
                 change_info=True,
@@ -647,59 +496,64 @@ class TelethonService:
                 manage_topics=True,
                 anonymous=False
             )
-            await self.client(EditAdminRequest(
+            await self._mtproto(EditAdminRequest(
                 channel=channel.id,
                 user_id=bot_entity.id,
                 admin_rights=admin_rights,
                 rank="admin"
-            ))
+            ), chat_id=channel.id)
 
             # Получаем инвайт-ссылку через Telethon сразу после создания чата
             invite_link = None
             user_added = False
             try:
                 from telethon.tl.functions.messages import ExportChatInviteRequest
-                invite = await self.client(ExportChatInviteRequest(channel.id))
+                invite = await self._mtproto(ExportChatInviteRequest(channel.id), chat_id=channel.id)
                 invite_link = invite.link
-                logger.info(f"[INVITE] Ссылка на чат: {invite_link}")
+                logger.info("[INVITE] Ссылка на чат: %s", invite_link)
             except Exception as e:
-                logger.warning(f"[INVITE] Не удалось получить инвайт-ссылку: {e}")
+                logger.warning("[INVITE] Не удалось получить инвайт-ссылку: %s", e)
 
             # Добавляем пользователя в группу через Telethon сразу после создания чата
             if user_id:
+                await stage("Добавляю вас в чат", "add_user")
                 user_added = False
                 add_error = None
                 try:
-                    user_entity = await self.client.get_entity(user_id)
-                    await self.client(InviteToChannelRequest(channel=channel.id, users=[user_entity]))
+                    user_entity = await self._get_entity(user_id)
+                    await self._mtproto(InviteToChannelRequest(channel=channel.id, users=[user_entity]), chat_id=channel.id)
+                    self._remember_participant(channel.id, user_id, True)
+                    setup.user_invited = True
                     user_added = True
-                    logger.info(f"[ADD USER] Пользователь {user_id} добавлен в группу по user_id")
+                    logger.info("[ADD USER] Пользователь %s добавлен в группу по user_id", user_id)
                     # Делаем пользователя админом
                     admin_result = await self.make_chat_admin(channel.id, user_id)
                     if admin_result:
-                        logger.info(f"[ADMIN] Пользователь {user_id} назначен администратором группы")
+                        logger.info("[ADMIN] Пользователь %s назначен администратором группы", user_id)
                     else:
-                        logger.warning(f"[ADMIN] Не удалось назначить пользователя {user_id} администратором группы")
+                        logger.warning("[ADMIN] Не удалось назначить пользователя %s администратором группы", user_id)
                     if notify_func:
                         await notify_func(f"👤 Вы были добавлены в группу автоматически!")
                 except Exception as e:
                     add_error = str(e)
-                    logger.warning(f"[ADD USER] Не удалось добавить пользователя {user_id} по user_id: {e}")
+                    logger.warning("[ADD USER] Не удалось добавить пользователя %s по user_id: %s", user_id, e)
                     # Пробуем по username, если есть
                     try:
                         from telethon.tl.types import User
                         if isinstance(user_entity, User) and user_entity.username:
                             username = user_entity.username
-                            await self.client(InviteToChannelRequest(channel=channel.id, users=[username]))
+                            await self._mtproto(InviteToChannelRequest(channel=channel.id, users=[username]), chat_id=channel.id)
+                            self._remember_participant(channel.id, user_id, True)
+                            setup.user_invited = True
                             user_added = True
-                            logger.info(f"[ADD USER] Пользователь {username} добавлен в группу по username")
+                            logger.info("[ADD USER] Пользователь %s добавлен в группу по username", username)
                             if notify_func:
                                 await notify_func(f"👤 Вы были добавлены в группу автоматически!")
                         else:
-                            logger.warning(f"[ADD USER] У пользователя нет username для повторной попытки")
+                            logger.warning("[ADD USER] У пользователя нет username для повторной попытки")
                     except Exception as e2:
                         add_error += f" | Повторная попытка по username: {e2}"
-                        logger.warning(f"[ADD USER] Не удалось добавить пользователя по username: {e2}")
+                        logger.warning("[ADD USER] Не удалось добавить пользователя по username: %s", e2)
                 if not user_added and notify_func and invite_link:
                     await notify_func(f"❗ Не удалось добавить вас в группу автоматически. Вот ссылка для вступления: {invite_link}\nПричина: {add_error if add_error else 'Неизвестная ошибка'}\nПроверьте настройки приватности Telegram: разрешите приглашения в группы.")
             # Если пользователь не был добавлен, но есть инвайт-ссылка — отправить её (только один раз)
@@ -707,104 +561,69 @@ class TelethonService:
                 await notify_func(f"🔗 Ссылка для вступления в группу: {invite_link}")
 
             # --- Создаём топики через Bot API ---
-            bot_instance = Bot(token=os.getenv("BOT_TOKEN"))
-            with open("working_topic_emojis.json", "r", encoding="utf-8") as f:
-                emoji_map = json.load(f)
-            created_topics = []
+            await stage("Создаю топики", "topics")
+            emoji_map = emoji_registry.get_map()
             botapi_chat_id = channel.id
             if botapi_chat_id > 0:
                 botapi_chat_id = int(f'-100{botapi_chat_id}')
             
-            # Функция для создания топика с повторными попытками
-            async def create_topic_with_retry(topic, max_retries=3):
-                for attempt in range(max_retries):
-                    try:
-                        emoji_id = emoji_map.get(topic.icon_emoji)
-                        if emoji_id:
-                            topic_obj = await bot_instance.create_forum_topic(
-                                chat_id=botapi_chat_id,
-                                name=topic.title,
-                                icon_custom_emoji_id=emoji_id
-                            )
-                            logger.info(f"[TOPIC] Топик '{topic.title}' создан с иконкой {topic.icon_emoji}")
-                        else:
-                            topic_obj = await bot_instance.create_forum_topic(
-                                chat_id=botapi_chat_id,
-                                name=topic.title
-                            )
-                            logger.info(f"[TOPIC] Топик '{topic.title}' создан без иконки")
-                        
-                        # Сразу отправляем описание первым сообщением в топик
-                        desc = topic.description if topic.description else "."
-                        try:
-                            await bot_instance.send_message(
-                                chat_id=botapi_chat_id,
-                                message_thread_id=topic_obj.message_thread_id,
-                                text=desc
-                            )
-                        except Exception as e:
-                            logger.warning(f"[TOPIC DESC] Не удалось отправить описание для топика '{topic.title}': {e}")
-                        
-                        return {
-                            "title": topic.title,
-                            "thread_id": getattr(topic_obj, 'message_thread_id', None),
-                            "icon_emoji": topic.icon_emoji
-                        }
-                    except Exception as e:
-                        if attempt < max_retries - 1:
-                            logger.warning(f"[TOPIC] Попытка {attempt + 1} создания топика '{topic.title}' не удалась: {e}")
-                            await asyncio.sleep(2)  # Ждем 2 секунды перед следующей попыткой
-                        else:
-                            logger.error(f"[TOPIC] Все попытки создания топика '{topic.title}' не удались: {e}")
-                            return None
-
-            # Создаем топики с повторными попытками
-            for topic in chat_data.topics:
-                topic_result = await create_topic_with_retry(topic)
-                if topic_result:
-                    created_topics.append(topic_result)
-                await asyncio.sleep(1)  # Пауза между созданием топиков
+            pipeline = TopicCreationPipeline(self.bot, concurrency=TOPIC_CREATE_CONCURRENCY)
+            results = await pipeline.run(botapi_chat_id, chat_data.topics, emoji_map, progress_func)
+            created_topics = [r for r in results if r]
+            logger.info("[TOPIC] Создано %s из %s топиков", len(created_topics), len(chat_data.topics))
 
             # --- После создания топиков ---
-            # Проверяем, есть ли пользователь в участниках чата
-            user_in_chat = False
-            if user_id:
+            # Если пользователя не удалось пригласить, проверяем, не вступил ли он сам по ссылке
+            user_in_chat = setup.user_invited
+            if user_id and not user_in_chat:
+                await stage("Проверяю участников", "check_user")
                 try:
-                    participants = await self.client.get_participants(channel.id)
-                    user_in_chat = any(p.id == user_id for p in participants)
-                    logger.info(f"[CHECK USER] Пользователь {user_id} {'есть' if user_in_chat else 'нет'} в участниках чата после создания")
+                    user_in_chat = await self.is_participant(channel.id, user_id)
+                    logger.info("[CHECK USER] Пользователь %s %s в участниках чата после создания", user_id, 'есть' if user_in_chat else 'нет')
                 except Exception as e:
-                    logger.warning(f"[CHECK USER] Не удалось получить участников чата: {e}")
+                    logger.warning("[CHECK USER] Не удалось проверить участие пользователя: %s", e)
             # Если пользователь в чате — делаем админом (если ещё не сделали)
-            if user_in_chat:
+            if user_in_chat and not setup.user_admin:
                 admin_result = await self.make_chat_admin(channel.id, user_id)
                 if admin_result:
-                    logger.info(f"[ADMIN] Пользователь {user_id} назначен админом после проверки участников")
+                    logger.info("[ADMIN] Пользователь %s назначен админом после проверки участников", user_id)
                 else:
-                    logger.warning(f"[ADMIN] Не удалось назначить пользователя {user_id} админом после проверки участников")
+                    logger.warning("[ADMIN] Не удалось назначить пользователя %s админом после проверки участников", user_id)
+            logger.info("[SETUP] Чат %s настроен, MTProto-вызовов: %s", channel.id, setup.mtproto_calls)
+            outcome = "ok"
+            if user_in_chat:
                 # Возвращаем результат без invite_link
                 return {
                     "chat_id": channel.id,
                     "chat_name": chat_data.title,
                     "description": chat_data.description,
+                    "topics_created": len(created_topics),
+                    "mtproto_calls": setup.mtproto_calls,
                     "user_added": True
                 }
             else:
                 # Если пользователя нет — отправляем invite_link
-                logger.info(f"[INVITE] Пользователь {user_id} не был добавлен, отправляю invite_link")
+                logger.info("[INVITE] Пользователь %s не был добавлен, отправляю invite_link", user_id)
                 return {
                     "chat_id": channel.id,
                     "chat_name": chat_data.title,
                     "description": chat_data.description,
                     "invite_link": invite_link,
+                    "topics_created": len(created_topics),
+                    "mtproto_calls": setup.mtproto_calls,
                     "user_added": False
                 }
 
         except Exception as e:
-            logger.error(f"Ошибка при создании форум-чата: {e}")
+            logger.error("Ошибка при создании форум-чата: %s", e)
             if notify_func:
                 await notify_func(f"❌ Ошибка при создании чата: {e}")
             return None
+        finally:
+            _current_setup.reset(token)
+            stages.stop()
+            FORUM_SECONDS.observe(time.perf_counter() - started)
+            FORUMS_CREATED.inc(result=outcome)
     
     async def add_user_to_chat(self, chat_id: int, user_id: int) -> bool:
         """
@@ -819,34 +638,44 @@ class TelethonService:
         """
         try:
             # Получаем информацию о пользователе
-            user = await self.client.get_entity(user_id)
+            user = await self._get_entity(user_id)
             
             # Добавляем пользователя
-            await self.client.add_chat_user(chat_id, user)
+            await self._call(lambda: self.client.add_chat_user(chat_id, user), "add_chat_user", chat_id=chat_id)
             return True
             
         except Exception as e:
-            logger.error(f"Error adding user to chat: {e}")
+            logger.error("Error adding user to chat: %s", e)
             return False
     
     async def disconnect(self):
         """Отключение клиента"""
-        await self.client.disconnect()
-        logger.info("Telethon client disconnected")
+        if self.client is not None:
+            await self.client.disconnect()
+            logger.info("Telethon client disconnected")
+        # Дописываем отложенные изменения шаблонов до закрытия хранилища
+        await self._writer.stop()
+        if isinstance(self._store, DatabaseService):
+            await self._store.close()
+        if self._owns_bot and self._bot is not None:
+            await self._bot.session.close()
+            self._bot = None
+            self._owns_bot = False
 
     async def ensure_client(self) -> bool:
         """Проверяет и устанавливает подключение клиента"""
+        if self._ready and self.client is not None and self.client.is_connected():
+            return True
         try:
             if self.client is None:
                 logger.info("[+] Создаем новый клиент Telegram...")
-                self.client = TelegramClient(self.session_name, self.api_id, self.api_hash)
+                # FloodWait не проглатывается внутри Telethon, а доходит до планировщика
+                self.client = TelegramClient(self.session_name, self.api_id, self.api_hash, flood_sleep_threshold=0)
             
             if not self.client.is_connected():
                 logger.info("[+] Подключаемся к Telegram...")
-                await self.client.connect()
-                
-            # Ждем немного для установки соединения
-            await asyncio.sleep(1)
+                with startup_timer.phase("Telethon: подключение"):
+                    await self.client.connect()
             
             if not self.client.is_connected():
                 logger.error("[x] Не удалось установить соединение")
@@ -865,10 +694,8 @@ class TelethonService:
                             logger.error("[x] Не указан номер телефона в .env файле")
                             return False
                             
-                        logger.info(f"[+] Отправляем код на номер {phone}")
+                        logger.info("[+] Отправляем код на номер %s", phone)
                         await self.client.start(phone=phone)
-                        
-                    await asyncio.sleep(1)  # Ждем завершения авторизации
                     
                     if not await self.client.is_user_authorized():
                         logger.error("[x] Не удалось авторизоваться")
@@ -876,142 +703,94 @@ class TelethonService:
                         
                     logger.info("[+] Авторизация успешно завершена")
                 except Exception as e:
-                    logger.error(f"[x] Ошибка при авторизации: {str(e)}")
-                    logger.debug(f"Детали ошибки:", exc_info=True)
+                    logger.error("[x] Ошибка при авторизации: %s", str(e))
+                    logger.debug("Детали ошибки:", exc_info=True)
                     return False
             
             # Проверяем, что все в порядке
-            me = await self.client.get_me()
+            with startup_timer.phase("Telethon: get_me"):
+                me = await self._call(self.client.get_me, "get_me")
             if not me:
                 logger.error("[x] Не удалось получить информацию о пользователе")
                 return False
             
-            logger.info(f"[+] Клиент Telethon готов к работе (ID: {me.id}, {'бот' if me.bot else 'пользователь'})")
+            logger.info("[+] Клиент Telethon готов к работе (ID: %s, %s)", me.id, 'бот' if me.bot else 'пользователь')
+            self._entities.set(me)
+            with startup_timer.phase("Telethon: сущность бота"):
+                await self._warm_entities()
             
-            # Принудительно загружаем шаблоны
-            await self._load_templates_async()
+            with startup_timer.phase("Подготовка хранилища шаблонов"):
+                await self._prepare_template_store()
             
+            self._ready = True
             return True
             
         except Exception as e:
-            logger.error(f"[x] Ошибка при проверке клиента: {str(e)}")
+            logger.error("[x] Ошибка при проверке клиента: %s", str(e))
             logger.debug("Детали ошибки:", exc_info=True)
             return False
 
-    async def _load_templates_async(self):
-        """Асинхронно загружает шаблоны из файла"""
+    async def _warm_entities(self):
+        """Заранее разрешает сущность бота, которая нужна при каждом создании чата"""
+        bot_username = os.getenv("BOT_USERNAME")
+        if not bot_username:
+            return
         try:
-            logger.info("[+] Начало загрузки шаблонов")
-            self._templates = {}  # Очищаем словарь перед загрузкой
-            
-            # Проверяем существование файла и директории
-            if not os.path.exists(os.path.dirname(self.templates_file)):
-                logger.info(f"[+] Создаем директорию для шаблонов: {os.path.dirname(self.templates_file)}")
-                os.makedirs(os.path.dirname(self.templates_file), exist_ok=True)
-            
-            if not os.path.exists(self.templates_file):
-                logger.info(f"[!] Файл шаблонов {self.templates_file} не существует, создаем новый")
-                async with aiofiles.open(self.templates_file, 'w', encoding='utf-8') as f:
-                    await f.write('{}')
-                return
-            
-            # Читаем файл
-            try:
-                async with aiofiles.open(self.templates_file, 'r', encoding='utf-8') as f:
-                    content = await f.read()
-                    
-                if not content.strip():
-                    logger.warning("[!] Файл шаблонов пуст")
-                    return
-                
-                data = json.loads(content)
-                
-                if not isinstance(data, dict):
-                    logger.error(f"[x] Некорректный формат файла шаблонов: {type(data)}")
-                    return
-                
-                # Загружаем шаблоны
-                for user_id_str, templates in data.items():
-                    try:
-                        user_id = int(user_id_str)
-                        self._templates[user_id] = []
-                        
-                        for t in templates:
-                            try:
-                                # Преобразуем строку даты в объект datetime
-                                created_at = None
-                                if 'created_at' in t and t['created_at']:
-                                    try:
-                                        created_at = datetime.fromisoformat(t['created_at'])
-                                    except ValueError as e:
-                                        logger.warning(f"[!] Не удалось преобразовать дату создания: {e}")
-                                
-                                topics = []
-                                for tt in t.get('topics', []):
-                                    topic = Topic(
-                                        title=tt['title'],
-                                        description=tt.get('description', ''),
-                                        icon_emoji=tt.get('icon_emoji'),
-                                        icon_color=tt.get('icon_color', 0),
-                                        is_closed=tt.get('is_closed', False),
-                                        is_hidden=tt.get('is_hidden', False)
-                                    )
-                                    if topic.title:
-                                        topics.append(topic)
-                                if topics:
-                                    self._templates[user_id].append(ChatTemplate(
-                                        name=t['name'],
-                                        chat_name=t['chat_name'],
-                                        description=t.get('description', ''),
-                                        topics=topics,
-                                        user_id=user_id,
-                                        created_at=created_at
-                                    ))
-                                    logger.info(f"[+] Загружен шаблон '{t['name']}' с {len(topics)} топиками")
-                                else:
-                                    logger.warning(f"[!] Пропущен шаблон '{t['name']}' без топиков")
-                                    
-                            except Exception as template_error:
-                                logger.error(f"[x] Ошибка при загрузке шаблона: {template_error}")
-                                continue
-                                
-                    except Exception as user_error:
-                        logger.error(f"[x] Ошибка при загрузке шаблонов пользователя {user_id_str}: {user_error}")
-                        continue
-                
-                # Выводим статистику
-                total_templates = sum(len(templates) for templates in self._templates.values())
-                logger.info(f"[+] Загрузка завершена. Всего загружено {total_templates} шаблонов для {len(self._templates)} пользователей")
-                
-            except json.JSONDecodeError as e:
-                logger.error(f"[x] Ошибка при разборе JSON: {e}")
-                logger.error(f"[x] Содержимое файла: {content[:200]}...")
-                return
-                
+            await self._get_entity(bot_username)
+        except Exception as e:
+            logger.warning("[ENTITY] Не удалось разрешить бота %s: %s", bot_username, e)
+
+    def entity_cache_stats(self) -> Dict[str, int]:
+        """Размер кэша сущностей и число попаданий/промахов"""
+        return self._entities.stats()
+
+    async def _prepare_template_store(self):
+        """Готовит хранилище шаблонов (схема, миграции) один раз; сами шаблоны читаются лениво"""
+        if self._store_ready:
+            return
+        try:
+            if isinstance(self._store, DatabaseService):
+                await self._store.init_db()
+                await self._store.migrate_from_json(self._json_store)
+            else:
+                await self._json_store.prepare()
+            self._store_ready = True
         except Exception as e:
-            logger.error(f"[x] Ошибка при загрузке шаблонов: {e}")
+            logger.error("[x] Ошибка при подготовке хранилища шаблонов: %s", e)
             logger.exception(e)
-            self._templates = {} 
+
+    def template_cache_stats(self) -> Dict[str, int]:
+        """Пользователи в памяти, попадания, промахи и вытеснения кэша шаблонов"""
+        return self._templates.stats()
+
+    async def flush_templates(self) -> bool:
+        """Немедленно записывает все отложенные изменения шаблонов"""
+        return await self._writer.flush()
+
+    def template_writer_stats(self) -> Dict[str, int]:
+        """Ожидающие записи, пачки, записи файлов и объединённые правки"""
+        return self._writer.stats()
 
     async def make_chat_admin(self, chat_id: int, user_id: int) -> bool:
         """Make user an admin in the chat"""
+        setup = self._setups.get(chat_id)
+        if setup and setup.user_id == user_id and setup.user_admin:
+            # Уже назначен при создании чата — повторный EditAdminRequest не нужен
+            return True
         try:
-            chat = await self.client.get_entity(chat_id)
+            chat = await self._get_channel(chat_id)
             # Пробуем получить пользователя через get_entity
             try:
-                user = await self.client.get_entity(user_id)
+                user = await self._get_entity(user_id)
             except ValueError:
-                # Если не получилось, пробуем через resolve_username (если есть username)
+                # Сессия ещё не видела пользователя: ищем его среди недавно вступивших
                 try:
-                    # Получаем участников чата
-                    participants = await self.client.get_participants(chat)
-                    # Ищем пользователя среди участников
-                    user = next((p for p in participants if p.id == user_id), None)
+                    user = await self._find_recent_participant(chat, chat_id, user_id)
                     if not user:
-                        logger.error(f"User {user_id} not found in chat participants")
+                        logger.error("User %s not found in chat participants", user_id)
                         return False
                 except Exception as e:
-                    logger.error(f"Error getting user from participants: {e}")
+                    logger.error("Error getting user from participants: %s", e)
                     return False
 
             admin_rights = ChatAdminRights(
@@ -1027,15 +806,17 @@ class TelethonService:
                 manage_topics=True,
                 anonymous=False
             )
-            await self.client(EditAdminRequest(
+            await self._mtproto(EditAdminRequest(
                 chat,
                 user,
                 admin_rights,
                 "Admin"
-            ))
+            ), chat_id=chat_id)
+            if setup and setup.user_id == user_id:
+                setup.user_admin = True
             return True
         except Exception as e:
-            logger.error(f"Error making user admin: {str(e)}", exc_info=True)
+            logger.error("Error making user admin: %s", str(e), exc_info=True)
             return False
 
     async def transfer_chat_ownership(self, chat_id: int, user_id: int) -> bool:
@@ -1050,31 +831,31 @@ class TelethonService:
             bool: Успешно ли переданы права
         """
         try:
-            logger.info(f"Transferring chat {chat_id} ownership to user {user_id}")
+            logger.info("Transferring chat %s ownership to user %s", chat_id, user_id)
             
             # Получаем сущность чата
-            channel = await self.client.get_entity(chat_id)
+            channel = await self._get_channel(chat_id)
             if not channel:
-                logger.error(f"Channel {chat_id} not found")
+                logger.error("Channel %s not found", chat_id)
                 return False
             
             # Получаем сущность пользователя
-            user = await self.client.get_entity(user_id)
+            user = await self._get_entity(user_id)
             if not user:
-                logger.error(f"User {user_id} not found")
+                logger.error("User %s not found", user_id)
                 return False
             
             # Передаем права владельца
-            await self.client(EditCreatorRequest(
+            await self._mtproto(EditCreatorRequest(
                 channel=channel,
                 user_id=user
-            ))
+            ), chat_id=chat_id)
             
-            logger.info(f"Successfully transferred chat {chat_id} ownership to user {user_id}")
+            logger.info("Successfully transferred chat %s ownership to user %s", chat_id, user_id)
             return True
             
         except Exception as e:
-            logger.error(f"Error transferring chat ownership: {e}", exc_info=True)
+            logger.error("Error transferring chat ownership: %s", e, exc_info=True)
             return False 
 
     async def get_forum_topic_icons(self):
@@ -1086,13 +867,13 @@ class TelethonService:
         await self.ensure_client()
         try:
             from telethon.tl.functions.channels import EditForumTopicRequest
-            await self.client(EditForumTopicRequest(
+            await self._mtproto(EditForumTopicRequest(
                 channel=chat_id,
                 topic_id=topic_id,
                 icon_emoji_id=icon_emoji_id
-            ))
+            ), chat_id=chat_id)
             return True
         except Exception as e:
             import logging
-            logging.getLogger(__name__).error(f"Ошибка смены иконки топика (EditForumTopicRequest): {e}")
+            logging.getLogger(__name__).error("Ошибка смены иконки топика (EditForumTopicRequest): %s", e)
             return False 
\ No newline at end of file
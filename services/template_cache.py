@@ -0,0 +1,79 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict
+
+from config import TEMPLATE_CACHE_USERS
+from models.records import TemplateRecord
+
+logger = logging.getLogger(__name__)
+
+
+class TemplateCache:
+    """
+    Шаблоны пользователей в памяти с ленивой загрузкой и LRU-вытеснением.
+
+    Шаблоны пользователя читаются из хранилища при первом обращении и держатся
+    в памяти, пока он активен, в виде индекса имя -> шаблон. При превышении maxsize вытесняется пользователь,
+    который дольше всех не обращался к шаблонам, — его данные остаются в хранилище.
+    """
+
+    def __init__(self, loader: Callable[[int], Awaitable[Dict[str, TemplateRecord]]],
+                 maxsize: int = TEMPLATE_CACHE_USERS):
+        self.loader = loader
+        self.maxsize = maxsize
+        self._data: "OrderedDict[int, Dict[str, TemplateRecord]]" = OrderedDict()
+        # Параллельные запросы одного пользователя ждут одну загрузку
+        self._loading: Dict[int, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def get(self, user_id: int) -> Dict[str, TemplateRecord]:
+        """Индекс шаблонов пользователя (из памяти или из хранилища)"""
+        templates = self._data.get(user_id)
+        if templates is not None:
+            self.hits += 1
+            self._data.move_to_end(user_id)
+            return templates
+        pending = self._loading.get(user_id)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._loading[user_id] = future
+        try:
+            templates = await self.loader(user_id)
+        except Exception as e:
+            future.set_exception(e)
+            # Исключение уже передаётся вызывающему; ждущим — через future
+            future.exception()
+            raise
+        finally:
+            self._loading.pop(user_id, None)
+        # Запись, сделанная во время загрузки, новее прочитанного
+        if user_id not in self._data:
+            self.put(user_id, templates)
+        future.set_result(self._data[user_id])
+        return self._data[user_id]
+
+    def put(self, user_id: int, templates: Dict[str, TemplateRecord]):
+        """Кладёт актуальные шаблоны пользователя (после записи в хранилище)"""
+        self._data[user_id] = templates
+        self._data.move_to_end(user_id)
+        while len(self._data) > self.maxsize:
+            evicted, _ = self._data.popitem(last=False)
+            self.evictions += 1
+            logger.debug("[TEMPLATES] Шаблоны пользователя %s вытеснены из памяти", evicted)
+
+    def __len__(self) -> int:
+        """Сколько пользователей сейчас в памяти"""
+        return len(self._data)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "users": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
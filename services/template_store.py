@@ -0,0 +1,346 @@
+import asyncio
+import logging
+import os
+import zlib
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from config import TEMPLATE_VERIFY_PARANOID
+from models.records import TemplateRecord, TopicRecord
+from services.json_codec import json_codec
+
+logger = logging.getLogger(__name__)
+
+# Последняя строка файла шаблонов: длина и CRC32 JSON-части, посчитанные при записи
+FOOTER_PREFIX = b"\n#templates "
+
+
+class TemplateFileCorrupted(ValueError):
+    """Файл шаблонов не прошёл проверку; он не перезаписывается, пока не будет прочитан без ошибок"""
+
+
+def make_footer(body: bytes) -> bytes:
+    return FOOTER_PREFIX + f"len={len(body)} crc32={zlib.crc32(body):08x}\n".encode()
+
+
+def split_footer(raw: bytes):
+    """
+    Отделяет футер от JSON-части файла
+
+    Returns:
+        tuple: (JSON-часть, True/False — совпала ли контрольная сумма, None — футера нет)
+    """
+    pos = raw.rfind(FOOTER_PREFIX)
+    if pos < 0:
+        return raw, None
+    body = raw[:pos]
+    try:
+        fields = dict(item.split("=", 1) for item in raw[pos + len(FOOTER_PREFIX):].decode().split())
+        valid = int(fields["len"]) == len(body) and int(fields["crc32"], 16) == zlib.crc32(body)
+    except (ValueError, KeyError):
+        valid = False
+    return body, valid
+
+
+def template_to_dict(template) -> dict:
+    """Преобразует шаблон (ChatTemplate или TemplateRecord) в словарь для сохранения в JSON"""
+    if isinstance(template, TemplateRecord):
+        # Запись уже нормализована: поля переносятся как есть, без проверок и getattr
+        return {
+            'name': template.name,
+            'chat_name': template.chat_name,
+            'description': template.description,
+            'topics': [
+                {
+                    'title': topic.title,
+                    'description': topic.description,
+                    'icon_emoji': topic.icon_emoji,
+                    'icon_color': topic.icon_color,
+                    'is_closed': topic.is_closed,
+                    'is_hidden': topic.is_hidden
+                }
+                for topic in template.topics
+            ],
+            'user_id': template.user_id,
+            'created_at': template.created_at.isoformat() if template.created_at else None
+        }
+    return {
+        'name': template.name,
+        'chat_name': template.chat_name,
+        'description': template.description or '',
+        'topics': [
+            {
+                'title': topic.title,
+                'description': topic.description or '',
+                'icon_emoji': getattr(topic, 'icon_emoji', None),
+                'icon_color': topic.icon_color if topic.icon_color is not None else 0,
+                'is_closed': topic.is_closed,
+                'is_hidden': topic.is_hidden
+            }
+            for topic in template.topics
+            if topic.title
+        ],
+        'user_id': template.user_id,
+        'created_at': template.created_at.isoformat() if template.created_at else None
+    }
+
+
+def record_from_dict(user_id: int, data: dict) -> Optional[TemplateRecord]:
+    """
+    Восстанавливает шаблон из словаря сразу в компактную запись, без pydantic
+
+    Returns:
+        Optional[TemplateRecord]: Шаблон или None, если данные некорректны или в шаблоне нет топиков
+    """
+    if not isinstance(data, dict):
+        logger.error("Некорректный формат шаблона: %s", type(data))
+        return None
+    if 'name' not in data or 'chat_name' not in data:
+        logger.error("Отсутствуют обязательные поля в шаблоне: %s", data)
+        return None
+
+    created_at = None
+    if data.get('created_at'):
+        try:
+            created_at = datetime.fromisoformat(data['created_at'])
+        except ValueError as e:
+            logger.warning("Не удалось преобразовать дату создания: %s", e)
+
+    topics = tuple(
+        TopicRecord(
+            title=tt['title'],
+            description=tt.get('description') or '',
+            icon_emoji=tt.get('icon_emoji'),
+            icon_color=tt.get('icon_color') or 0,
+            is_closed=bool(tt.get('is_closed', False)),
+            is_hidden=bool(tt.get('is_hidden', False))
+        )
+        for tt in data.get('topics', [])
+        if tt.get('title')
+    )
+    if not topics:
+        logger.warning("Шаблон '%s' не содержит топиков, пропускаем", data['name'])
+        return None
+
+    return TemplateRecord(
+        name=data['name'],
+        chat_name=data['chat_name'],
+        description=data.get('description') or '',
+        topics=topics,
+        user_id=user_id,
+        created_at=created_at
+    )
+
+
+class TemplateStore:
+    """
+    Хранилище шаблонов: отдельный JSON-файл на пользователя (data/templates/<user_id>.json).
+
+    Сохранение шаблонов одного пользователя переписывает только его файл, поэтому
+    стоимость записи не зависит от общего количества шаблонов. Файл пишется во временный,
+    сбрасывается на диск и атомарно подменяет старый через os.replace.
+
+    Запись проверяется без повторного чтения: в конец файла дописывается футер с длиной
+    и CRC32 JSON-части, размер файла после fsync сверяется с ожидаемым, после подмены
+    fsync делается и для директории. Полный повторный разбор файла — только в режиме
+    TEMPLATE_VERIFY_PARANOID; футер проверяется при каждом чтении.
+
+    Повреждённый файл (футер не сходится или JSON не разбирается) не превращается
+    в пустой список: чтение поднимает TemplateFileCorrupted, а запись для этого
+    пользователя отклоняется, чтобы не затереть единственную копию данных.
+    """
+
+    def __init__(self, directory: str, legacy_file: Optional[str] = None):
+        """
+        :param directory: Директория с файлами пользователей
+        :param legacy_file: Старый общий файл templates.json для однократной миграции
+        """
+        self.directory = directory
+        self.legacy_file = legacy_file
+        # Пользователи, чей файл не прошёл проверку при последнем чтении
+        self._corrupt = set()
+
+    def _user_file(self, user_id: int) -> str:
+        return os.path.join(self.directory, f"{user_id}.json")
+
+    def user_ids(self) -> List[int]:
+        """Возвращает ID пользователей, у которых есть файл шаблонов"""
+        result = []
+        if not os.path.isdir(self.directory):
+            return result
+        for filename in os.listdir(self.directory):
+            name, ext = os.path.splitext(filename)
+            if ext == ".json" and name.lstrip("-").isdigit():
+                result.append(int(name))
+        return result
+
+    def _migrate_legacy(self):
+        """Разносит старый общий templates.json по файлам пользователей (один раз)"""
+        # Директория создаётся здесь, а не в __init__: метод выполняется в потоке, не в event loop
+        os.makedirs(self.directory, exist_ok=True)
+        if not self.legacy_file or not os.path.exists(self.legacy_file):
+            return
+        logger.info("Миграция шаблонов из %s в %s", self.legacy_file, self.directory)
+        try:
+            with open(self.legacy_file, 'rb') as f:
+                content = f.read()
+            data = json_codec.loads(content) if content.strip() else {}
+        except (OSError, ValueError) as e:
+            logger.error("Не удалось прочитать %s для миграции: %s", self.legacy_file, e)
+            return
+        if not isinstance(data, dict):
+            logger.error("Некорректный формат файла шаблонов: %s", type(data))
+            return
+        for user_id_str, templates in data.items():
+            if not isinstance(templates, list) or not user_id_str.lstrip("-").isdigit():
+                logger.error("Некорректные шаблоны пользователя %s, пропускаем", user_id_str)
+                continue
+            user_file = self._user_file(int(user_id_str))
+            if not os.path.exists(user_file):
+                self._write_file(user_file, templates)
+        os.replace(self.legacy_file, f"{self.legacy_file}.migrated")
+        logger.info("Миграция завершена, перенесено пользователей: %s", len(data))
+
+    def _write_file(self, path: str, payload: list):
+        """Атомарная запись: tmp-файл с футером + fsync + os.replace + fsync директории"""
+        body = json_codec.dumps(payload)
+        data = body + make_footer(body)
+        temp_file = f"{path}.tmp"
+        try:
+            with open(temp_file, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+                # Размер по данным файловой системы, а не по позиции в буфере Python
+                size = os.fstat(f.fileno()).st_size
+                if size != len(data):
+                    raise OSError(f"Размер файла {temp_file} после записи {size} байт, ожидалось {len(data)}")
+            os.replace(temp_file, path)
+        except Exception:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            raise
+        self._fsync_dir()
+
+    def _fsync_dir(self):
+        """Сбрасывает на диск запись директории, чтобы os.replace пережил сбой питания"""
+        try:
+            fd = os.open(self.directory, os.O_RDONLY)
+        except OSError:
+            # Windows не позволяет открыть директорию
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def _read_file(self, path: str):
+        """Читает файл пользователя и проверяет футер (файлы без футера принимаются как есть)"""
+        with open(path, 'rb') as f:
+            body, valid = split_footer(f.read())
+        if valid is False:
+            raise TemplateFileCorrupted(f"Контрольная сумма файла {path} не совпадает")
+        try:
+            return json_codec.loads(body) if body.strip() else []
+        except ValueError as e:
+            raise TemplateFileCorrupted(f"Файл {path} не разбирается как JSON: {e}") from e
+
+    def load_user_sync(self, user_id: int) -> List[TemplateRecord]:
+        """
+        Загружает шаблоны одного пользователя
+
+        Raises:
+            TemplateFileCorrupted: Файл повреждён (запись для пользователя заблокирована)
+            OSError: Файл не удалось прочитать
+        """
+        path = self._user_file(user_id)
+        if not os.path.exists(path):
+            self._corrupt.discard(user_id)
+            return []
+        try:
+            data = self._read_file(path)
+        except TemplateFileCorrupted as e:
+            self._corrupt.add(user_id)
+            logger.error("Шаблоны пользователя %s не загружены, файл оставлен без изменений: %s", user_id, e)
+            raise
+        except OSError as e:
+            logger.error("Ошибка при чтении шаблонов пользователя %s: %s", user_id, e)
+            raise
+        if not isinstance(data, list):
+            self._corrupt.add(user_id)
+            logger.error("Некорректный формат шаблонов для пользователя %s: %s, файл оставлен без изменений", user_id, type(data))
+            raise TemplateFileCorrupted(f"В файле {path} не список шаблонов")
+        self._corrupt.discard(user_id)
+        templates = []
+        for t in data:
+            try:
+                template = record_from_dict(user_id, t)
+            except Exception as e:
+                logger.error("Ошибка при загрузке шаблона: %s", e)
+                continue
+            if template:
+                templates.append(template)
+        return templates
+
+    async def prepare(self):
+        """Однократная подготовка при запуске: миграция старого общего файла"""
+        await asyncio.to_thread(self._migrate_legacy)
+
+    async def load_user(self, user_id: int) -> List[TemplateRecord]:
+        """Асинхронная обёртка над load_user_sync (чтение в отдельном потоке)"""
+        return await asyncio.to_thread(self.load_user_sync, user_id)
+
+    def load_all_sync(self) -> Dict[int, List[TemplateRecord]]:
+        """Загружает шаблоны всех пользователей (с миграцией старого файла)"""
+        self._migrate_legacy()
+        result = {}
+        for user_id in self.user_ids():
+            try:
+                templates = self.load_user_sync(user_id)
+            except (OSError, ValueError):
+                # Ошибка уже в логе; остальные пользователи загружаются как обычно
+                continue
+            if templates:
+                result[user_id] = templates
+        return result
+
+    async def load_all(self) -> Dict[int, List[TemplateRecord]]:
+        """Асинхронная обёртка над load_all_sync (чтение в отдельном потоке)"""
+        return await asyncio.to_thread(self.load_all_sync)
+
+    def _save_user_sync(self, user_id: int, payload: list) -> bool:
+        path = self._user_file(user_id)
+        if user_id in self._corrupt:
+            raise TemplateFileCorrupted(f"Файл {path} повреждён и не будет перезаписан")
+        if not payload:
+            if os.path.exists(path):
+                os.remove(path)
+            return True
+        os.makedirs(self.directory, exist_ok=True)
+        self._write_file(path, payload)
+        if TEMPLATE_VERIFY_PARANOID:
+            # Полная проверка: перечитываем и разбираем только что записанный файл
+            with open(path, 'rb') as f:
+                body, valid = split_footer(f.read())
+            if not valid:
+                raise ValueError(f"Контрольная сумма записанного файла {path} не совпадает")
+            saved = json_codec.loads(body)
+            if len(saved) != len(payload):
+                raise ValueError(f"Количество сохраненных шаблонов не совпадает: {len(saved)} != {len(payload)}")
+        return True
+
+    async def save_user(self, user_id: int, templates: List[TemplateRecord]) -> bool:
+        """
+        Сохраняет шаблоны одного пользователя (пустой список удаляет его файл)
+
+        Returns:
+            bool: True если сохранение прошло успешно
+        """
+        payload = [template_to_dict(t) for t in templates if t.name and t.chat_name and t.topics]
+        try:
+            return await asyncio.to_thread(self._save_user_sync, user_id, payload)
+        except Exception as e:
+            logger.error("Ошибка при сохранении шаблонов пользователя %s: %s", user_id, e)
+            return False
@@ -0,0 +1,191 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from config import TEMPLATE_FLUSH_DELAY, TEMPLATE_FLUSH_MAX_DELAY, TEMPLATE_RETRY_MAX_DELAY
+from models.records import TemplateRecord
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+SAVE_SECONDS = metrics.histogram("template_save_seconds", "Запись шаблонов одного пользователя в хранилище")
+SAVE_FAILURES = metrics.counter("template_save_failures_total", "Неудачные записи шаблонов")
+
+
+class TemplateWriter:
+    """
+    Отложенная запись шаблонов (write-behind) с единственным писателем.
+
+    Изменения сразу применяются в памяти, а в хранилище уходят из одной фоновой задачи:
+    она ждёт TEMPLATE_FLUSH_DELAY секунд тишины (но не дольше TEMPLATE_FLUSH_MAX_DELAY
+    при непрерывных правках) и записывает накопившееся пачкой. Несколько правок одного
+    пользователя за это время превращаются в одну запись его последнего состояния.
+    Записи идут строго по очереди, файловые операции хранилище выполняет в потоке,
+    event loop не блокируется.
+
+    Неудачная запись возвращается в очередь и повторяется сама с экспоненциальной
+    паузой (от delay до retry_max_delay); Future и flush() этой попытки получают False.
+    """
+
+    def __init__(self, store, delay: float = TEMPLATE_FLUSH_DELAY, max_delay: float = TEMPLATE_FLUSH_MAX_DELAY,
+                 retry_max_delay: float = TEMPLATE_RETRY_MAX_DELAY):
+        """
+        :param store: Хранилище с методом save_user (TemplateStore или DatabaseService)
+        """
+        self.store = store
+        self.delay = delay
+        self.max_delay = max_delay
+        self.retry_max_delay = retry_max_delay
+        self._pending: Dict[int, List[TemplateRecord]] = {}
+        self._waiters: Dict[int, List[asyncio.Future]] = {}
+        # Пачка, которая пишется прямо сейчас
+        self._inflight: Dict[int, List[TemplateRecord]] = {}
+        self._inflight_waiters: Dict[int, List[asyncio.Future]] = {}
+        # Вызовы flush(), ждущие окончания ближайшей записи
+        self._barriers: List[asyncio.Future] = []
+        # Неудачные записи подряд по пользователям и запланированный повтор
+        self._retries: Dict[int, int] = {}
+        self._retry_handle: Optional[asyncio.TimerHandle] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_now: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.writes = 0
+        self.coalesced = 0
+        self.failures = 0
+
+    def _ensure_task(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._flush_now = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    def submit(self, user_id: int, templates: List[TemplateRecord]) -> asyncio.Future:
+        """
+        Ставит в очередь новое состояние шаблонов пользователя
+
+        Returns:
+            asyncio.Future: Завершится с True/False, когда это состояние будет записано
+        """
+        self._ensure_task()
+        if user_id in self._pending:
+            self.coalesced += 1
+        self._pending[user_id] = templates
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(user_id, []).append(future)
+        self._wakeup.set()
+        return future
+
+    def pending(self, user_id: int) -> Optional[List[TemplateRecord]]:
+        """Ещё не записанное состояние пользователя (новее, чем в хранилище)"""
+        if user_id in self._pending:
+            return self._pending[user_id]
+        return self._inflight.get(user_id)
+
+    def pending_count(self) -> int:
+        """Сколько пользователей ждут записи (без пачки, которая пишется сейчас)"""
+        return len(self._pending)
+
+    async def flush(self) -> bool:
+        """
+        Немедленно записывает все накопленные изменения и ждёт окончания записи
+
+        Returns:
+            bool: True, если все записи прошли успешно
+        """
+        if not self._pending and not self._inflight:
+            return True
+        self._ensure_task()
+        barrier = asyncio.get_running_loop().create_future()
+        self._barriers.append(barrier)
+        self._flush_now.set()
+        self._wakeup.set()
+        return await barrier
+
+    async def stop(self):
+        """Записывает накопленное и останавливает писателя (при выключении бота)"""
+        if not await self.flush():
+            logger.error("[TEMPLATES] При остановке не записаны шаблоны пользователей: %s", list(self._pending))
+        if self._retry_handle is not None:
+            self._retry_handle.cancel()
+            self._retry_handle = None
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wakeup.wait()
+            # Ждём паузы в правках, чтобы записать их одной пачкой
+            deadline = loop.time() + self.max_delay
+            while not self._flush_now.is_set():
+                self._wakeup.clear()
+                timeout = min(self.delay, deadline - loop.time())
+                if timeout <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            self._flush_now.clear()
+            self._wakeup.clear()
+            # flush(), вызванный во время записи, дождётся следующей пачки
+            barriers, self._barriers = self._barriers, []
+            ok = await self._write_batch() if self._pending else True
+            for barrier in barriers:
+                if not barrier.done():
+                    barrier.set_result(ok)
+            if not ok:
+                self._schedule_retry(loop)
+
+    def _schedule_retry(self, loop: asyncio.AbstractEventLoop):
+        """Будит писателя для повтора неудачных записей: пауза удваивается с каждой неудачей"""
+        if self._retry_handle is not None:
+            self._retry_handle.cancel()
+        attempts = max(self._retries.values(), default=1)
+        backoff = min(self.delay * 2 ** (attempts - 1), self.retry_max_delay)
+        logger.warning("[TEMPLATES] Повтор записи шаблонов через %.1f сек (попытка %s)", backoff, attempts + 1)
+        self._retry_handle = loop.call_later(backoff, self._wakeup.set)
+
+    async def _write_batch(self) -> bool:
+        self._inflight, self._pending = self._pending, {}
+        self._inflight_waiters, self._waiters = self._waiters, {}
+        self.flushes += 1
+        all_ok = True
+        try:
+            for user_id, templates in self._inflight.items():
+                with SAVE_SECONDS.time():
+                    ok = await self.store.save_user(user_id, templates)
+                self.writes += 1
+                if ok:
+                    self._retries.pop(user_id, None)
+                else:
+                    all_ok = False
+                    self.failures += 1
+                    self._retries[user_id] = self._retries.get(user_id, 0) + 1
+                    SAVE_FAILURES.inc()
+                    logger.error("[TEMPLATES] Не удалось записать шаблоны пользователя %s, запись будет повторена", user_id)
+                    # Более новое состояние, если оно появилось, важнее неудачного
+                    self._pending.setdefault(user_id, templates)
+                for future in self._inflight_waiters.pop(user_id, []):
+                    if not future.done():
+                        future.set_result(ok)
+            return all_ok
+        finally:
+            self._inflight = {}
+            for futures in self._inflight_waiters.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_result(False)
+            self._inflight_waiters = {}
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": self.pending_count(),
+            "flushes": self.flushes,
+            "writes": self.writes,
+            "coalesced": self.coalesced,
+            "failures": self.failures
+        }
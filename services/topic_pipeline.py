@@ -0,0 +1,126 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+
+from models.schemas import Topic
+from services.metrics import metrics
+from services.rate_limit import get_retry_after
+from services.telegram_scheduler import PRIORITY_BULK, PRIORITY_INTERACTIVE, call_priority
+
+logger = logging.getLogger(__name__)
+
+TOPIC_SECONDS = metrics.histogram("topic_create_seconds", "Создание одного топика через Bot API, с повторами")
+TOPICS_CREATED = metrics.counter("topics_created_total", "Обработанные топики по результату", ("result",))
+
+# Вызывается после обработки каждого топика: (готово, всего, название, успешно)
+ProgressFunc = Callable[[int, int, str, bool], Awaitable[None]]
+
+
+class TopicCreationPipeline:
+    """
+    Создание топиков через Bot API без фиксированных пауз.
+
+    Вызовы createForumTopic идут строго в порядке шаблона (от этого зависит порядок
+    топиков в чате), а отправка описаний идёт параллельно, но не больше concurrency
+    запросов одновременно. Темп и ожидание по retry_after задаёт TelegramScheduler;
+    вызовы идут с низким приоритетом, чтобы не задерживать ответы пользователям.
+    """
+
+    def __init__(self, bot: Bot, concurrency: int = 4,
+                 max_retries: int = 3, retry_delay: float = 0.5):
+        self.bot = bot
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+    async def _call(self, title: str, func: Callable[[], Awaitable]):
+        """Выполняет запрос с повторами при сетевых ошибках (FloodWait повторяет планировщик)"""
+        for attempt in range(self.max_retries):
+            try:
+                return await func()
+            except (TelegramBadRequest, TelegramForbiddenError):
+                # Повтор не поможет: неверные данные или нет прав
+                raise
+            except Exception as e:
+                if attempt == self.max_retries - 1 or get_retry_after(e) is not None:
+                    raise
+                await asyncio.sleep(self.retry_delay * (2 ** attempt))
+                logger.warning("[TOPIC] Попытка %s для топика '%s' не удалась: %s", attempt + 1, title, e)
+
+    async def run(self, chat_id: int, topics: List[Topic], emoji_map: Dict[str, str],
+                  progress_func: Optional[ProgressFunc] = None) -> List[Optional[dict]]:
+        """
+        Создаёт топики в чате
+
+        Args:
+            chat_id: ID чата в формате Bot API (-100...)
+            topics: Топики в порядке шаблона
+            emoji_map: Рабочий список эмодзи (эмодзи -> custom_emoji_id)
+            progress_func: Колбэк прогресса
+
+        Returns:
+            List[Optional[dict]]: Результаты в порядке топиков, None для несозданных
+        """
+        total = len(topics)
+        done = 0
+        semaphore = asyncio.Semaphore(self.concurrency)
+        created = [asyncio.Event() for _ in topics]
+
+        async def create_one(index: int, topic: Topic) -> Optional[dict]:
+            nonlocal done
+            result = None
+            try:
+                if index > 0:
+                    await created[index - 1].wait()
+                try:
+                    emoji_id = emoji_map.get(topic.icon_emoji) if topic.icon_emoji else None
+                    params = {"chat_id": chat_id, "name": topic.title}
+                    if emoji_id:
+                        params["icon_custom_emoji_id"] = emoji_id
+                    async with semaphore:
+                        with TOPIC_SECONDS.time():
+                            topic_obj = await self._call(
+                                topic.title, lambda: self.bot.create_forum_topic(**params)
+                            )
+                    logger.debug("[TOPIC] Топик '%s' создан, иконка: %s", topic.title, topic.icon_emoji if emoji_id else "нет")
+                finally:
+                    # Следующий топик можно создавать, даже если этот не удался
+                    created[index].set()
+
+                result = {
+                    "title": topic.title,
+                    "thread_id": getattr(topic_obj, 'message_thread_id', None),
+                    "icon_emoji": topic.icon_emoji
+                }
+
+                # Описание первым сообщением в топик, параллельно с созданием следующих
+                desc = topic.description if topic.description else "."
+                try:
+                    async with semaphore:
+                        await self._call(topic.title, lambda: self.bot.send_message(
+                            chat_id=chat_id,
+                            message_thread_id=topic_obj.message_thread_id,
+                            text=desc,
+                            parse_mode=None  # Описание — обычный текст, даже если у бота HTML по умолчанию
+                        ))
+                except Exception as e:
+                    logger.warning("[TOPIC DESC] Не удалось отправить описание для топика '%s': %s", topic.title, e)
+            except Exception as e:
+                logger.error("[TOPIC] Все попытки создания топика '%s' не удались: %s", topic.title, e)
+            finally:
+                done += 1
+                TOPICS_CREATED.inc(result="ok" if result is not None else "error")
+                if progress_func:
+                    try:
+                        # Прогресс видит пользователь — не ставим его в очередь за топиками
+                        with call_priority(PRIORITY_INTERACTIVE):
+                            await progress_func(done, total, topic.title, result is not None)
+                    except Exception as e:
+                        logger.warning("[TOPIC] Ошибка в колбэке прогресса: %s", e)
+            return result
+
+        with call_priority(PRIORITY_BULK):
+            return await asyncio.gather(*(create_one(i, t) for i, t in enumerate(topics)))